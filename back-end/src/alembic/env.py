@@ -6,7 +6,10 @@ from sqlalchemy import pool
 from alembic import context
 from sqlmodel import SQLModel
 # Importing models to identify them in SQLModel metadata
-from models import relational_models, branch, fines_damage, system_log, system_setting, vehicle_maintenance
+from models import (
+    relational_models, branch, counter, fines_damage, sales_rollup, system_log, system_setting, table_version,
+    vehicle_maintenance,
+)
 
 
 # this is the Alembic Config object, which provides
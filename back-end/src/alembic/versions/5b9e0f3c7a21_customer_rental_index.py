@@ -0,0 +1,30 @@
+"""customer rental index
+
+Revision ID: 5b9e0f3c7a21
+Revises: 8c41d2e7a9f3
+Create Date: 2026-10-16 14:37:05.902114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b9e0f3c7a21'
+down_revision: Union[str, None] = '8c41d2e7a9f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_rental_customer_id_created_at_id", "rental", ["customer_id", "created_at", "id"], unique=False,
+        postgresql_include=["invoice_id"],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_rental_customer_id_created_at_id", table_name="rental")
@@ -0,0 +1,31 @@
+"""keyset pagination indexes
+
+Revision ID: 8c41d2e7a9f3
+Revises: 3fea7d199cbd
+Create Date: 2026-10-16 10:12:31.418205
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c41d2e7a9f3'
+down_revision: Union[str, None] = '3fea7d199cbd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ("vehicle", "vehicleinsurance", "customer", "invoice", "rental", "payment", "comment", "admin", "post")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in TABLES:
+        op.create_index(f"ix_{table}_created_at_id", table, ["created_at", "id"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in TABLES:
+        op.drop_index(f"ix_{table}_created_at_id", table_name=table)
@@ -0,0 +1,46 @@
+"""full text search
+
+Revision ID: a3d5c8e19f47
+Revises: e1f47a0c9b32
+Create Date: 2026-10-17 11:02:13.540981
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from utilities.text_search import search_vector_sql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3d5c8e19f47'
+down_revision: Union[str, None] = 'e1f47a0c9b32'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_VECTORS = {
+    "post": (("subject", "A"), ("content", "B")),
+    "comment": (("content", "A"),),
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table, weighted_columns in SEARCH_VECTORS.items():
+        op.add_column(table, sa.Column(
+            "search_vector", postgresql.TSVECTOR(),
+            sa.Computed(search_vector_sql(*weighted_columns), persisted=True),
+            nullable=True,
+        ))
+        op.create_index(
+            f"ix_{table}_search_vector", table, ["search_vector"], unique=False, postgresql_using="gin"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in SEARCH_VECTORS:
+        op.drop_index(f"ix_{table}_search_vector", table_name=table, postgresql_using="gin")
+        op.drop_column(table, "search_vector")
@@ -0,0 +1,58 @@
+"""stats counters
+
+Revision ID: a3f6c8e1d927
+Revises: e7c1b5a3d820
+Create Date: 2026-10-17 21:36:08.250913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+from utilities.counters import (
+    COUNTED_TABLES,
+    DAILY_PURCHASE_COUNT_TABLE,
+    ROW_COUNT_TABLE,
+    create_counter_triggers,
+    drop_counter_triggers,
+    reconcile_purchase_counts,
+    reconcile_row_count,
+)
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3f6c8e1d927'
+down_revision: Union[str, None] = 'e7c1b5a3d820'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        ROW_COUNT_TABLE,
+        sa.Column("table_name", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("row_count", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("table_name"),
+    )
+    op.create_table(
+        DAILY_PURCHASE_COUNT_TABLE,
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("purchase_count", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("day"),
+    )
+    # Counted from the existing rows, then kept by the triggers
+    connection = op.get_bind()
+    create_counter_triggers(connection)
+    for table in COUNTED_TABLES:
+        reconcile_row_count(connection, table)
+    reconcile_purchase_counts(connection)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    drop_counter_triggers(op.get_bind())
+    op.drop_table(DAILY_PURCHASE_COUNT_TABLE)
+    op.drop_table(ROW_COUNT_TABLE)
@@ -0,0 +1,39 @@
+"""vehicle availability
+
+Revision ID: b2e7c4f1a9d6
+Revises: f8b3d1a6c274
+Create Date: 2026-10-17 16:48:05.277931
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from utilities.availability import RENTAL_PERIOD_SQL
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2e7c4f1a9d6'
+down_revision: Union[str, None] = 'f8b3d1a6c274'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("rental", sa.Column(
+        "rental_period", postgresql.DATERANGE(), sa.Computed(RENTAL_PERIOD_SQL, persisted=True), nullable=True,
+    ))
+    op.create_index("ix_rental_rental_period", "rental", ["rental_period"], unique=False, postgresql_using="gist")
+    op.create_index(
+        "ix_vehicle_location_created_at_id", "vehicle", ["location", "created_at", "id"], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_vehicle_location_created_at_id", table_name="vehicle")
+    op.drop_index("ix_rental_rental_period", table_name="rental", postgresql_using="gist")
+    op.drop_column("rental", "rental_period")
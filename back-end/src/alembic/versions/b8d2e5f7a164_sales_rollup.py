@@ -0,0 +1,74 @@
+"""sales rollup
+
+Revision ID: b8d2e5f7a164
+Revises: a3f6c8e1d927
+Create Date: 2026-10-17 23:04:19.731842
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from utilities.analytics import (
+    SALES_ROLLUP_TABLE,
+    STALE_SALES_DAY_TABLE,
+    create_sales_triggers,
+    drop_sales_triggers,
+    mark_all_sales_days,
+    refresh_sales_rollup,
+)
+from utilities.enumerables import BranchLocations, Brand
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8d2e5f7a164'
+down_revision: Union[str, None] = 'a3f6c8e1d927'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        SALES_ROLLUP_TABLE,
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column(
+            "location",
+            postgresql.ENUM(*(location.name for location in BranchLocations), name="branchlocations",
+                            create_type=False),
+            nullable=True,
+        ),
+        sa.Column(
+            "brand", postgresql.ENUM(*(brand.name for brand in Brand), name="brand", create_type=False), nullable=True,
+        ),
+        sa.Column("revenue", sa.BigInteger(), nullable=False),
+        sa.Column("payment_count", sa.BigInteger(), nullable=False),
+        sa.Column("rental_count", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_sales_rollup_day_location_brand", SALES_ROLLUP_TABLE, ["day", "location", "brand"],
+        unique=True, postgresql_nulls_not_distinct=True,
+    )
+    op.create_table(
+        STALE_SALES_DAY_TABLE,
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("marked_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("day"),
+    )
+    # Summed from the existing payments and rentals, then kept by the triggers
+    connection = op.get_bind()
+    create_sales_triggers(connection)
+    mark_all_sales_days(connection)
+    refresh_sales_rollup(connection)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    drop_sales_triggers(op.get_bind())
+    op.drop_table(STALE_SALES_DAY_TABLE)
+    op.drop_index("ix_sales_rollup_day_location_brand", table_name=SALES_ROLLUP_TABLE)
+    op.drop_table(SALES_ROLLUP_TABLE)
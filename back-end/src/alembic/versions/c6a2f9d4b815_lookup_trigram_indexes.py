@@ -0,0 +1,55 @@
+"""lookup trigram indexes
+
+Revision ID: c6a2f9d4b815
+Revises: a3d5c8e19f47
+Create Date: 2026-10-17 13:40:22.318604
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from utilities.lookup import LOOKUP_EXPRESSIONS
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c6a2f9d4b815'
+down_revision: Union[str, None] = 'a3d5c8e19f47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Lookup expressions indexed per table; admin.username already has ix_admin_username_trgm
+LOOKUP_INDEXES = {
+    "customer": ("name", "username", "phone", "national_id"),
+    "admin": ("name", "phone", "national_id"),
+}
+
+
+def has_trigram_extension() -> bool:
+    connection = op.get_bind()
+    return connection.execute(
+        sa.text("SELECT EXISTS (SELECT FROM pg_available_extensions WHERE name = 'pg_trgm')")
+    ).scalar()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Without pg_trgm, lookups fall back to matching substrings, see `fuzzy_lookup`
+    if not has_trigram_extension():
+        return
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for table, keys in LOOKUP_INDEXES.items():
+        for key in keys:
+            op.execute(
+                f"CREATE INDEX ix_{table}_lookup_{key}_trgm ON {table} "
+                f"USING gin (({LOOKUP_EXPRESSIONS[key]}) gin_trgm_ops)"
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table, keys in LOOKUP_INDEXES.items():
+        for key in keys:
+            op.execute(f"DROP INDEX IF EXISTS ix_{table}_lookup_{key}_trgm")
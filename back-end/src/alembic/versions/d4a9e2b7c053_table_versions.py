@@ -0,0 +1,38 @@
+"""table versions
+
+Revision ID: d4a9e2b7c053
+Revises: b2e7c4f1a9d6
+Create Date: 2026-10-17 18:02:31.417520
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+from utilities.table_versions import TABLE_VERSION_TABLE, create_version_triggers, drop_version_triggers
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a9e2b7c053'
+down_revision: Union[str, None] = 'b2e7c4f1a9d6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        TABLE_VERSION_TABLE,
+        sa.Column("table_name", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("version", sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("table_name"),
+    )
+    create_version_triggers(op.get_bind())
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    drop_version_triggers(op.get_bind())
+    op.drop_table(TABLE_VERSION_TABLE)
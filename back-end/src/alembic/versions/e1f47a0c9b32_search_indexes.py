@@ -0,0 +1,86 @@
+"""search indexes
+
+Revision ID: e1f47a0c9b32
+Revises: 5b9e0f3c7a21
+Create Date: 2026-10-17 09:26:48.115730
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1f47a0c9b32'
+down_revision: Union[str, None] = '5b9e0f3c7a21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Single-column indexes replaced by (column, id) ones, for the sort keys of the search endpoints
+SORT_KEYS = {
+    "rental": ("rental_start_date", "rental_end_date"),
+    "payment": ("payment_datetime",),
+    "vehicleinsurance": ("start_date", "expiration_date"),
+}
+
+INDEXES = {
+    "vehicle": (("brand",), ("hourly_rental_rate",), ("security_deposit",), ("year", "id"), ("mileage", "id")),
+    "vehicleinsurance": (("insurance_type",),),
+    "customer": (("gender",), ("phone",)),
+    "invoice": (("total_amount",), ("tax",), ("discount",), ("final_amount",)),
+    "rental": (("total_amount",), ("vehicle_id",), ("invoice_id",)),
+    "payment": (("payment_method",),),
+    "admin": (("role",), ("status",), ("gender",), ("phone",)),
+}
+
+# Columns searched by substring, which only a trigram index can serve
+TRIGRAM_INDEXES = {
+    "admin": ("username",),
+    "customer": ("last_name",),
+    "post": ("subject", "thumbnail"),
+}
+
+
+def has_trigram_extension() -> bool:
+    connection = op.get_bind()
+    return connection.execute(
+        sa.text("SELECT EXISTS (SELECT FROM pg_available_extensions WHERE name = 'pg_trgm')")
+    ).scalar()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table, columns in SORT_KEYS.items():
+        for column in columns:
+            op.drop_index(f"ix_{table}_{column}", table_name=table)
+            op.create_index(f"ix_{table}_{column}_id", table, [column, "id"], unique=False)
+
+    for table, indexes in INDEXES.items():
+        for columns in indexes:
+            op.create_index(f"ix_{table}_{'_'.join(columns)}", table, list(columns), unique=False)
+
+    if has_trigram_extension():
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for table, columns in TRIGRAM_INDEXES.items():
+            for column in columns:
+                op.create_index(
+                    f"ix_{table}_{column}_trgm", table, [column], unique=False,
+                    postgresql_using="gin", postgresql_ops={column: "gin_trgm_ops"},
+                )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table, columns in TRIGRAM_INDEXES.items():
+        for column in columns:
+            op.execute(f"DROP INDEX IF EXISTS ix_{table}_{column}_trgm")
+
+    for table, indexes in INDEXES.items():
+        for columns in indexes:
+            op.drop_index(f"ix_{table}_{'_'.join(columns)}", table_name=table)
+
+    for table, columns in SORT_KEYS.items():
+        for column in columns:
+            op.drop_index(f"ix_{table}_{column}_id", table_name=table)
+            op.create_index(f"ix_{table}_{column}", table, [column], unique=False)
@@ -0,0 +1,35 @@
+"""cached table versions
+
+Revision ID: e7c1b5a3d820
+Revises: d4a9e2b7c053
+Create Date: 2026-10-17 20:14:52.603118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from utilities.table_versions import create_version_triggers
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7c1b5a3d820'
+down_revision: Union[str, None] = 'd4a9e2b7c053'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Tables whose responses are cached but were not versioned before
+NEWLY_VERSIONED_TABLES = ("invoice", "payment")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    create_version_triggers(op.get_bind())
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in NEWLY_VERSIONED_TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_version ON {table}")
+    op.execute(sa.text(f"DELETE FROM table_version WHERE table_name IN {NEWLY_VERSIONED_TABLES}"))
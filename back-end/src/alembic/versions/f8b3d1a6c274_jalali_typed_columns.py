@@ -0,0 +1,47 @@
+"""jalali typed columns
+
+Revision ID: f8b3d1a6c274
+Revises: c6a2f9d4b815
+Create Date: 2026-10-17 15:12:47.906113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from utilities.fields_validator import jalali_to_datetime
+from utilities.jalali_columns import JALALI_COLUMNS, backfill_jalali_columns
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f8b3d1a6c274'
+down_revision: Union[str, None] = 'c6a2f9d4b815'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table, columns in JALALI_COLUMNS.items():
+        for _, typed_column, convert in columns:
+            column_type = sa.DateTime(timezone=True) if convert is jalali_to_datetime else sa.Date()
+            op.add_column(table, sa.Column(typed_column, column_type, nullable=True))
+
+    # The strings are converted by the same functions as new rows, so the backfill runs in Python
+    backfill_jalali_columns(op.get_bind().connection.cursor())
+
+    # The typed columns replace the strings as the sort keys of the search endpoints
+    for table, columns in JALALI_COLUMNS.items():
+        for string_column, typed_column, _ in columns:
+            op.drop_index(f"ix_{table}_{string_column}_id", table_name=table)
+            op.create_index(f"ix_{table}_{typed_column}_id", table, [typed_column, "id"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table, columns in JALALI_COLUMNS.items():
+        for string_column, typed_column, _ in columns:
+            op.drop_index(f"ix_{table}_{typed_column}_id", table_name=table)
+            op.create_index(f"ix_{table}_{string_column}_id", table, [string_column, "id"], unique=False)
+            op.drop_column(table, typed_column)
@@ -0,0 +1,156 @@
+"""
+Latency of a one-year sales chart of `GET /stats/analytics/`.
+
+Seeds generated vehicles (model "benchmark") across branches and brands, one rental
+per vehicle on a few invoices, and payments spread over the last year on those invoices,
+then times a chart of the year by Jalali month, per branch and brand: once summed
+from the payments and rentals, as the endpoint would without the rollup, and once as
+the endpoint reads the rollup; and times the refresh of the workers after a payment
+update, which sums its day again. The seeded rows are deleted afterwards unless
+`--keep` is given.
+
+Usage (from back-end/src, with POSTGRESQL_URL pointing at a migrated database):
+    python -m benchmark.analytics [vehicles] [payments] [--keep]
+"""
+import asyncio
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import delete, text
+
+from config import app
+from database import async_engine
+from models.relational_models import Customer, Invoice, Payment, Vehicle
+from utilities.analytics import SALES_SQL, jalali, refresh_sales_rollup
+from utilities.authentication import create_access_token
+from utilities.enumerables import BranchLocations, Brand
+
+RUNS = 5
+# Invoices the rentals and payments are spread over
+INVOICES = 100
+
+
+async def seed(vehicles: int, payments: int) -> list:
+    async with async_engine.begin() as connection:
+        await connection.execute(text(
+            "INSERT INTO customer (id, first_name, last_name, gender, birthday, national_id, username, address, "
+            "password) VALUES (gen_random_uuid(), 'benchmark', 'customer', 'MALE', '1370/01/01', '0000000000', "
+            "'benchmark_analytics', 'benchmark', 'x')"
+        ))
+        await connection.execute(text(
+            "INSERT INTO vehicle (id, plate_number, location, local_image_address, brand, model, year, color, "
+            "mileage, status, hourly_rental_rate, security_deposit) "
+            "SELECT gen_random_uuid(), 'bench' || n, "
+            "  CAST((CAST(:locations AS text[]))[1 + n % :location_count] AS branchlocations), "
+            "  '/images/benchmark.png', "
+            "  CAST((CAST(:brands AS text[]))[1 + n % :brand_count] AS brand), "
+            "  'benchmark', 1400, 'white', 0, 'AVAILABLE', 100000, 1000000 "
+            "FROM generate_series(1, :vehicles) AS n"
+        ), {
+            "locations": [location.name for location in BranchLocations], "location_count": len(BranchLocations),
+            "brands": [brand.name for brand in Brand], "brand_count": len(Brand), "vehicles": vehicles,
+        })
+        invoice_ids = (await connection.execute(text(
+            "INSERT INTO invoice (id, total_amount, tax, discount, final_amount, status) "
+            "SELECT gen_random_uuid(), 1000, 0, 0, 1000, 'COMPLETED' FROM generate_series(1, :invoices) "
+            "RETURNING id"
+        ), {"invoices": INVOICES})).scalars().all()
+        # Rentals starting on days of the last year
+        await connection.execute(text(
+            "INSERT INTO rental (id, rental_start_date, rental_end_date, rental_start_on, rental_end_on, "
+            "total_amount, customer_id, vehicle_id, invoice_id) "
+            "SELECT gen_random_uuid(), '1400/01/01', '1400/01/02', start_on, start_on + 1, 1000, "
+            "  (SELECT id FROM customer WHERE username = 'benchmark_analytics'), id, "
+            "  (CAST(:invoice_ids AS uuid[]))[1 + n % :invoices] "
+            "FROM (SELECT id, row_number() OVER () AS n, current_date - floor(random() * 365)::int AS start_on "
+            "      FROM vehicle WHERE model = 'benchmark') AS vehicles"
+        ), {"invoice_ids": invoice_ids, "invoices": INVOICES})
+        await connection.execute(text(
+            "INSERT INTO payment (id, payment_datetime, payment_method, transaction_id, amount, payment_status, "
+            "invoice_id, payment_at) "
+            "SELECT gen_random_uuid(), '1400/01/01 00:00:00', 'ONLINE_PAYMENT', 'benchmark' || n, 1000, "
+            "  'COMPLETED', (CAST(:invoice_ids AS uuid[]))[1 + n % :invoices], now() - random() * interval '365 days' "
+            "FROM generate_series(1, :payments) AS n"
+        ), {"invoice_ids": invoice_ids, "invoices": INVOICES, "payments": payments})
+        for table in ("vehicle", "rental", "payment"):
+            await connection.execute(text(f"ANALYZE {table}"))
+    return invoice_ids
+
+
+async def time_call(call) -> float:
+    timings = []
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        await call()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+async def main(vehicles: int, payments: int, keep: bool) -> None:
+    print(f"seeding {vehicles} vehicles and {payments} payments ...")
+    invoice_ids = await seed(vehicles, payments)
+
+    end = date.today()
+    start = end - timedelta(days=365)
+    async with async_engine.begin() as connection:
+        started = time.perf_counter()
+        days = await connection.run_sync(refresh_sales_rollup)
+        print(f"summed {days} stale days into the rollup in {time.perf_counter() - started:.1f} s")
+
+    # The chart summed from the payments and rentals of every day of the year
+    every_day = [start + timedelta(days=offset) for offset in range(366)]
+    scan = text(
+        "SELECT date_trunc('month', day), location, brand, sum(revenue), sum(payment_count), sum(rental_count) "
+        f"FROM ({SALES_SQL}) AS sales GROUP BY 1, 2, 3"
+    )
+
+    async def scan_sales():
+        async with async_engine.connect() as connection:
+            await connection.execute(scan, {"days": every_day})
+
+    token = create_access_token(data={"id": "00000000-0000-0000-0000-000000000000", "role": "SuperAdmin"},
+                                expires_delta=timedelta(minutes=60))
+    params = {
+        "start_date": jalali(start), "end_date": jalali(end), "interval": "month", "group_by": ["location", "brand"],
+    }
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://benchmark") as client:
+        async def chart():
+            response = await client.get("/stats/analytics/", params=params,
+                                        headers={"Authorization": f"Bearer {token}"})
+            assert response.status_code == 200, response.text
+
+        scan_ms = await time_call(scan_sales)
+        rollup_ms = await time_call(chart)
+
+    async def refresh_after_payment():
+        async with async_engine.begin() as connection:
+            await connection.execute(text(
+                "UPDATE payment SET amount = amount + 1 WHERE id = "
+                "(SELECT id FROM payment WHERE transaction_id = 'benchmark1')"
+            ))
+        async with async_engine.begin() as connection:
+            assert await connection.run_sync(refresh_sales_rollup) == 1
+
+    refresh_ms = await time_call(refresh_after_payment)
+
+    print(f"summed from payments and rentals: {scan_ms:.2f} ms")
+    print(f"endpoint, from the rollup:        {rollup_ms:.2f} ms")
+    print(f"refresh of one stale day:         {refresh_ms:.2f} ms")
+
+    if not keep:
+        # Payments go first: the invoice foreign key of payments is not indexed, so cascading to them is slow
+        async with async_engine.begin() as connection:
+            await connection.execute(delete(Payment).where(Payment.invoice_id.in_(invoice_ids)))
+            await connection.execute(delete(Invoice).where(Invoice.id.in_(invoice_ids)))
+            await connection.execute(delete(Vehicle).where(Vehicle.model == "benchmark"))
+            await connection.execute(delete(Customer).where(Customer.username == "benchmark_analytics"))
+            await connection.run_sync(refresh_sales_rollup)
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    arguments = [int(argument) for argument in sys.argv[1:] if argument != "--keep"]
+    asyncio.run(main(*(arguments + [10_000, 1_000_000][len(arguments):]), "--keep" in sys.argv))
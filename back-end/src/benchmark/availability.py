@@ -0,0 +1,130 @@
+"""
+Latency of the vehicle availability search.
+
+Seeds generated vehicles (model "benchmark", so they are easy to remove) spread
+over the branches, each with a history of rentals in consecutive week-long slots,
+then times the query of `GET /vehicles/available/` for one branch and windows of
+a few days and of a month: once as the endpoint runs it (overlap of the
+GiST-indexed rental periods), and once with the same overlap written on the
+typed start and end dates, which only their B-tree indexes can serve. The
+seeded vehicles, and their rentals with them, are deleted afterwards unless
+`--keep` is given.
+
+Usage (from back-end/src, with POSTGRESQL_URL pointing at a migrated database):
+    python -m benchmark.availability [vehicles] [rentals per vehicle] [--keep]
+"""
+import asyncio
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import Select, delete, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import async_engine
+from models.relational_models import Customer, Invoice, Rental, Vehicle
+from routers.vehicle import VEHICLE_LOAD_OPTIONS
+from utilities.availability import RENTABLE_STATUSES, rental_window
+from utilities.enumerables import BranchLocations, Gender, InvoiceStatus
+from utilities.pagination import paginate
+
+PAGE_SIZE = 100
+RUNS = 5
+LOCATION = BranchLocations.SHIRAZ
+SEED_START = date(2015, 1, 1)
+# Lengths of the searched windows, in days; they start in the middle of the seeded rentals
+WINDOWS = (3, 30)
+
+
+async def seed(vehicles: int, rentals_per_vehicle: int) -> tuple[Customer, Invoice]:
+    customer = Customer(
+        first_name="benchmark", last_name="customer", gender=Gender.MALE, birthday="1370/01/01",
+        national_id="0000000000", username="benchmark_availability", address="benchmark", password="x",
+    )
+    invoice = Invoice(total_amount=1000, tax=0, discount=0, final_amount=1000, status=InvoiceStatus.COMPLETED)
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        session.add_all([customer, invoice])
+        await session.commit()
+
+    locations = [location.name for location in BranchLocations]
+    async with async_engine.begin() as connection:
+        await connection.execute(text(
+            "INSERT INTO vehicle (id, plate_number, location, local_image_address, brand, model, year, color, "
+            "mileage, status, hourly_rental_rate, security_deposit) "
+            "SELECT gen_random_uuid(), 'bench' || n, "
+            "  CAST((CAST(:locations AS text[]))[1 + n % :location_count] AS branchlocations), "
+            "  '/images/benchmark.png', 'TOYOTA', 'benchmark', 1400, 'white', 0, 'AVAILABLE', 100000, 1000000 "
+            "FROM generate_series(1, :vehicles) AS n"
+        ), {"locations": locations, "location_count": len(locations), "vehicles": vehicles})
+        # Rental k of a vehicle starts in the k-th week of the seeded years, a few days long, so rentals of one
+        # vehicle never overlap; the Jalali strings are not read by the queries and are left constant
+        await connection.execute(text(
+            "INSERT INTO rental (id, rental_start_date, rental_end_date, rental_start_on, rental_end_on, "
+            "total_amount, customer_id, vehicle_id, invoice_id) "
+            "SELECT gen_random_uuid(), '1400/01/01', '1400/01/02', slot.start_on, "
+            "  slot.start_on + floor(random() * 4)::int, 1000, :customer_id, slot.vehicle_id, :invoice_id "
+            "FROM ("
+            "  SELECT vehicle.id AS vehicle_id, "
+            "    CAST(:seed_start AS date) + k * 7 + floor(random() * 4)::int AS start_on "
+            "  FROM vehicle, generate_series(0, :rentals - 1) AS k WHERE vehicle.model = 'benchmark'"
+            ") AS slot"
+        ), {
+            "customer_id": customer.id, "invoice_id": invoice.id, "rentals": rentals_per_vehicle,
+            "seed_start": SEED_START,
+        })
+        await connection.execute(text("ANALYZE vehicle"))
+        await connection.execute(text("ANALYZE rental"))
+    return customer, invoice
+
+
+def available_vehicles(overlap) -> Select:
+    overlapping_rentals = select(Rental.id).where(Rental.vehicle_id == Vehicle.id, overlap)
+    query = select(Vehicle).options(*VEHICLE_LOAD_OPTIONS).where(
+        Vehicle.location == LOCATION,
+        Vehicle.status.in_(RENTABLE_STATUSES),
+        ~overlapping_rentals.exists(),
+    )
+    return paginate(query, Vehicle, cursor=None, offset=0, limit=PAGE_SIZE)
+
+
+async def time_query(session: AsyncSession, query) -> float:
+    timings = []
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        (await session.execute(query)).scalars().all()
+        timings.append((time.perf_counter() - started) * 1000)
+        session.expunge_all()
+    return statistics.median(timings)
+
+
+async def main(vehicles: int, rentals_per_vehicle: int, keep: bool) -> None:
+    print(f"seeding {vehicles} vehicles with {rentals_per_vehicle} rentals each ...")
+    customer, invoice = await seed(vehicles, rentals_per_vehicle)
+
+    print(f"{'days':>6}{'available':>11}{'b-tree ms':>12}{'gist ms':>10}")
+    async with AsyncSession(async_engine) as session:
+        for days in WINDOWS:
+            start = SEED_START + timedelta(weeks=rentals_per_vehicle // 2)
+            end = start + timedelta(days=days - 1)
+            by_period = available_vehicles(Rental.__table__.c.rental_period.op("&&")(rental_window(start, end)))
+            by_dates = available_vehicles((Rental.rental_start_on <= end) & (Rental.rental_end_on >= start))
+            available = await session.scalar(
+                select(func.count()).select_from(by_period.order_by(None).limit(None).subquery())
+            )
+            btree_ms = await time_query(session, by_dates)
+            gist_ms = await time_query(session, by_period)
+            print(f"{days:>6}{available:>11}{btree_ms:>12.2f}{gist_ms:>10.2f}")
+
+    if not keep:
+        # The rentals are removed by the ON DELETE CASCADE foreign keys
+        async with async_engine.begin() as connection:
+            await connection.execute(delete(Vehicle).where(Vehicle.model == "benchmark"))
+            await connection.execute(delete(Invoice).where(Invoice.id == invoice.id))
+            await connection.execute(delete(Customer).where(Customer.id == customer.id))
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    arguments = [int(argument) for argument in sys.argv[1:] if argument != "--keep"]
+    asyncio.run(main(*(arguments + [10_000, 500][len(arguments):]), "--keep" in sys.argv))
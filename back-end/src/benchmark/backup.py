@@ -0,0 +1,144 @@
+"""
+Throughput of `GET /backup/` and `POST /restore/`, in rows per second.
+
+Seeds generated invoices dated in 1999, so they are easy to remove, each with one payment
+referencing it. Then backs the whole database up and restores it over itself, once as
+it was done before, with a JSON array per table and an INSERT per row, and once as the
+endpoints do it, copying each table as CSV with `COPY`, parents before the tables
+referencing them. Restoring replaces every table, so run it on a development database.
+The seeded rows are deleted afterwards unless `--keep` is given.
+
+Usage (from back-end/src, with POSTGRESQL_URL pointing at a migrated database):
+    python -m benchmark.backup [invoices] [--keep]
+"""
+import asyncio
+import io
+import sys
+import time
+import zipfile
+from datetime import datetime, timezone
+
+import orjson
+import psycopg2
+from sqlalchemy import text
+
+from database import POSTGRESQL_URL, async_engine
+from routers.backup import restore_json_archive
+from utilities.analytics import refresh_sales_rollup
+from utilities.backup import UNRESTORED_TABLES, backup_chunks, restore_archive
+
+SEED_BEFORE = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+
+async def seed(invoices: int) -> None:
+    async with async_engine.begin() as connection:
+        await connection.execute(text(
+            "INSERT INTO invoice (id, total_amount, tax, discount, final_amount, status, created_at) "
+            "SELECT gen_random_uuid(), 1000, 0, 0, 1000, 'COMPLETED', "
+            "  timestamptz '1999-01-01' + n * interval '1 second' "
+            "FROM generate_series(1, :invoices) AS n"
+        ), {"invoices": invoices})
+        await connection.execute(text(
+            "INSERT INTO payment (id, payment_datetime, payment_method, transaction_id, amount, payment_status, "
+            "invoice_id, payment_at) "
+            "SELECT gen_random_uuid(), '1377/10/11 00:00:00', 'ONLINE_PAYMENT', 'benchmark' || id, 1000, "
+            "  'COMPLETED', id, created_at "
+            "FROM invoice WHERE created_at < :before"
+        ), {"before": SEED_BEFORE})
+
+
+def json_archive() -> bytes:
+    # A JSON array per table, read through a server-side cursor, as backups were written before
+    conn = psycopg2.connect("postgres"+POSTGRESQL_URL[18:])
+    conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT table_name FROM information_schema.tables "
+        "WHERE table_schema = 'public' AND table_type = 'BASE TABLE' AND table_name <> ALL(%s)",
+        (list(UNRESTORED_TABLES),),
+    )
+    tables = [row[0] for row in cur.fetchall()]
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for table in tables:
+            cur.execute(
+                "SELECT column_name FROM information_schema.columns "
+                "WHERE table_schema = 'public' AND table_name = %s AND is_generated = 'NEVER' "
+                "ORDER BY ordinal_position",
+                (table,),
+            )
+            cols = [row[0] for row in cur.fetchall()]
+            with conn.cursor(name=f"backup_{table}") as rows_cur, zf.open(f"{table}.json", mode="w") as entry:
+                rows_cur.execute(f"SELECT {', '.join(cols)} FROM {table}")
+                separator = b"["
+                while rows := rows_cur.fetchmany(1000):
+                    entry.write(separator + b",".join(
+                        orjson.dumps(dict(zip(cols, row)), default=str) for row in rows
+                    ))
+                    separator = b","
+                entry.write(b"]" if separator == b"," else b"[]")
+    conn.close()
+    return archive.getvalue()
+
+
+async def csv_archive() -> bytes:
+    return b"".join([chunk async for chunk in backup_chunks(async_engine, {})])
+
+
+async def count_rows() -> int:
+    async with async_engine.connect() as connection:
+        tables = (await connection.execute(text(
+            "SELECT table_name FROM information_schema.tables "
+            "WHERE table_schema = 'public' AND table_type = 'BASE TABLE' "
+            "AND table_name::text <> ALL(CAST(:unrestored AS text[]))"
+        ), {"unrestored": list(UNRESTORED_TABLES)})).scalars().all()
+        return sum([await connection.scalar(text(f"SELECT count(*) FROM {table}")) for table in tables])
+
+
+async def timed(call) -> tuple[float, object]:
+    started = time.perf_counter()
+    result = await call()
+    return time.perf_counter() - started, result
+
+
+async def main(invoices: int, keep: bool) -> None:
+    print(f"seeding {invoices} invoices with a payment each ...")
+    await seed(invoices)
+    rows = await count_rows()
+    print(f"{rows} rows to back up")
+
+    json_seconds, json_bytes = await timed(lambda: asyncio.to_thread(json_archive))
+    csv_seconds, csv_bytes = await timed(csv_archive)
+    print(f"backup, JSON per row:    {rows / json_seconds:12,.0f} rows/s ({len(json_bytes) / 2**20:.1f} MiB)")
+    print(f"backup, COPY as CSV:     {rows / csv_seconds:12,.0f} rows/s ({len(csv_bytes) / 2**20:.1f} MiB)")
+
+    with zipfile.ZipFile(io.BytesIO(json_bytes)) as zf:
+        json_seconds, _ = await timed(lambda: asyncio.to_thread(restore_json_archive, zf))
+    with zipfile.ZipFile(io.BytesIO(csv_bytes)) as zf:
+        csv_seconds, restored = await timed(lambda: restore_archive(async_engine, zf))
+    assert sum(restored.values()) == rows, restored
+    print(f"restore, INSERT per row: {rows / json_seconds:12,.0f} rows/s")
+    print(f"restore, COPY from CSV:  {rows / csv_seconds:12,.0f} rows/s")
+
+    if not keep:
+        async with async_engine.begin() as connection:
+            await connection.execute(text(
+                "DELETE FROM payment USING invoice WHERE payment.invoice_id = invoice.id "
+                "AND invoice.created_at < :before"
+            ), {"before": SEED_BEFORE})
+        # The invoice ids of the payments are not indexed, so deleting the invoices checks them
+        # with scans of the payments, which must not still hold the rows deleted above
+        async with async_engine.connect() as connection:
+            await connection.execution_options(isolation_level="AUTOCOMMIT")
+            await connection.execute(text("VACUUM payment"))
+        async with async_engine.begin() as connection:
+            await connection.execute(text("DELETE FROM invoice WHERE created_at < :before"), {"before": SEED_BEFORE})
+    async with async_engine.begin() as connection:
+        # The payments, and the restores, marked their days of the sales chart stale
+        await connection.run_sync(refresh_sales_rollup)
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    arguments = [int(argument) for argument in sys.argv[1:] if argument != "--keep"]
+    asyncio.run(main(*(arguments + [100_000][len(arguments):]), "--keep" in sys.argv))
@@ -0,0 +1,112 @@
+"""
+Latency of the public catalogue endpoints with and without a current ETag.
+
+Seeds generated vehicles (model "benchmark", so they are easy to remove), each with a
+few rentals, then times `GET /vehicles/?limit=100` through the application: once
+as a first visit, which runs the queries and serializes the page, and once revalidated
+with the ETag of that response, which only reads the table versions and answers 304.
+The seeded vehicles, and their rentals with them, are deleted afterwards unless `--keep`
+is given.
+
+Usage (from back-end/src, with POSTGRESQL_URL pointing at a migrated database):
+    python -m benchmark.conditional_get [vehicles] [rentals per vehicle] [--keep]
+"""
+import asyncio
+import statistics
+import sys
+import time
+from datetime import timedelta
+
+from httpx import ASGITransport, AsyncClient
+from jdatetime import date as jalali_date
+from sqlalchemy import delete, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import dependencies
+from config import app
+from database import async_engine
+from models.relational_models import Customer, Invoice, Vehicle
+from utilities.cache import MemoryCache
+from utilities.enumerables import Gender, InvoiceStatus
+
+PAGE_SIZE = 100
+RUNS = 20
+
+
+async def seed(vehicles: int, rentals_per_vehicle: int) -> tuple[Customer, Invoice]:
+    customer = Customer(
+        first_name="benchmark", last_name="customer", gender=Gender.MALE, birthday="1370/01/01",
+        national_id="0000000000", username="benchmark_conditional_get", address="benchmark", password="x",
+    )
+    invoice = Invoice(total_amount=1000, tax=0, discount=0, final_amount=1000, status=InvoiceStatus.COMPLETED)
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        session.add_all([customer, invoice])
+        await session.commit()
+
+    # Vehicles are only served with valid plate numbers, and rentals with start dates near today,
+    # so the plates are numbered and the rentals all start tomorrow
+    start = jalali_date.today() + timedelta(days=1)
+    end = start + timedelta(days=1)
+    async with async_engine.begin() as connection:
+        await connection.execute(text(
+            "INSERT INTO vehicle (id, plate_number, location, local_image_address, brand, model, year, color, "
+            "mileage, status, hourly_rental_rate, security_deposit) "
+            "SELECT gen_random_uuid(), "
+            "  lpad((n / 100000 % 100)::text, 2, '0') || 'ی' || lpad((n / 100 % 1000)::text, 3, '0') || '-' "
+            "    || lpad((n % 100)::text, 2, '0'), "
+            "  'TEHRAN', '/images/benchmark.png', 'TOYOTA', 'benchmark', "
+            "  1400, 'white', 0, 'AVAILABLE', 100000, 1000000 "
+            "FROM generate_series(1, :vehicles) AS n"
+        ), {"vehicles": vehicles})
+        await connection.execute(text(
+            "INSERT INTO rental (id, rental_start_date, rental_end_date, rental_start_on, rental_end_on, "
+            "total_amount, customer_id, vehicle_id, invoice_id) "
+            "SELECT gen_random_uuid(), :start_date, :end_date, :start_on, :end_on, 1000, "
+            "  :customer_id, vehicle.id, :invoice_id "
+            "FROM vehicle, generate_series(1, :rentals) WHERE vehicle.model = 'benchmark'"
+        ), {
+            "start_date": start.strftime("%Y/%m/%d"), "end_date": end.strftime("%Y/%m/%d"),
+            "start_on": start.togregorian(), "end_on": end.togregorian(),
+            "customer_id": customer.id, "invoice_id": invoice.id, "rentals": rentals_per_vehicle,
+        })
+        await connection.execute(text("ANALYZE vehicle"))
+        await connection.execute(text("ANALYZE rental"))
+    return customer, invoice
+
+
+async def time_request(client: AsyncClient, headers: dict[str, str], status_code: int) -> float:
+    timings = []
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        response = await client.get("/vehicles/", params={"limit": PAGE_SIZE}, headers=headers)
+        timings.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == status_code, response.status_code
+    return statistics.median(timings)
+
+
+async def main(vehicles: int, rentals_per_vehicle: int, keep: bool) -> None:
+    print(f"seeding {vehicles} vehicles with {rentals_per_vehicle} rentals each ...")
+    customer, invoice = await seed(vehicles, rentals_per_vehicle)
+
+    # Every 200 runs the queries, rather than replaying a cached page
+    dependencies.response_cache = MemoryCache(maxsize=0, ttl=0)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://benchmark") as client:
+        response = await client.get("/vehicles/", params={"limit": PAGE_SIZE})
+        full_ms = await time_request(client, {}, 200)
+        not_modified_ms = await time_request(client, {"If-None-Match": response.headers["ETag"]}, 304)
+
+    print(f"200 with the page ({len(response.content)} bytes): {full_ms:.2f} ms")
+    print(f"304 revalidated:                  {not_modified_ms:.2f} ms")
+
+    if not keep:
+        # The rentals are removed by the ON DELETE CASCADE foreign keys
+        async with async_engine.begin() as connection:
+            await connection.execute(delete(Vehicle).where(Vehicle.model == "benchmark"))
+            await connection.execute(delete(Invoice).where(Invoice.id == invoice.id))
+            await connection.execute(delete(Customer).where(Customer.id == customer.id))
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    arguments = [int(argument) for argument in sys.argv[1:] if argument != "--keep"]
+    asyncio.run(main(*(arguments + [10_000, 20][len(arguments):]), "--keep" in sys.argv))
@@ -0,0 +1,137 @@
+"""
+Latency of the customer-scoped list queries before and after pagination.
+
+Seeds a large customer and a much larger background of other rentals (each
+rental with its own invoice, dated in the year 2000 so they are easy to remove),
+then times, for the large customer, the queries `GET /rentals/` and `GET /invoices/` used to run for a customer
+(every row, with the invoice list de-duplicated after a join) against the
+paginated ones: the first page, and a page at the middle of the list reached
+with a cursor. The seeded rows are deleted afterwards unless `--keep` is given.
+
+Usage (from back-end/src, with POSTGRESQL_URL pointing at a migrated database):
+    python -m benchmark.customer_pagination [rentals of the customer] [--keep]
+"""
+import asyncio
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from uuid import UUID
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import async_engine
+from models.relational_models import Customer, Invoice, Rental, Vehicle
+from utilities.enumerables import BranchLocations, Brand, CarStatus, Gender
+from utilities.pagination import encode_cursor, paginate
+
+SEED_BEFORE = datetime(2001, 1, 1, tzinfo=timezone.utc)
+PAGE_SIZE = 100
+RUNS = 5
+# Rentals of other customers for every rental of the benchmarked one
+BACKGROUND_FACTOR = 10
+
+
+def make_customer(index: int) -> Customer:
+    return Customer(
+        first_name="benchmark", last_name="customer", gender=Gender.MALE, birthday="1370/01/01",
+        national_id=f"{index:010d}", username=f"benchmark{index}", address="benchmark", password="x",
+    )
+
+
+async def seed(rows: int) -> tuple[Customer, list, UUID]:
+    customers = [make_customer(index) for index in range(2)]
+    vehicle = Vehicle(
+        plate_number="00ب000-00", location=BranchLocations.TEHRAN, local_image_address="/images/benchmark.png",
+        brand=Brand.TOYOTA, model="Corolla", year=1400, color="white", mileage=0, status=CarStatus.AVAILABLE,
+    )
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        session.add_all([*customers, vehicle])
+        await session.commit()
+
+    async with async_engine.begin() as connection:
+        for customer, count in zip(customers, (rows, rows * BACKGROUND_FACTOR)):
+            await connection.execute(text(
+                "WITH invoices AS ("
+                "  INSERT INTO invoice (id, total_amount, tax, discount, final_amount, status, created_at) "
+                "  SELECT gen_random_uuid(), 1000, 0, 0, 1000, 'CREATED', "
+                "  timestamptz '2000-01-01' + n * interval '1 second' "
+                "  FROM generate_series(1, :rows) AS n "
+                "  RETURNING id, created_at"
+                ") "
+                "INSERT INTO rental (id, rental_start_date, rental_end_date, rental_start_on, rental_end_on, "
+                "total_amount, created_at, customer_id, vehicle_id, invoice_id) "
+                "SELECT gen_random_uuid(), '1400/01/01', '1400/01/02', '2021-03-21', '2021-03-22', 1000, "
+                "created_at, :customer_id, :vehicle_id, id FROM invoices"
+            ), {"rows": count, "customer_id": customer.id, "vehicle_id": vehicle.id})
+        await connection.execute(text("ANALYZE invoice"))
+        await connection.execute(text("ANALYZE rental"))
+
+    return customers[0], [customer.id for customer in customers], vehicle.id
+
+
+async def time_query(session: AsyncSession, query, unique: bool = False) -> tuple[float, int]:
+    timings, count = [], 0
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        result = (await session.execute(query)).scalars()
+        count = len(result.unique().all() if unique else result.all())
+        timings.append((time.perf_counter() - started) * 1000)
+        session.expunge_all()
+    return statistics.median(timings), count
+
+
+async def middle_cursor(session: AsyncSession, query, model, rows: int) -> str:
+    last = (await session.execute(
+        query.with_only_columns(model.created_at, model.id).order_by(model.created_at, model.id)
+        .offset(rows // 2 - 1).limit(1)
+    )).one()
+    return encode_cursor(last.created_at, last.id)
+
+
+async def main(rows: int, keep: bool) -> None:
+    print(f"seeding {rows} rentals and invoices for the customer and {rows * BACKGROUND_FACTOR} for another ...")
+    customer, customer_ids, vehicle_id = await seed(rows)
+
+    rentals = select(Rental).where(Rental.customer_id == customer.id)
+    customer_invoice_ids = select(Rental.invoice_id).where(Rental.customer_id == customer.id)
+    invoices = select(Invoice).where(Invoice.id.in_(customer_invoice_ids))
+    previous = {
+        "rentals": (rentals.order_by(Rental.created_at), False),
+        "invoices": (
+            select(Invoice).join(Rental).where(Rental.customer_id == customer.id).order_by(Invoice.created_at),
+            True,
+        ),
+    }
+
+    print(f"{'list':>10}{'query':>16}{'rows':>10}{'ms':>10}")
+    async with AsyncSession(async_engine) as session:
+        for name, query, model in (("rentals", rentals, Rental), ("invoices", invoices, Invoice)):
+            cursor = await middle_cursor(session, query, model, rows)
+            for label, (timed_query, unique) in (
+                ("unpaginated", previous[name]),
+                ("first page", (paginate(query, model, cursor=None, offset=0, limit=PAGE_SIZE), False)),
+                ("middle page", (paginate(query, model, cursor=cursor, offset=0, limit=PAGE_SIZE), False)),
+            ):
+                milliseconds, count = await time_query(session, timed_query, unique)
+                print(f"{name:>10}{label:>16}{count:>10}{milliseconds:>10.2f}")
+
+    if not keep:
+        async with async_engine.begin() as connection:
+            await connection.execute(delete(Rental).where(Rental.customer_id.in_(customer_ids)))
+            await connection.execute(delete(Customer).where(Customer.id.in_(customer_ids)))
+            await connection.execute(delete(Vehicle).where(Vehicle.id == vehicle_id))
+        # `rental.invoice_id` is not indexed, so the ON DELETE CASCADE check of every deleted invoice
+        # scans the rental table; vacuum the deleted rentals out of it first
+        async with async_engine.connect() as connection:
+            await connection.execution_options(isolation_level="AUTOCOMMIT")
+            await connection.execute(text("VACUUM rental"))
+        async with async_engine.begin() as connection:
+            await connection.execute(delete(Invoice).where(Invoice.created_at < SEED_BEFORE))
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    arguments = [argument for argument in sys.argv[1:] if argument != "--keep"]
+    asyncio.run(main(int(arguments[0]) if arguments else 20_000, "--keep" in sys.argv))
@@ -0,0 +1,108 @@
+"""
+Latency of the facet counts of the vehicle search.
+
+Seeds generated vehicles (model "benchmark", so they are easy to remove) with random
+brands, statuses, branches, years and rates, then times the counts `GET
+/vehicles/search/?facets=true` returns for a search by year: once as one count query
+per facet value, which is what the catalogue needed before, once as the single
+grouped query of `count_facets`, and once served from the facet cache. The seeded
+vehicles are deleted afterwards unless `--keep` is given.
+
+Usage (from back-end/src, with POSTGRESQL_URL pointing at a migrated database):
+    python -m benchmark.facets [vehicles] [--keep]
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import async_engine
+from models.relational_models import Vehicle
+from routers.vehicle import VEHICLE_FACETS, VEHICLE_PRICE_BUCKETS
+from utilities.enumerables import BranchLocations, Brand, CarStatus
+from utilities.facets import bucket_ranges, count_facets, facet_cache
+
+RUNS = 5
+# The searched years, about a third of the seeded ones
+YEAR_MIN = 1395
+
+
+async def seed(vehicles: int) -> None:
+    async with async_engine.begin() as connection:
+        await connection.execute(text(
+            "INSERT INTO vehicle (id, plate_number, location, local_image_address, brand, model, year, color, "
+            "mileage, status, hourly_rental_rate, security_deposit) "
+            "SELECT gen_random_uuid(), 'bench' || n, "
+            "  CAST((CAST(:locations AS text[]))[1 + floor(random() * :location_count)::int] AS branchlocations), "
+            "  '/images/benchmark.png', "
+            "  CAST((CAST(:brands AS text[]))[1 + floor(random() * :brand_count)::int] AS brand), "
+            "  'benchmark', 1380 + floor(random() * 24)::int, 'white', 0, "
+            "  CAST((CAST(:statuses AS text[]))[1 + floor(random() * :status_count)::int] AS carstatus), "
+            "  1000 + floor(random() * 8000000)::int, 1000000 "
+            "FROM generate_series(1, :vehicles) AS n"
+        ), {
+            "locations": [location.name for location in BranchLocations], "location_count": len(BranchLocations),
+            "brands": [brand.name for brand in Brand], "brand_count": len(Brand),
+            "statuses": [status.name for status in CarStatus], "status_count": len(CarStatus),
+            "vehicles": vehicles,
+        })
+        await connection.execute(text("ANALYZE vehicle"))
+
+
+async def count_separately(session: AsyncSession) -> int:
+    """
+    Counts every facet value with its own query, as the catalogue did one request per value.
+    """
+    searched = Vehicle.year >= YEAR_MIN
+    conditions = [
+        *(Vehicle.brand == brand for brand in Brand),
+        *(Vehicle.status == status for status in CarStatus),
+        *(Vehicle.location == location for location in BranchLocations),
+        *(
+            Vehicle.hourly_rental_rate.between(minimum, maximum if maximum is not None else 2 ** 62)
+            for minimum, maximum in bucket_ranges(VEHICLE_PRICE_BUCKETS)
+        ),
+    ]
+    for condition in conditions:
+        await session.scalar(select(func.count()).select_from(Vehicle).where(searched, condition))
+    return len(conditions)
+
+
+async def time_call(call) -> float:
+    timings = []
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        await call()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+async def main(vehicles: int, keep: bool) -> None:
+    print(f"seeding {vehicles} vehicles ...")
+    await seed(vehicles)
+
+    query = select(Vehicle).where(Vehicle.year >= YEAR_MIN)
+    async with AsyncSession(async_engine) as session:
+        queries = await count_separately(session)
+        separate_ms = await time_call(lambda: count_separately(session))
+        grouped_ms = await time_call(lambda: count_facets(session, query, VEHICLE_FACETS))
+        await count_facets(session, query, VEHICLE_FACETS, cache_key="benchmark")
+        cached_ms = await time_call(lambda: count_facets(session, query, VEHICLE_FACETS, cache_key="benchmark"))
+    facet_cache.clear()
+
+    print(f"{queries} separate count queries: {separate_ms:.2f} ms")
+    print(f"one grouping sets query:       {grouped_ms:.2f} ms")
+    print(f"facet cache:                   {cached_ms:.4f} ms")
+
+    if not keep:
+        async with async_engine.begin() as connection:
+            await connection.execute(delete(Vehicle).where(Vehicle.model == "benchmark"))
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    arguments = [int(argument) for argument in sys.argv[1:] if argument != "--keep"]
+    asyncio.run(main(*(arguments + [1_000_000][len(arguments):]), "--keep" in sys.argv))
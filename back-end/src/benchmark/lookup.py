@@ -0,0 +1,93 @@
+"""
+Latency of the fuzzy customer lookup.
+
+Seeds generated customers (usernames starting with `benchmark_lookup`, so they
+are easy to remove) with names drawn from a small Persian vocabulary, then times
+`GET /customers/lookup/` for a misspelled name, part of a username, the last
+digits of a phone number and the start of a national ID, against the `ILIKE`
+scan a substring search over the same columns would run. The seeded customers
+are deleted afterwards unless `--keep` is given.
+
+Requires the pg_trgm extension and the lookup indexes of the migrations.
+
+Usage (from back-end/src, with POSTGRESQL_URL pointing at a migrated database):
+    python -m benchmark.lookup [customers] [--keep]
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+from sqlalchemy import delete, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import async_engine
+from models.relational_models import Customer
+from utilities.lookup import fuzzy_lookup
+
+LIMIT = 10
+RUNS = 5
+FIRST_NAMES = ["علی", "محمد", "رضا", "حسین", "مهدی", "زهرا", "فاطمه", "مریم", "سارا", "نرگس"]
+LAST_NAMES = ["احمدی", "محمدی", "حسینی", "رضایی", "کریمی", "موسوی", "جعفری", "صادقی", "رحیمی", "کاظمی"]
+
+
+async def seed(customers: int) -> None:
+    async with async_engine.begin() as connection:
+        await connection.execute(text(
+            "INSERT INTO customer (id, first_name, last_name, gender, birthday, national_id, phone, username, "
+            "address, password) "
+            "SELECT gen_random_uuid(), "
+            "  (CAST(:first_names AS text[]))[1 + n % 10], "
+            "  (CAST(:last_names AS text[]))[1 + (n / 10) % 10] || (n / 100), "
+            "  'MALE', '1370/01/01', lpad(n::text, 10, '0'), 9000000000 + n::bigint * 7919 % 1000000000, "
+            "  'benchmark_lookup' || n, 'benchmark', 'x' "
+            "FROM generate_series(1, :customers) AS n"
+        ), {"first_names": FIRST_NAMES, "last_names": LAST_NAMES, "customers": customers})
+        await connection.execute(text("ANALYZE customer"))
+
+
+async def time_query(session: AsyncSession, query) -> float:
+    timings = []
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        (await session.execute(query)).all()
+        timings.append((time.perf_counter() - started) * 1000)
+        session.expunge_all()
+    return statistics.median(timings)
+
+
+async def main(customers: int, keep: bool) -> None:
+    async with async_engine.connect() as connection:
+        if not await connection.scalar(text("SELECT EXISTS (SELECT FROM pg_extension WHERE extname = 'pg_trgm')")):
+            sys.exit("the lookup needs the pg_trgm extension, which is not installed")
+
+    print(f"seeding {customers} customers ...")
+    await seed(customers)
+
+    middle = customers // 2
+    lookups = {
+        "misspelled name": f"{LAST_NAMES[(middle // 10) % 10][:-1]}{middle // 100}",
+        "username part": f"lookup{middle}",
+        "phone digits": str(9000000000 + middle * 7919 % 1000000000)[-7:],
+        "national id": f"{middle:010d}"[:8],
+    }
+    print(f"{'lookup':>16}{'ilike ms':>12}{'lookup ms':>12}")
+    async with AsyncSession(async_engine) as session:
+        for name, q in lookups.items():
+            ilike_ms = await time_query(session, select(Customer).where(or_(
+                (Customer.first_name + " " + Customer.last_name).ilike(f"%{q}%"),
+                Customer.username.ilike(f"%{q}%"),
+                Customer.national_id.ilike(f"%{q}%"),
+            )).limit(LIMIT))
+            lookup_ms = await time_query(session, fuzzy_lookup(Customer, q, limit=LIMIT))
+            print(f"{name:>16}{ilike_ms:>12.2f}{lookup_ms:>12.2f}")
+
+    if not keep:
+        async with async_engine.begin() as connection:
+            await connection.execute(delete(Customer).where(Customer.username.startswith("benchmark_lookup")))
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    arguments = [argument for argument in sys.argv[1:] if argument != "--keep"]
+    asyncio.run(main(int(arguments[0]) if arguments else 5_000_000, "--keep" in sys.argv))
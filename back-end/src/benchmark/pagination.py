@@ -0,0 +1,86 @@
+"""
+Page latency of offset and cursor pagination at increasing depths.
+
+Seeds the invoice table with generated rows (dated in the year 2000, so they sort
+before real data and are easy to remove), then times the list query of
+`GET /invoices/` for one page at each depth, once with `offset` and once with the
+cursor of the row just before that depth. The seeded rows are deleted afterwards
+unless `--keep` is given.
+
+Usage (from back-end/src, with POSTGRESQL_URL pointing at a migrated database):
+    python -m benchmark.pagination [rows] [--keep]
+"""
+import asyncio
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import async_engine
+from models.relational_models import Invoice
+from utilities.pagination import encode_cursor, paginate
+
+SEED_BEFORE = datetime(2001, 1, 1, tzinfo=timezone.utc)
+PAGE_SIZE = 100
+RUNS = 5
+
+
+async def seed(rows: int) -> None:
+    async with async_engine.begin() as connection:
+        await connection.execute(text(
+            "INSERT INTO invoice (id, total_amount, tax, discount, final_amount, status, created_at) "
+            "SELECT gen_random_uuid(), 1000, 0, 0, 1000, 'CREATED', "
+            "timestamptz '2000-01-01' + n * interval '1 second' "
+            "FROM generate_series(1, :rows) AS n"
+        ), {"rows": rows})
+        await connection.execute(text("ANALYZE invoice"))
+
+
+async def time_page(session: AsyncSession, query) -> float:
+    timings = []
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        (await session.execute(query)).scalars().all()
+        timings.append((time.perf_counter() - started) * 1000)
+        session.expunge_all()
+    return statistics.median(timings)
+
+
+async def main(rows: int, keep: bool) -> None:
+    print(f"seeding {rows} invoices ...")
+    await seed(rows)
+
+    depths = [depth for depth in (0, 1_000, 10_000, 100_000, 1_000_000) if depth < rows]
+    print(f"{'depth':>10}{'offset ms':>12}{'cursor ms':>12}")
+    async with AsyncSession(async_engine) as session:
+        for depth in depths:
+            offset_ms = await time_page(
+                session, paginate(select(Invoice), Invoice, cursor=None, offset=depth, limit=PAGE_SIZE)
+            )
+
+            cursor = None
+            if depth:
+                # The cursor a client would hold after reading `depth` rows
+                last = (await session.execute(
+                    select(Invoice.created_at, Invoice.id).order_by(Invoice.created_at, Invoice.id).offset(depth - 1)
+                    .limit(1)
+                )).one()
+                cursor = encode_cursor(last.created_at, last.id)
+            cursor_ms = await time_page(
+                session, paginate(select(Invoice), Invoice, cursor=cursor, offset=0, limit=PAGE_SIZE)
+            )
+
+            print(f"{depth:>10}{offset_ms:>12.2f}{cursor_ms:>12.2f}")
+
+    if not keep:
+        async with async_engine.begin() as connection:
+            await connection.execute(delete(Invoice).where(Invoice.created_at < SEED_BEFORE))
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    arguments = [argument for argument in sys.argv[1:] if argument != "--keep"]
+    asyncio.run(main(int(arguments[0]) if arguments else 1_100_000, "--keep" in sys.argv))
@@ -0,0 +1,87 @@
+"""
+Latency of unrelated GET requests while logins are being verified.
+
+Runs a minimal app in-process with one cheap GET route and two login routes,
+one verifying the password inline on the event loop and one awaiting the
+password process pool, then reports GET latency percentiles for both.
+
+Usage (from back-end/src):
+    python -m benchmark.password_hashing [concurrent_logins] [get_requests]
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from utilities.password_hashing import get_password_hash, verify_password, verify_password_async, \
+    shutdown_password_executor
+
+PASSWORD = "Benchmark-Password-1234"
+HASHED_PASSWORD = get_password_hash(PASSWORD)
+
+app = FastAPI()
+
+
+@app.get("/ping/")
+async def ping() -> dict[str, str]:
+    return {"msg": "pong"}
+
+
+@app.post("/login-inline/")
+async def login_inline() -> dict[str, bool]:
+    return {"ok": verify_password(PASSWORD, HASHED_PASSWORD)}
+
+
+@app.post("/login-pool/")
+async def login_pool() -> dict[str, bool]:
+    return {"ok": await verify_password_async(PASSWORD, HASHED_PASSWORD)}
+
+
+def percentile(samples: list[float], ratio: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * ratio))]
+
+
+async def measure(client: AsyncClient, login_path: str, logins: int, gets: int, interval: float) -> list[float]:
+    latencies = []
+
+    async def get_stream():
+        # Latency is taken from the moment each GET was due, so time spent waiting
+        # for a blocked event loop is counted instead of silently skipped
+        started = time.perf_counter()
+        for index in range(gets):
+            due = started + index * interval
+            await asyncio.sleep(max(0.0, due - time.perf_counter()))
+            await client.get("/ping/")
+            latencies.append((time.perf_counter() - due) * 1000)
+
+    async def login_burst():
+        await asyncio.gather(*(client.post(login_path) for _ in range(logins)))
+
+    await asyncio.gather(get_stream(), login_burst())
+    return latencies
+
+
+async def main(logins: int, gets: int) -> None:
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        # Warm the process pool so worker start-up is not part of the measurement
+        await verify_password_async(PASSWORD, HASHED_PASSWORD)
+
+        for label, path in (("inline verify", "/login-inline/"), ("process pool", "/login-pool/")):
+            latencies = await measure(client, path, logins, gets, interval=0.002)
+            print(
+                f"{label:>14}: GET p50={statistics.median(latencies):8.2f} ms"
+                f"  p99={percentile(latencies, 0.99):8.2f} ms"
+                f"  max={max(latencies):8.2f} ms"
+            )
+
+    shutdown_password_executor()
+
+
+if __name__ == "__main__":
+    concurrent_logins = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    get_requests = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    asyncio.run(main(concurrent_logins, get_requests))
@@ -0,0 +1,99 @@
+"""
+Per-request authentication overhead for every protected route of the API.
+
+Resolves the dependency tree of each route that requires a role, once with the
+request-scoped principal dependency and once with an emulation of the previous
+chain (OAuth2 header parsing plus a separate header parse and full JWT decode),
+and reports the mean resolution time per router.
+
+Usage (from back-end/src, with CRMS_SECURITY_KEY and POSTGRESQL_URL set; no
+database connection is made):
+    python -m benchmark.principal [iterations]
+"""
+import asyncio
+import sys
+import time
+from collections import defaultdict
+from contextlib import AsyncExitStack
+from datetime import timedelta
+from uuid import UUID, uuid4
+
+from fastapi import Request
+from fastapi.dependencies.utils import solve_dependencies
+from fastapi.routing import APIRoute
+from fastapi.security.utils import get_authorization_scheme_param
+
+from config import app
+from dependencies import Principal, get_current_user
+from utilities.authentication import create_access_token, decode_access_token
+
+
+def legacy_get_current_user(request: Request) -> Principal:
+    # The previous routes resolved the bearer token twice: once through the OAuth2
+    # scheme and once by hand, followed by a full JWT verification
+    get_authorization_scheme_param(request.headers.get("Authorization"))
+    token = request.headers.get("Authorization").removeprefix("Bearer ").strip()
+    payload = decode_access_token(token)
+    return Principal(id=UUID(payload["id"]), role=payload["role"])
+
+
+def protected_routes() -> list[APIRoute]:
+    routes = []
+    for route in app.routes:
+        if not isinstance(route, APIRoute):
+            continue
+        stack = list(route.dependant.dependencies)
+        while stack:
+            dependency = stack.pop()
+            if dependency.call is get_current_user:
+                routes.append(route)
+                break
+            stack.extend(dependency.dependencies)
+    return routes
+
+
+async def resolve(route: APIRoute, headers: list[tuple[bytes, bytes]], iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        request = Request({
+            "type": "http",
+            "method": next(iter(route.methods)),
+            "path": route.path,
+            "headers": headers,
+            "query_string": b"",
+            "path_params": {},
+        })
+        async with AsyncExitStack() as stack:
+            await solve_dependencies(
+                request=request,
+                dependant=route.dependant,
+                dependency_overrides_provider=app,
+                async_exit_stack=stack,
+                embed_body_fields=False,
+            )
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+async def main(iterations: int) -> None:
+    token = create_access_token(data={"id": str(uuid4()), "role": "SuperAdmin"}, expires_delta=timedelta(minutes=15))
+    headers = [(b"authorization", f"Bearer {token}".encode())]
+
+    current, legacy = defaultdict(list), defaultdict(list)
+    for route in protected_routes():
+        router_name = route.endpoint.__module__.removeprefix("routers.")
+
+        current[router_name].append(await resolve(route, headers, iterations))
+
+        app.dependency_overrides[get_current_user] = legacy_get_current_user
+        legacy[router_name].append(await resolve(route, headers, iterations))
+        app.dependency_overrides.clear()
+
+    print(f"{'router':<20}{'routes':>8}{'legacy us':>12}{'principal us':>14}{'saved':>8}")
+    for router_name in sorted(current):
+        before = sum(legacy[router_name]) / len(legacy[router_name])
+        after = sum(current[router_name]) / len(current[router_name])
+        print(f"{router_name:<20}{len(current[router_name]):>8}{before:>12.1f}{after:>14.1f}{1 - after / before:>8.0%}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
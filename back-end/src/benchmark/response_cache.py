@@ -0,0 +1,70 @@
+"""
+Latency of the catalogue endpoints answered from the response cache.
+
+Seeds the vehicles and rentals of `benchmark.conditional_get`, then times `GET
+/vehicles/?limit=100` through the application: once with the response cache
+disabled, which runs the queries and serializes the page on every request, and once
+with the cache configured by `CRMS_CACHE_URL` (memory when unset), which only reads
+the table versions and replays the stored page. The seeded vehicles, and their rentals
+with them, are deleted afterwards unless `--keep` is given.
+
+Usage (from back-end/src, with POSTGRESQL_URL pointing at a migrated database):
+    python -m benchmark.response_cache [vehicles] [rentals per vehicle] [--keep]
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import delete
+
+import dependencies
+from benchmark.conditional_get import seed
+from config import app
+from database import async_engine
+from models.relational_models import Customer, Invoice, Vehicle
+from utilities.cache import MemoryCache, response_cache
+
+PAGE_SIZE = 100
+RUNS = 20
+
+
+async def time_request(client: AsyncClient) -> float:
+    timings = []
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        response = await client.get("/vehicles/", params={"limit": PAGE_SIZE})
+        timings.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200, response.status_code
+    return statistics.median(timings)
+
+
+async def main(vehicles: int, rentals_per_vehicle: int, keep: bool) -> None:
+    print(f"seeding {vehicles} vehicles with {rentals_per_vehicle} rentals each ...")
+    customer, invoice = await seed(vehicles, rentals_per_vehicle)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://benchmark") as client:
+        # A memory cache of no entries stores nothing
+        dependencies.response_cache = MemoryCache(maxsize=0, ttl=0)
+        uncached_ms = await time_request(client)
+        dependencies.response_cache = response_cache
+        cached_ms = await time_request(client)
+        stats = await response_cache.stats()
+    await response_cache.close()
+
+    print(f"uncached:                {uncached_ms:.2f} ms")
+    print(f"cached ({stats['backend']}, {stats['hits']} hits): {cached_ms:.2f} ms")
+
+    if not keep:
+        # The rentals are removed by the ON DELETE CASCADE foreign keys
+        async with async_engine.begin() as connection:
+            await connection.execute(delete(Vehicle).where(Vehicle.model == "benchmark"))
+            await connection.execute(delete(Invoice).where(Invoice.id == invoice.id))
+            await connection.execute(delete(Customer).where(Customer.id == customer.id))
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    arguments = [int(argument) for argument in sys.argv[1:] if argument != "--keep"]
+    asyncio.run(main(*(arguments + [10_000, 20][len(arguments):]), "--keep" in sys.argv))
@@ -0,0 +1,53 @@
+"""
+Application start-up time with and without running DDL on boot.
+
+Runs the start-up work of the application's lifespan against the configured
+database, once the previous way (`create_all`, which inspects every table
+before creating the missing ones) and once with the Alembic revision check,
+disposing the connection pool before each run so every run opens a new
+connection the way a cold-started worker does.
+
+Usage (from back-end/src, with POSTGRESQL_URL pointing at a migrated database):
+    python -m benchmark.startup [runs]
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+from sqlalchemy import event
+
+from database import async_engine, check_schema, create_tables
+
+
+async def measure(startup, runs: int) -> tuple[list[float], int]:
+    timings, statements = [], 0
+
+    def before_cursor_execute(*_):
+        nonlocal statements
+        statements += 1
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    for _ in range(runs):
+        await async_engine.dispose()
+        started = time.perf_counter()
+        await startup()
+        timings.append((time.perf_counter() - started) * 1000)
+    event.remove(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+    return timings, statements // runs
+
+
+async def main(runs: int) -> None:
+    for label, startup in (("create_all", create_tables), ("revision check", check_schema)):
+        timings, statements = await measure(startup, runs)
+        print(
+            f"{label:>14}: median={statistics.median(timings):8.2f} ms"
+            f"  max={max(timings):8.2f} ms  statements={statements}"
+        )
+
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20))
@@ -0,0 +1,117 @@
+"""
+Latency of the dashboard counts of `GET /stats/`.
+
+Seeds generated vehicles (model "benchmark") and payments (on one benchmark invoice),
+then times the counts of the super admin dashboard: once as the seven `count(*)`
+subqueries `/stats/` ran before, which scan the tables, and once as the endpoint reads
+the counters the triggers keep. The seeded rows are deleted afterwards unless `--keep`
+is given.
+
+Usage (from back-end/src, with POSTGRESQL_URL pointing at a migrated database):
+    python -m benchmark.stats [vehicles] [payments] [--keep]
+"""
+import asyncio
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import async_engine
+from models.counter import DailyPurchaseCount
+from models.relational_models import Invoice, Payment, Vehicle
+from routers.stats import SUPER_ADMIN_COUNTS, row_count
+from utilities.counters import PURCHASE_TIME_ZONE
+from utilities.enumerables import InvoiceStatus
+
+RUNS = 5
+
+
+async def seed(vehicles: int, payments: int) -> Invoice:
+    invoice = Invoice(total_amount=1000, tax=0, discount=0, final_amount=1000, status=InvoiceStatus.COMPLETED)
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        session.add(invoice)
+        await session.commit()
+
+    async with async_engine.begin() as connection:
+        await connection.execute(text(
+            "INSERT INTO vehicle (id, plate_number, location, local_image_address, brand, model, year, color, "
+            "mileage, status, hourly_rental_rate, security_deposit) "
+            "SELECT gen_random_uuid(), 'bench' || n, 'TEHRAN', '/images/benchmark.png', 'TOYOTA', 'benchmark', "
+            "  1400, 'white', 0, 'AVAILABLE', 100000, 1000000 "
+            "FROM generate_series(1, :vehicles) AS n"
+        ), {"vehicles": vehicles})
+        # Payments of the last year, a few of them today
+        await connection.execute(text(
+            "INSERT INTO payment (id, payment_datetime, payment_method, transaction_id, amount, payment_status, "
+            "invoice_id, payment_at) "
+            "SELECT gen_random_uuid(), '1400/01/01 00:00:00', 'ONLINE_PAYMENT', 'benchmark' || n, 1000, "
+            "  'COMPLETED', :invoice_id, now() - random() * interval '365 days' "
+            "FROM generate_series(1, :payments) AS n"
+        ), {"invoice_id": invoice.id, "payments": payments})
+        await connection.execute(text("ANALYZE vehicle"))
+        await connection.execute(text("ANALYZE payment"))
+    return invoice
+
+
+def scanned_counts():
+    """
+    The statement `/stats/` ran for super admins before the counters.
+    """
+    today_start = datetime.now(ZoneInfo(PURCHASE_TIME_ZONE)).replace(hour=0, minute=0, second=0, microsecond=0)
+    today_end = today_start + timedelta(days=1)
+    return select(
+        *(select(func.count(model.id)).scalar_subquery() for model in SUPER_ADMIN_COUNTS),
+        select(func.count(Payment.id)).where(
+            (Payment.payment_at >= today_start) & (Payment.payment_at < today_end)
+        ).scalar_subquery(),
+    )
+
+
+def counter_counts():
+    today = datetime.now(ZoneInfo(PURCHASE_TIME_ZONE)).date()
+    return select(
+        *(row_count(model) for model in SUPER_ADMIN_COUNTS),
+        select(func.coalesce(func.max(DailyPurchaseCount.purchase_count), 0)).where(
+            DailyPurchaseCount.day == today
+        ).scalar_subquery(),
+    )
+
+
+async def time_query(session: AsyncSession, query) -> tuple[float, tuple]:
+    timings = []
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        row = (await session.execute(query)).one()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), tuple(row)
+
+
+async def main(vehicles: int, payments: int, keep: bool) -> None:
+    print(f"seeding {vehicles} vehicles and {payments} payments ...")
+    started = time.perf_counter()
+    invoice = await seed(vehicles, payments)
+    print(f"seeded in {time.perf_counter() - started:.1f} s, counters included")
+
+    async with AsyncSession(async_engine) as session:
+        scanned_ms, scanned = await time_query(session, scanned_counts())
+        counters_ms, counted = await time_query(session, counter_counts())
+    assert scanned == counted, (scanned, counted)
+
+    print(f"count(*) subqueries: {scanned_ms:.2f} ms")
+    print(f"counters:            {counters_ms:.2f} ms")
+
+    if not keep:
+        # The payments are removed by the ON DELETE CASCADE foreign key
+        async with async_engine.begin() as connection:
+            await connection.execute(delete(Vehicle).where(Vehicle.model == "benchmark"))
+            await connection.execute(delete(Invoice).where(Invoice.id == invoice.id))
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    arguments = [int(argument) for argument in sys.argv[1:] if argument != "--keep"]
+    asyncio.run(main(*(arguments + [1_000_000, 1_000_000][len(arguments):]), "--keep" in sys.argv))
@@ -0,0 +1,123 @@
+"""
+Latency of full-text search on comments against a substring scan.
+
+Seeds one customer with generated comments made of words drawn from a small
+Persian vocabulary (skewed, so the first words are common and the last ones
+rare, with some words written with the Arabic yeh and kaf), then times, for a
+common, an uncommon and a rare word, the first page of `GET /comments/?q=`
+(ranked, through the GIN index on the generated `tsvector`) against the
+`ILIKE '%word%'` query a substring search would run, which also misses the
+rows written with the Arabic letters. The customer and its
+comments are deleted afterwards unless `--keep` is given.
+
+Usage (from back-end/src, with POSTGRESQL_URL pointing at a migrated database):
+    python -m benchmark.text_search [comments] [--keep]
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+from sqlalchemy import delete, func, literal_column, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import async_engine
+from models.relational_models import Comment, Customer
+from routers.comment import COMMENT_LOAD_OPTIONS
+from utilities.enumerables import Gender
+from utilities.text_search import TEXT_SEARCH_CONFIG, full_text_search, normalize_persian
+
+PAGE_SIZE = 20
+RUNS = 5
+WORDS_PER_COMMENT = 12
+VOCABULARY = [
+    "خودرو", "اجاره", "قیمت", "خوب", "بود", "ماشین", "تحویل", "راننده", "سفر", "تمیز",
+    "پشتیبانی", "رزرو", "شعبه", "تهران", "کیفیت", "سریع", "مناسب", "بیمه", "پرداخت", "تخفیف",
+    "كرايه", "مشكل", "تاخير", "قرارداد", "ودیعه", "کیلومتر", "بنزین", "لاستیک", "آینه", "صندلی",
+    "مسافرت", "اصفهان", "شیراز", "مشهد", "تبریز", "فرودگاه", "هتل", "شب", "روز", "هفته",
+    "تعمیر", "خرابی", "سرویس", "روغن", "ترمز", "کولر", "بخاری", "گیربکس", "موتور", "باتری",
+    "کارمند", "مودب", "صبور", "دقیق", "منظم", "مرتب", "جادار", "راحت", "کم‌مصرف", "پرقدرت",
+]
+# Searched words, from common to rare in the seeded vocabulary
+SEARCHED = ["خودرو", "کرایه", "کم‌مصرف"]
+
+
+async def seed(comments: int) -> Customer:
+    customer = Customer(
+        first_name="benchmark", last_name="customer", gender=Gender.MALE, birthday="1370/01/01",
+        national_id="0000000000", username="benchmark_text_search", address="benchmark", password="x",
+    )
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        session.add(customer)
+        await session.commit()
+
+    async with async_engine.begin() as connection:
+        # Each word is drawn with a squared uniform index, so low indices are much more frequent
+        await connection.execute(text(
+            "INSERT INTO comment (id, subject, content, status, customer_id) "
+            "SELECT gen_random_uuid(), 'FEEDBACK', words.content, 'APPROVED', :customer_id "
+            "FROM generate_series(1, :comments) AS n, LATERAL ("
+            "  SELECT string_agg("
+            "    (CAST(:vocabulary AS text[]))[1 + floor(power(random(), 2) * :size)::int], ' '"
+            "  ) AS content "
+            "  FROM generate_series(1, :words) WHERE n > 0"
+            ") AS words"
+        ), {
+            "customer_id": customer.id, "comments": comments, "vocabulary": VOCABULARY,
+            "size": len(VOCABULARY), "words": WORDS_PER_COMMENT,
+        })
+        await connection.execute(text("ANALYZE comment"))
+    return customer
+
+
+async def time_query(session: AsyncSession, query) -> float:
+    timings = []
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        (await session.execute(query)).scalars().all()
+        timings.append((time.perf_counter() - started) * 1000)
+        session.expunge_all()
+    return statistics.median(timings)
+
+
+async def main(comments: int, keep: bool) -> None:
+    print(f"seeding {comments} comments ...")
+    customer = await seed(comments)
+
+    print(f"{'word':>12}{'matches':>10}{'ilike matches':>15}{'ilike ms':>12}{'ranked ms':>12}")
+    async with AsyncSession(async_engine) as session:
+        for word in SEARCHED:
+            matches = await session.scalar(
+                select(func.count()).where(
+                    Comment.__table__.c.search_vector.bool_op("@@")(
+                        func.websearch_to_tsquery(literal_column(f"'{TEXT_SEARCH_CONFIG}'::regconfig"), normalize_persian(word))
+                    )
+                )
+            )
+            ilike_matches = await session.scalar(
+                select(func.count()).where(Comment.content.ilike(f"%{word}%"))
+            )
+            ilike_ms = await time_query(
+                session,
+                select(Comment).options(*COMMENT_LOAD_OPTIONS).where(Comment.content.ilike(f"%{word}%"))
+                .order_by(Comment.created_at, Comment.id).limit(PAGE_SIZE),
+            )
+            ranked_ms = await time_query(
+                session,
+                full_text_search(
+                    select(Comment).options(*COMMENT_LOAD_OPTIONS), Comment.__table__.c.search_vector, word,
+                    offset=0, limit=PAGE_SIZE,
+                ),
+            )
+            print(f"{word:>12}{matches:>10}{ilike_matches:>15}{ilike_ms:>12.2f}{ranked_ms:>12.2f}")
+
+    if not keep:
+        # The comments are removed by the ON DELETE CASCADE foreign key
+        async with async_engine.begin() as connection:
+            await connection.execute(delete(Customer).where(Customer.id == customer.id))
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    arguments = [argument for argument in sys.argv[1:] if argument != "--keep"]
+    asyncio.run(main(int(arguments[0]) if arguments else 1_000_000, "--keep" in sys.argv))
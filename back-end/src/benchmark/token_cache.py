@@ -0,0 +1,31 @@
+"""
+Cost of verifying the same access token with and without the verified-token cache.
+
+Usage (from back-end/src, with CRMS_SECURITY_KEY set):
+    python -m benchmark.token_cache [iterations]
+"""
+import sys
+import timeit
+from datetime import timedelta
+
+from utilities.authentication import create_access_token, decode_access_token, decode_access_token_cached, \
+    token_cache
+
+
+def main(iterations: int) -> None:
+    token = create_access_token(
+        data={"id": "00000000-0000-0000-0000-000000000000", "role": "SuperAdmin"},
+        expires_delta=timedelta(minutes=15),
+    )
+
+    uncached = timeit.timeit(lambda: decode_access_token(token), number=iterations)
+    cached = timeit.timeit(lambda: decode_access_token_cached(token), number=iterations)
+
+    print(f"jwt.decode      : {uncached / iterations * 1e6:8.2f} us/token")
+    print(f"cached decode   : {cached / iterations * 1e6:8.2f} us/token")
+    print(f"speed-up        : {uncached / cached:8.1f}x")
+    print(f"cache stats     : {token_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,135 @@
+"""
+Latency of the fleet utilization of `GET /stats/utilization/` over a year.
+
+Seeds generated vehicles (model "benchmark", so they are easy to remove) spread over
+the branches, each with a year of rentals starting a week apart and lasting up to nine
+days, so some of them overlap. Then times the utilization of every vehicle and branch
+over the year: once as it was computed before, loading every overlapping rental and
+merging its days per vehicle in Python, and once as the endpoint computes it, merging
+the rental periods into ranges and sweeping them in the database; and times one page
+of `GET /stats/utilization/vehicles/`. The seeded vehicles, and their rentals with them,
+are deleted afterwards unless `--keep` is given.
+
+Usage (from back-end/src, with POSTGRESQL_URL pointing at a migrated database):
+    python -m benchmark.utilization [vehicles] [--keep]
+"""
+import asyncio
+import statistics
+import sys
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import async_engine
+from models.relational_models import Customer, Invoice, Rental, Vehicle
+from utilities.analytics import refresh_sales_rollup
+from utilities.enumerables import BranchLocations, Gender, InvoiceStatus
+from utilities.utilization import fleet_utilization, vehicle_utilization
+
+PAGE_SIZE = 100
+RUNS = 5
+SEED_START = date(2015, 1, 1)
+SEED_END = date(2015, 12, 31)
+
+
+async def seed(vehicles: int) -> tuple[Customer, Invoice]:
+    customer = Customer(
+        first_name="benchmark", last_name="customer", gender=Gender.MALE, birthday="1370/01/01",
+        national_id="0000000000", username="benchmark_utilization", address="benchmark", password="x",
+    )
+    invoice = Invoice(total_amount=1000, tax=0, discount=0, final_amount=1000, status=InvoiceStatus.COMPLETED)
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        session.add_all([customer, invoice])
+        await session.commit()
+
+    locations = [location.name for location in BranchLocations]
+    async with async_engine.begin() as connection:
+        await connection.execute(text(
+            "INSERT INTO vehicle (id, plate_number, location, local_image_address, brand, model, year, color, "
+            "mileage, status, hourly_rental_rate, security_deposit) "
+            "SELECT gen_random_uuid(), 'bench' || n, "
+            "  CAST((CAST(:locations AS text[]))[1 + n % :location_count] AS branchlocations), "
+            "  '/images/benchmark.png', 'TOYOTA', 'benchmark', 1400, 'white', 0, 'AVAILABLE', 100000, 1000000 "
+            "FROM generate_series(1, :vehicles) AS n"
+        ), {"locations": locations, "location_count": len(locations), "vehicles": vehicles})
+        # The Jalali strings are not read by the queries and are left constant
+        await connection.execute(text(
+            "INSERT INTO rental (id, rental_start_date, rental_end_date, rental_start_on, rental_end_on, "
+            "total_amount, customer_id, vehicle_id, invoice_id) "
+            "SELECT gen_random_uuid(), '1400/01/01', '1400/01/02', slot.start_on, "
+            "  slot.start_on + floor(random() * 9)::int, 1000, :customer_id, slot.vehicle_id, :invoice_id "
+            "FROM ("
+            "  SELECT vehicle.id AS vehicle_id, CAST(:seed_start AS date) + k * 7 + floor(random() * 4)::int "
+            "    AS start_on "
+            "  FROM vehicle, generate_series(0, 51) AS k WHERE vehicle.model = 'benchmark'"
+            ") AS slot"
+        ), {"customer_id": customer.id, "invoice_id": invoice.id, "seed_start": SEED_START})
+        await connection.execute(text("ANALYZE vehicle"))
+        await connection.execute(text("ANALYZE rental"))
+    return customer, invoice
+
+
+async def utilization_in_python(session: AsyncSession) -> dict:
+    # Every rental overlapping the year, merged per vehicle into the days it was rented on
+    rentals = (await session.execute(
+        select(Rental).where(Rental.rental_start_on <= SEED_END, Rental.rental_end_on >= SEED_START)
+    )).scalars().all()
+    locations = dict((await session.execute(select(Vehicle.id, Vehicle.location))).all())
+    rented_days = defaultdict(set)
+    for rental in rentals:
+        first, last = max(rental.rental_start_on, SEED_START), min(rental.rental_end_on, SEED_END)
+        rented_days[rental.vehicle_id].update(first + timedelta(days=day) for day in range((last - first).days + 1))
+
+    per_branch = defaultdict(int)
+    for vehicle_id, days in rented_days.items():
+        per_branch[locations[vehicle_id]] += len(days)
+    return per_branch
+
+
+async def time_call(call) -> float:
+    timings = []
+    for _ in range(RUNS):
+        async with AsyncSession(async_engine) as session:
+            started = time.perf_counter()
+            await call(session)
+            timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+async def main(vehicles: int, keep: bool) -> None:
+    print(f"seeding {vehicles} vehicles with a year of rentals ...")
+    customer, invoice = await seed(vehicles)
+
+    async with AsyncSession(async_engine) as session:
+        fleet, _ = await fleet_utilization(session, SEED_START, SEED_END)
+        page = (await session.execute(
+            select(Vehicle.id).where(Vehicle.model == "benchmark").order_by(Vehicle.created_at, Vehicle.id)
+            .limit(PAGE_SIZE)
+        )).scalars().all()
+    print(f"{fleet.vehicle_count} vehicles rented {fleet.utilization:.1%} of the year, "
+          f"at most {fleet.peak_rented_vehicles} at once")
+
+    python_ms = await time_call(utilization_in_python)
+    fleet_ms = await time_call(lambda session: fleet_utilization(session, SEED_START, SEED_END))
+    page_ms = await time_call(lambda session: vehicle_utilization(session, SEED_START, SEED_END, page))
+    print(f"rentals loaded and merged in Python: {python_ms:.2f} ms")
+    print(f"fleet, branches and peaks in SQL:    {fleet_ms:.2f} ms")
+    print(f"page of {PAGE_SIZE} vehicles with idle gaps: {page_ms:.2f} ms")
+
+    if not keep:
+        # The rentals are removed by the ON DELETE CASCADE foreign keys
+        async with async_engine.begin() as connection:
+            await connection.execute(delete(Vehicle).where(Vehicle.model == "benchmark"))
+            await connection.execute(delete(Invoice).where(Invoice.id == invoice.id))
+            await connection.execute(delete(Customer).where(Customer.id == customer.id))
+            # The rentals marked their days of the sales chart stale
+            await connection.run_sync(refresh_sales_rollup)
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    arguments = [int(argument) for argument in sys.argv[1:] if argument != "--keep"]
+    asyncio.run(main(*(arguments + [10_000][len(arguments):]), "--keep" in sys.argv))
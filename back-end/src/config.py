@@ -4,8 +4,10 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import ORJSONResponse
 
 from database import lifespan
+from dependencies import mark_recent_write
 from routers import backup, customer, admin, invoice, payment, rental, vehicle, vehicle_insurance, comment, post, \
     authentication, api_status, stats
+from utilities.pagination import NEXT_CURSOR_HEADER
 
 description = """
 A lightweight RESTful API for a CRMS application using FastAPI and SQLModel 🚀
@@ -42,6 +44,7 @@ app.add_middleware(
     allow_origins=origins,
     allow_methods=["GET", "POST", "OPTIONS", "HEAD", "PATCH", "DELETE"],
     allow_headers=["Content-Type", "accept", "Authorization", "Authorization-Refresh"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 
@@ -55,6 +58,15 @@ async def add_security_headers(request: Request, call_next):
     return response
 
 
+@app.middleware("http")
+async def track_writes(request: Request, call_next):
+    response = await call_next(request)
+    # Successful unsafe requests send the client's next reads to the primary database
+    if request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+        mark_recent_write(request, response)
+    return response
+
+
 app.include_router(api_status.router, tags=["api status"])
 app.include_router(backup.router, tags=["backup"])
 app.include_router(authentication.router, tags=["authentication"])
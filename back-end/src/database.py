@@ -1,19 +1,77 @@
+import asyncio
+import logging
 from contextlib import asynccontextmanager
 from os import getenv
+from pathlib import Path
 
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
 from fastapi import FastAPI
-from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy import text
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from sqlmodel import SQLModel
 
 # Importing models to identify them in SQLModel metadata
-from models import relational_models, branch, fines_damage, system_log, system_setting, vehicle_maintenance
+from models import (
+    relational_models, branch, counter, fines_damage, sales_rollup, system_log, system_setting, table_version,
+    vehicle_maintenance,
+)
+from utilities.analytics import SALES_REFRESH_INTERVAL, refresh_sales_rollup_periodically
+from utilities.cache import response_cache
+from utilities.counters import COUNTER_RECONCILE_INTERVAL, reconcile_counters_periodically
+from utilities.password_hashing import shutdown_password_executor
+from utilities.pool_metrics import InstrumentedAsyncQueuePool
 
 
 # Retrieve the database URL from environment variables
 POSTGRESQL_URL = getenv("POSTGRESQL_URL")
 
-# Create an asynchronous SQLAlchemy engine with logging enabled
-async_engine = create_async_engine(POSTGRESQL_URL)
+# Optional read replica; GET endpoints read from the primary when it is not set
+POSTGRESQL_REPLICA_URL = getenv("POSTGRESQL_REPLICA_URL")
+
+# Connection pool settings (SQLAlchemy defaults unless overridden)
+DB_POOL_SIZE = int(getenv("CRMS_DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(getenv("CRMS_DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(getenv("CRMS_DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(getenv("CRMS_DB_POOL_RECYCLE", -1))
+DB_POOL_PRE_PING = getenv("CRMS_DB_POOL_PRE_PING", "false").lower() in ("1", "true", "yes")
+
+# Create the tables of an empty database on startup and mark it as migrated to the latest revision
+CREATE_TABLES = getenv("CRMS_CREATE_TABLES", "false").lower() in ("1", "true", "yes")
+
+# Directory holding the Alembic migration scripts
+ALEMBIC_SCRIPT_LOCATION = Path(__file__).resolve().parent / "alembic"
+
+logger = logging.getLogger(__name__)
+
+
+def create_engine(url: str) -> AsyncEngine:
+    """
+    Creates an asynchronous SQLAlchemy engine whose pool records checkout metrics.
+
+    Args:
+        url (str): The database URL to connect to.
+
+    Returns:
+        AsyncEngine: The engine, configured with the connection pool settings above.
+    """
+    return create_async_engine(
+        url,
+        poolclass=InstrumentedAsyncQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+
+
+# Engine used for writes and for reads that must see them
+async_engine = create_engine(POSTGRESQL_URL)
+
+# Engine used for reads; the primary engine itself when no replica is configured
+async_read_engine = create_engine(POSTGRESQL_REPLICA_URL) if POSTGRESQL_REPLICA_URL else async_engine
 
 
 async def create_tables():
@@ -25,6 +83,65 @@ async def create_tables():
         await connection.run_sync(SQLModel.metadata.create_all)
 
 
+def get_head_revisions() -> set[str]:
+    """
+    Returns the head revisions of the Alembic migration scripts.
+
+    Returns:
+        set[str]: The revisions the database schema must be at to match the models.
+    """
+    return set(ScriptDirectory(str(ALEMBIC_SCRIPT_LOCATION)).get_heads())
+
+
+async def get_current_revisions() -> set[str]:
+    """
+    Returns the Alembic revisions the database schema is at, using a single query.
+
+    Returns:
+        set[str]: The current revisions, empty if the database has never been migrated.
+    """
+    async with async_engine.connect() as connection:
+        try:
+            result = await connection.execute(text("SELECT version_num FROM alembic_version"))
+        except ProgrammingError:
+            # The version table does not exist yet
+            return set()
+        return set(result.scalars().all())
+
+
+def _stamp_heads(connection) -> None:
+    MigrationContext.configure(connection).stamp(ScriptDirectory(str(ALEMBIC_SCRIPT_LOCATION)), "heads")
+
+
+async def check_schema():
+    """
+    Checks that the database schema is at the latest Alembic revision.
+
+    Nothing else is sent to the database when it is. An empty database gets its tables
+    created and stamped with the latest revision if `CRMS_CREATE_TABLES` is set; in every
+    other case a warning asks for the migrations to be run.
+    """
+    heads = get_head_revisions()
+    current = await get_current_revisions()
+    if current == heads:
+        return
+
+    if not current and CREATE_TABLES:
+        await create_tables()
+        async with async_engine.begin() as connection:
+            await connection.run_sync(_stamp_heads)
+        logger.info("Created the database tables at revision %s", ", ".join(sorted(heads)))
+        return
+
+    logger.warning(
+        "Database schema is at revision %s but the application expects %s; "
+        "run `alembic upgrade head`%s",
+        ", ".join(sorted(current)) or "<none>",
+        ", ".join(sorted(heads)),
+        "" if current else " or set CRMS_CREATE_TABLES=true to create the tables",
+    )
+
+
 # Async context manager to handle lifespan of the application
 @asynccontextmanager
 async def lifespan(_: FastAPI):
@@ -33,15 +150,37 @@ async def lifespan(_: FastAPI):
     during the startup and shutdown of the FastAPI application.
     """
 
-    # redis = await aioredis.from_url("redis://localhost:6379")
-    # FastAPICache.init(RedisBackend(redis), prefix="fastapi-cache")
+    # Make sure the database schema matches the application before serving requests
+    await check_schema()
 
-    # Initialize the database tables before starting the application
-    await create_tables()
+    # Correct the drift of the /stats/ counters in the background
+    reconciliation = (
+        asyncio.create_task(reconcile_counters_periodically(async_engine))
+        if COUNTER_RECONCILE_INTERVAL > 0 else None
+    )
+
+    # Sum the sales of the days written since the last refresh into the /stats/analytics/ rollup
+    sales_refresh = (
+        asyncio.create_task(refresh_sales_rollup_periodically(async_engine))
+        if SALES_REFRESH_INTERVAL > 0 else None
+    )
 
     # Yield control back to the FastAPI app to continue running
     yield
 
-    # Cleanup and dispose of the database engine after the application shuts down
+    if reconciliation is not None:
+        reconciliation.cancel()
+    if sales_refresh is not None:
+        sales_refresh.cancel()
+
+    # Cleanup and dispose of the database engines after the application shuts down
     await async_engine.dispose()
+    if async_read_engine is not async_engine:
+        await async_read_engine.dispose()
+
+    # Stop the worker processes used for password hashing
+    shutdown_password_executor()
+
+    # Close the connections of the response cache
+    await response_cache.close()
 
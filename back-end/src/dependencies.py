@@ -1,16 +1,47 @@
-from typing import AsyncGenerator, Any, Callable
+import hashlib
+import math
+import time
+from dataclasses import dataclass
+from os import getenv
+from typing import AsyncGenerator, Callable
+from uuid import UUID
 
-import jwt
-from fastapi import HTTPException, Request, Depends
+from fastapi import HTTPException, Request, Response, Depends
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from database import async_engine
-from utilities.authentication import decode_access_token
+from database import async_engine, async_read_engine
+from utilities.authentication import decode_access_token_cached, oauth2_scheme
+from utilities.cache import CACHE_TTL, CachedResponse, decode_response, response_cache, response_cache_key
+from utilities.table_versions import etag_matches, table_versions, weak_etag
+from utilities.ttl_cache import TTLCache
+
+# Seconds after a write during which the same client reads from the primary database
+READ_YOUR_WRITES_SECONDS = float(getenv("CRMS_READ_YOUR_WRITES_SECONDS", 5))
+
+# Cookie carrying the time of the client's last write, for clients that send cookies
+LAST_WRITE_COOKIE = "crms_last_write"
+
+# Clients that wrote recently, keyed by a digest of their Authorization header or their address
+recent_writers = TTLCache(maxsize=10000, ttl=READ_YOUR_WRITES_SECONDS)
+
+# Cache-Control of endpoints answering conditional GETs, unless the route sets its own
+CACHE_CONTROL = getenv("CRMS_CACHE_CONTROL", "public, no-cache")
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """
+    The authenticated user of a request, resolved once from its access token.
+    """
+    id: UUID
+    role: str
 
 
 def require_roles(*required_roles: str) -> Callable:
-    async def dependency(_user: dict = Depends(get_current_user)) -> dict:
-        if _user["role"] not in required_roles:
+    allowed_roles = frozenset(required_roles)
+
+    async def dependency(_user: Principal = Depends(get_current_user)) -> Principal:
+        if _user.role not in allowed_roles:
             raise HTTPException(
                 status_code=403,
                 detail=f"شما دسترسی لازم را ندارید"
@@ -19,49 +50,42 @@ def require_roles(*required_roles: str) -> Callable:
 
     return dependency
 
-def get_current_user(request: Request) -> dict[str, Any]:
-    auth_header = request.headers.get("Authorization")
-    if not auth_header:
+async def get_current_user(request: Request, token: str | None = Depends(oauth2_scheme)) -> Principal:
+    principal = getattr(request.state, "principal", None)
+    if principal is not None:
+        return principal
+
+    if token is None:
         raise HTTPException(
             status_code=401,
             detail="احراز هویت نشده است"
         )
 
-    token = auth_header.removeprefix("Bearer ").strip()
     if not token:
         raise HTTPException(
             status_code=401,
             detail="توکن ارسال شده معتبر نیست"
         )
 
-    try:
-        payload = decode_access_token(token)
-        role = payload.get("role")
-        if not role:
-            raise HTTPException(
-                status_code=403,
-                detail="نقش پیدا نشد"
-            )
-
-    except jwt.ExpiredSignatureError:
+    payload = decode_access_token_cached(token)
+    role = payload.get("role")
+    if not role:
         raise HTTPException(
-            status_code=401,
-            detail="توکن منقضی شده است"
+            status_code=403,
+            detail="نقش پیدا نشد"
         )
 
-    except jwt.InvalidTokenError:
+    try:
+        principal = Principal(id=UUID(payload["id"]), role=role)
+    except (KeyError, TypeError, ValueError):
         raise HTTPException(
             status_code=401,
             detail="توکن نامعتبر است"
         )
 
-    except Exception as e:
-        raise HTTPException(
-            status_code=401,
-            detail=f"احراز هویت ناموفق بود: {str(e)}"
-        )
-
-    return payload
+    # Keep the principal on the request so later dependencies and middleware reuse it
+    request.state.principal = principal
+    return principal
 
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
     """
@@ -81,5 +105,164 @@ async def get_session() -> AsyncGenerator[AsyncSession, None]:
     Raises:
         Exception: If session creation fails (unlikely, but can be handled for logging).
     """
-    async with AsyncSession(async_engine) as session:
+    # Objects stay loaded after commit, so handlers can re-fetch them with their loader options
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
         yield session  # Provide the session to the caller
+
+
+def _client_key(request: Request) -> str:
+    authorization = request.headers.get("Authorization")
+    if authorization:
+        return hashlib.sha256(authorization.encode()).hexdigest()
+    return request.client.host if request.client else ""
+
+
+def mark_recent_write(request: Request, response: Response) -> None:
+    """
+    Remembers that the client of this request has just written to the database.
+
+    For the next `READ_YOUR_WRITES_SECONDS` seconds the client's reads go to the primary
+    database, so it sees its own writes even if the replica has not replayed them yet.
+    The write is remembered in this worker and in a cookie, which covers clients whose
+    next request is served by another worker.
+
+    Args:
+        request (Request): The request that wrote to the database.
+        response (Response): The response of that request, which receives the cookie.
+    """
+    if async_read_engine is async_engine:
+        return
+
+    recent_writers.set(_client_key(request), True)
+    response.set_cookie(
+        LAST_WRITE_COOKIE,
+        str(time.time()),
+        max_age=math.ceil(READ_YOUR_WRITES_SECONDS),
+        httponly=True,
+        samesite="lax",
+    )
+
+
+def read_from_primary(request: Request) -> bool:
+    """
+    Checks whether the client of this request wrote to the database within the
+    read-your-writes window.
+
+    Args:
+        request (Request): The incoming read request.
+
+    Returns:
+        bool: True if the request should read from the primary database.
+    """
+    if recent_writers.get(_client_key(request)):
+        return True
+
+    try:
+        return time.time() - float(request.cookies[LAST_WRITE_COOKIE]) < READ_YOUR_WRITES_SECONDS
+    except (KeyError, ValueError):
+        return False
+
+
+async def get_read_session(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Asynchronous dependency to provide a database session for read-only endpoints.
+
+    The session is bound to the read replica when one is configured, unless the client
+    wrote recently, in which case it is bound to the primary database like `get_session`.
+
+    Yields:
+        AsyncSession: A database session that must only be used for queries.
+    """
+    if async_read_engine is async_engine or read_from_primary(request):
+        engine = async_engine
+    else:
+        engine = async_read_engine
+
+    async with AsyncSession(engine) as session:
+        yield session
+
+
+async def read_table_versions(request: Request, session: AsyncSession, tables: tuple[str, ...]) -> tuple[int, ...]:
+    """
+    Reads the versions of the given tables once per request, for every dependency that needs them.
+
+    Args:
+        request (Request): The request, which keeps the versions read so far.
+        session (AsyncSession): The session the request reads the tables in.
+        tables (tuple[str, ...]): Names of versioned tables.
+
+    Returns:
+        tuple[int, ...]: The version of each table, in order.
+    """
+    known: dict[str, int] = getattr(request.state, "table_versions", {})
+    missing = [table for table in tables if table not in known]
+    if missing:
+        known = {**known, **dict(zip(missing, await table_versions(session, missing)))}
+        request.state.table_versions = known
+    return tuple(known[table] for table in tables)
+
+
+class ConditionalGet:
+    """
+    Answers GET requests for data that has not changed since the client's copy with 304 Not Modified.
+
+    An instance is a route dependency. The response's weak ETag is derived from the URL and the
+    write counters of the tables the endpoint reads, which are read before its query runs; when
+    the request's If-None-Match names that tag, the endpoint is skipped. Otherwise the ETag and
+    the route's Cache-Control are set on the response.
+
+    Example:
+        VEHICLE_CONDITIONAL_GET = ConditionalGet(Vehicle, VehicleInsurance, Rental)
+
+        @router.get("/vehicles/", dependencies=[Depends(VEHICLE_CONDITIONAL_GET)])
+        async def get_vehicles(...): ...
+    """
+
+    def __init__(self, *models: type, cache_control: str = CACHE_CONTROL):
+        self.tables = tuple(sorted(model.__tablename__ for model in models))
+        self.cache_control = cache_control
+
+    async def __call__(
+            self,
+            request: Request,
+            response: Response,
+            session: AsyncSession = Depends(get_read_session),
+    ) -> None:
+        versions = await read_table_versions(request, session, self.tables)
+        query = sorted(request.query_params.multi_items())
+        etag = weak_etag(request.url.path, query, self.tables, versions)
+        headers = {"ETag": etag, "Cache-Control": self.cache_control}
+        if etag_matches(request.headers.get("If-None-Match"), etag):
+            raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+
+
+class ResponseCache:
+    """
+    Answers GET requests with the response cached for the same request, user and table versions.
+
+    An instance is a dependency of routes of class `CachedRoute`, which store the responses
+    they compute. Any write to a table the response serializes changes its version, so the
+    entries read before are never served again and expire. Declare it after the parameters
+    that authenticate the request: entries are stored per user, so a lookup made before
+    authentication only misses.
+
+    Example:
+        VEHICLE_CACHE = ResponseCache(Vehicle, VehicleInsurance, Rental)
+
+        router = APIRouter(route_class=CachedRoute)
+
+        @router.get("/vehicles/{vehicle_id}")
+        async def get_vehicle(..., _cached: None = Depends(VEHICLE_CACHE)): ...
+    """
+
+    def __init__(self, *models: type, ttl: float = CACHE_TTL):
+        self.tables = tuple(sorted(model.__tablename__ for model in models))
+        self.ttl = ttl
+
+    async def __call__(self, request: Request, session: AsyncSession = Depends(get_read_session)) -> None:
+        versions = await read_table_versions(request, session, self.tables)
+        cached = await response_cache.get(response_cache_key(request, versions))
+        if cached is not None:
+            raise CachedResponse(decode_response(cached))
+        request.state.response_cache = (response_cache, versions, self.ttl)
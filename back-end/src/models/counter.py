@@ -0,0 +1,28 @@
+from datetime import date
+
+from sqlalchemy import BigInteger, Column, event
+from sqlmodel import Field, SQLModel
+
+from utilities.counters import DAILY_PURCHASE_COUNT_TABLE, ROW_COUNT_TABLE, create_counter_triggers
+
+
+class TableRowCount(SQLModel, table=True):
+    # The number of rows of each counted table, kept by the triggers of `utilities.counters`
+    __tablename__ = ROW_COUNT_TABLE
+
+    table_name: str = Field(primary_key=True)
+    row_count: int = Field(sa_column=Column(BigInteger, nullable=False))
+
+
+class DailyPurchaseCount(SQLModel, table=True):
+    # The number of payments made on each day of the Jalali calendar, stored as its Gregorian date
+    __tablename__ = DAILY_PURCHASE_COUNT_TABLE
+
+    day: date = Field(primary_key=True)
+    purchase_count: int = Field(sa_column=Column(BigInteger, nullable=False))
+
+
+# Databases created from the models get the triggers the migrations create
+event.listen(
+    SQLModel.metadata, "after_create", lambda _, connection, **__: create_counter_triggers(connection)
+)
@@ -1,7 +1,8 @@
-from datetime import datetime
+from datetime import date, datetime
 from uuid import UUID, uuid4
 
-from sqlalchemy import DateTime, Column, func
+from sqlalchemy import Date, DateTime, Column, Computed, Index, event, func
+from sqlalchemy.dialects.postgresql import DATERANGE, TSVECTOR
 from sqlmodel import Relationship, Field
 
 from schemas.base.admin import AdminBase
@@ -13,9 +14,26 @@ from schemas.base.post import PostBase
 from schemas.base.rental import RentalBase
 from schemas.base.vehicle import VehicleBase
 from schemas.base.vehicle_insurance import VehicleInsuranceBase
+from utilities.availability import RENTAL_PERIOD_SQL
+from utilities.jalali_columns import sync_jalali_columns
+from utilities.nested_collections import collection_total
+from utilities.text_search import search_vector_sql
 
 
 class Vehicle(VehicleBase, table=True):
+    # Keyset pagination over (created_at, id), also within a branch for the availability search,
+    # and one index per search field; the sort keys of the search endpoint are indexed with the id,
+    # so their pages are also read by keyset
+    __table_args__ = (
+        Index("ix_vehicle_created_at_id", "created_at", "id"),
+        Index("ix_vehicle_location_created_at_id", "location", "created_at", "id"),
+        Index("ix_vehicle_brand", "brand"),
+        Index("ix_vehicle_hourly_rental_rate", "hourly_rental_rate"),
+        Index("ix_vehicle_security_deposit", "security_deposit"),
+        Index("ix_vehicle_year_id", "year", "id"),
+        Index("ix_vehicle_mileage_id", "mileage", "id"),
+    )
+
     id: UUID = Field(default_factory=uuid4, primary_key=True)
 
     created_at: datetime = Field(
@@ -29,18 +47,35 @@ class Vehicle(VehicleBase, table=True):
 
     insurances: list["VehicleInsurance"] = Relationship(
         back_populates="vehicle",
-        sa_relationship_kwargs={"lazy": "selectin"}
+        sa_relationship_kwargs={"lazy": "raise", "passive_deletes": True}
     )
 
     rentals: list["Rental"] = Relationship(
         back_populates="vehicle",
-        sa_relationship_kwargs={"lazy": "selectin"}
+        sa_relationship_kwargs={"lazy": "raise", "passive_deletes": True}
     )
 
+    @property
+    def rentals_total(self) -> int | None:
+        return collection_total(self, "rentals")
+
 
 class VehicleInsurance(VehicleInsuranceBase, table=True):
+    # Keyset pagination over (created_at, id), and one index per search field; the sort keys
+    # of the search endpoint are indexed with the id, so their pages are also read by keyset
+    __table_args__ = (
+        Index("ix_vehicleinsurance_created_at_id", "created_at", "id"),
+        Index("ix_vehicleinsurance_insurance_type", "insurance_type"),
+        Index("ix_vehicleinsurance_start_on_id", "start_on", "id"),
+        Index("ix_vehicleinsurance_expiration_on_id", "expiration_on", "id"),
+    )
+
     id: UUID = Field(default_factory=uuid4, primary_key=True)
 
+    # Typed shadows of the Jalali date strings, set from them by sync_jalali_columns
+    start_on: date | None = Field(default=None, sa_column=Column(Date))
+    expiration_on: date | None = Field(default=None, sa_column=Column(Date))
+
     created_at: datetime = Field(
         sa_column=Column(DateTime(timezone=True), server_default=func.now()),
     )
@@ -52,11 +87,19 @@ class VehicleInsurance(VehicleInsuranceBase, table=True):
     vehicle_id: UUID = Field(foreign_key="vehicle.id", ondelete="CASCADE")
     vehicle: Vehicle = Relationship(
         back_populates="insurances",
-        sa_relationship_kwargs={"lazy": "selectin"}
+        sa_relationship_kwargs={"lazy": "raise"}
     )
 
 
 class Customer(CustomerBase, table=True):
+    # Keyset pagination over (created_at, id), and one index per search field; the last_name search and
+    # the lookup use trigram indexes, which the migrations create where the pg_trgm extension is available
+    __table_args__ = (
+        Index("ix_customer_created_at_id", "created_at", "id"),
+        Index("ix_customer_gender", "gender"),
+        Index("ix_customer_phone", "phone"),
+    )
+
     id: UUID = Field(default_factory=uuid4, primary_key=True)
     password: str
 
@@ -69,16 +112,33 @@ class Customer(CustomerBase, table=True):
 
     rentals: list["Rental"] = Relationship(
         back_populates="customer",
-        sa_relationship_kwargs={"lazy": "selectin"}
+        sa_relationship_kwargs={"lazy": "raise", "passive_deletes": True}
     )
 
     comments: list["Comment"] = Relationship(
         back_populates="customer",
-        sa_relationship_kwargs={"lazy": "selectin"}
+        sa_relationship_kwargs={"lazy": "raise", "passive_deletes": True}
     )
 
+    @property
+    def rentals_total(self) -> int | None:
+        return collection_total(self, "rentals")
+
+    @property
+    def comments_total(self) -> int | None:
+        return collection_total(self, "comments")
+
 
 class Invoice(InvoiceBase, table=True):
+    # Keyset pagination over (created_at, id), and one index per search field
+    __table_args__ = (
+        Index("ix_invoice_created_at_id", "created_at", "id"),
+        Index("ix_invoice_total_amount", "total_amount"),
+        Index("ix_invoice_tax", "tax"),
+        Index("ix_invoice_discount", "discount"),
+        Index("ix_invoice_final_amount", "final_amount"),
+    )
+
     id: UUID = Field(default_factory=uuid4, primary_key=True)
 
     created_at: datetime = Field(
@@ -90,18 +150,47 @@ class Invoice(InvoiceBase, table=True):
 
     rentals: list["Rental"] = Relationship(
         back_populates="invoice",
-        sa_relationship_kwargs={"lazy": "selectin"}
+        sa_relationship_kwargs={"lazy": "raise", "passive_deletes": True}
     )
 
     payments: list["Payment"] = Relationship(
         back_populates="invoice",
-        sa_relationship_kwargs={"lazy": "selectin"}
+        sa_relationship_kwargs={"lazy": "raise", "passive_deletes": True}
     )
 
+    @property
+    def payments_total(self) -> int | None:
+        return collection_total(self, "payments")
+
 
 class Rental(RentalBase, table=True):
+    # Keyset pagination over (created_at, id), overall and within one customer's rentals; the
+    # included invoice_id lets a customer's invoices be found from this index alone. The other
+    # indexes back the search fields, with the id for the sort keys of the search endpoint. The days
+    # held by a rental are generated from its typed dates and GiST-indexed for the availability search;
+    # they are never loaded into instances, and are read as Rental.__table__.c.rental_period
+    __table_args__ = (
+        Index("ix_rental_created_at_id", "created_at", "id"),
+        Index(
+            "ix_rental_customer_id_created_at_id", "customer_id", "created_at", "id",
+            postgresql_include=["invoice_id"],
+        ),
+        Index("ix_rental_rental_start_on_id", "rental_start_on", "id"),
+        Index("ix_rental_rental_end_on_id", "rental_end_on", "id"),
+        Index("ix_rental_total_amount", "total_amount"),
+        Index("ix_rental_vehicle_id", "vehicle_id"),
+        Index("ix_rental_invoice_id", "invoice_id"),
+        Column("rental_period", DATERANGE, Computed(RENTAL_PERIOD_SQL, persisted=True)),
+        Index("ix_rental_rental_period", "rental_period", postgresql_using="gist"),
+    )
+    __mapper_args__ = {"exclude_properties": ["rental_period"]}
+
     id: UUID = Field(default_factory=uuid4, primary_key=True)
 
+    # Typed shadows of the Jalali date strings, set from them by sync_jalali_columns
+    rental_start_on: date | None = Field(default=None, sa_column=Column(Date))
+    rental_end_on: date | None = Field(default=None, sa_column=Column(Date))
+
     created_at: datetime = Field(
         sa_column=Column(DateTime(timezone=True), server_default=func.now()),
     )
@@ -112,25 +201,36 @@ class Rental(RentalBase, table=True):
     customer_id: UUID = Field(foreign_key="customer.id", ondelete="CASCADE")
     customer: Customer = Relationship(
         back_populates="rentals",
-        sa_relationship_kwargs={"lazy": "selectin"}
+        sa_relationship_kwargs={"lazy": "raise"}
     )
 
     vehicle_id: UUID = Field(foreign_key="vehicle.id", ondelete="CASCADE")
     vehicle: Vehicle = Relationship(
         back_populates="rentals",
-        sa_relationship_kwargs={"lazy": "selectin"}
+        sa_relationship_kwargs={"lazy": "raise"}
     )
 
     invoice_id: UUID = Field(foreign_key="invoice.id", ondelete="CASCADE")
     invoice: Invoice = Relationship(
         back_populates="rentals",
-        sa_relationship_kwargs={"lazy": "selectin"}
+        sa_relationship_kwargs={"lazy": "raise"}
     )
 
 
 class Payment(PaymentBase, table=True):
+    # Keyset pagination over (created_at, id), and one index per search field; the sort keys
+    # of the search endpoint are indexed with the id, so their pages are also read by keyset
+    __table_args__ = (
+        Index("ix_payment_created_at_id", "created_at", "id"),
+        Index("ix_payment_payment_method", "payment_method"),
+        Index("ix_payment_payment_at_id", "payment_at", "id"),
+    )
+
     id: UUID = Field(default_factory=uuid4, primary_key=True)
 
+    # Typed shadow of the Jalali date and time string, set from it by sync_jalali_columns
+    payment_at: datetime | None = Field(default=None, sa_column=Column(DateTime(timezone=True)))
+
     created_at: datetime = Field(
         sa_column=Column(DateTime(timezone=True), server_default=func.now()),
     )
@@ -141,17 +241,26 @@ class Payment(PaymentBase, table=True):
     invoice_id: UUID = Field(foreign_key="invoice.id", ondelete="CASCADE")
     invoice: Invoice = Relationship(
         back_populates="payments",
-        sa_relationship_kwargs={"lazy": "selectin"}
+        sa_relationship_kwargs={"lazy": "raise"}
     )
 
 
 class Comment(CommentBase, table=True):
+    # Keyset pagination over (created_at, id), and full-text search over the content. The search vector
+    # is generated by the database and never loaded into instances; it is read as Comment.__table__.c.search_vector
+    __table_args__ = (
+        Index("ix_comment_created_at_id", "created_at", "id"),
+        Column("search_vector", TSVECTOR, Computed(search_vector_sql(("content", "A")), persisted=True)),
+        Index("ix_comment_search_vector", "search_vector", postgresql_using="gin"),
+    )
+    __mapper_args__ = {"exclude_properties": ["search_vector"]}
+
     id: UUID = Field(default_factory=uuid4, primary_key=True)
 
     customer_id: UUID = Field(foreign_key="customer.id", ondelete="CASCADE")
     customer: Customer = Relationship(
         back_populates="comments",
-        sa_relationship_kwargs={"lazy": "selectin"}
+        sa_relationship_kwargs={"lazy": "raise"}
     )
 
     created_at: datetime = Field(
@@ -163,13 +272,23 @@ class Comment(CommentBase, table=True):
 
 
 class Admin(AdminBase, table=True):
+    # Keyset pagination over (created_at, id), and one index per search field; the username search and
+    # the lookup use trigram indexes, which the migrations create where the pg_trgm extension is available
+    __table_args__ = (
+        Index("ix_admin_created_at_id", "created_at", "id"),
+        Index("ix_admin_role", "role"),
+        Index("ix_admin_status", "status"),
+        Index("ix_admin_gender", "gender"),
+        Index("ix_admin_phone", "phone"),
+    )
+
     id: UUID = Field(default_factory=uuid4, primary_key=True)
 
     password: str
 
     posts: list["Post"] = Relationship(
         back_populates="admin",
-        sa_relationship_kwargs={"lazy": "selectin"}
+        sa_relationship_kwargs={"lazy": "raise", "passive_deletes": True}
     )
 
     created_at: datetime = Field(
@@ -179,14 +298,32 @@ class Admin(AdminBase, table=True):
         sa_column=Column(DateTime(timezone=True), onupdate=func.now()),
     )
 
+    @property
+    def posts_total(self) -> int | None:
+        return collection_total(self, "posts")
+
 
 class Post(PostBase, table=True):
+    # Keyset pagination over (created_at, id); the subject and thumbnail searches use trigram indexes,
+    # which the migrations create where the pg_trgm extension is available. Full-text search ranks
+    # subject matches above content matches; the search vector is generated by the database and
+    # never loaded into instances, it is read as Post.__table__.c.search_vector
+    __table_args__ = (
+        Index("ix_post_created_at_id", "created_at", "id"),
+        Column(
+            "search_vector", TSVECTOR,
+            Computed(search_vector_sql(("subject", "A"), ("content", "B")), persisted=True),
+        ),
+        Index("ix_post_search_vector", "search_vector", postgresql_using="gin"),
+    )
+    __mapper_args__ = {"exclude_properties": ["search_vector"]}
+
     id: UUID = Field(default_factory=uuid4, primary_key=True)
 
     admin_id: UUID = Field(foreign_key="admin.id", ondelete="CASCADE")
     admin: Admin = Relationship(
         back_populates="posts",
-        sa_relationship_kwargs={"lazy": "selectin"}
+        sa_relationship_kwargs={"lazy": "raise"}
     )
 
     created_at: datetime = Field(
@@ -197,3 +334,6 @@ class Post(PostBase, table=True):
     )
 
 
+for model in (VehicleInsurance, Rental, Payment):
+    event.listen(model, "before_insert", sync_jalali_columns)
+    event.listen(model, "before_update", sync_jalali_columns)
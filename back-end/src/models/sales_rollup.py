@@ -0,0 +1,41 @@
+from datetime import date, datetime
+
+from sqlalchemy import BigInteger, Column, DateTime, Index, event
+from sqlmodel import Field, SQLModel
+
+from utilities.analytics import SALES_ROLLUP_TABLE, STALE_SALES_DAY_TABLE, create_sales_triggers
+from utilities.enumerables import BranchLocations, Brand
+
+
+class SalesRollup(SQLModel, table=True):
+    # The sales of each day of the Jalali calendar, stored as its Gregorian date, per branch and brand
+    # of the vehicles; payments of invoices without rentals have neither. Summed by `utilities.analytics`.
+    __tablename__ = SALES_ROLLUP_TABLE
+    __table_args__ = (
+        Index(
+            "ix_sales_rollup_day_location_brand", "day", "location", "brand",
+            unique=True, postgresql_nulls_not_distinct=True,
+        ),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    day: date
+    location: BranchLocations | None = None
+    brand: Brand | None = None
+    revenue: int = Field(sa_column=Column(BigInteger, nullable=False))
+    payment_count: int = Field(sa_column=Column(BigInteger, nullable=False))
+    rental_count: int = Field(sa_column=Column(BigInteger, nullable=False))
+
+
+class StaleSalesDay(SQLModel, table=True):
+    # Days whose sales were written since they were last summed
+    __tablename__ = STALE_SALES_DAY_TABLE
+
+    day: date = Field(primary_key=True)
+    marked_at: datetime = Field(sa_column=Column(DateTime(timezone=True), nullable=False))
+
+
+# Databases created from the models get the triggers the migrations create
+event.listen(
+    SQLModel.metadata, "after_create", lambda _, connection, **__: create_sales_triggers(connection)
+)
@@ -0,0 +1,18 @@
+from sqlalchemy import BigInteger, Column, event
+from sqlmodel import Field, SQLModel
+
+from utilities.table_versions import TABLE_VERSION_TABLE, create_version_triggers
+
+
+class TableVersion(SQLModel, table=True):
+    # One write counter per versioned table, kept by the triggers of `utilities.table_versions`
+    __tablename__ = TABLE_VERSION_TABLE
+
+    table_name: str = Field(primary_key=True)
+    version: int = Field(sa_column=Column(BigInteger, nullable=False))
+
+
+# Databases created from the models get the triggers the migrations create
+event.listen(
+    SQLModel.metadata, "after_create", lambda _, connection, **__: create_version_triggers(connection)
+)
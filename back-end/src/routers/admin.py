@@ -1,19 +1,44 @@
+from typing import Annotated
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Response
 from pydantic import EmailStr
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlmodel import select, and_, or_, not_
+from sqlmodel import select
 
-from dependencies import get_session, require_roles
-from models.relational_models import Admin
-from schemas.admin import AdminCreate, AdminUpdate
+from dependencies import Principal, ResponseCache, get_read_session, get_session, require_roles
+from models.relational_models import Admin, Post
+from schemas.admin import AdminCreate, AdminLookupPublic, AdminUpdate
 from schemas.relational_schemas import RelationalAdminPublic
-from utilities.authentication import get_password_hash, oauth2_scheme
-from utilities.enumerables import LogicalOperator, AdminRole, AdminStatus
-
-router = APIRouter()
+from utilities.cache import CachedRoute
+from utilities.enumerables import AdminRole, AdminStatus, Gender
+from utilities.lookup import LookupText, fuzzy_lookup, has_trigram_extension
+from utilities.nested_collections import load_latest_children
+from utilities.pagination import paginate, set_next_cursor
+from utilities.search import Contains, Exact, Search, SearchSpec
+from utilities.password_hashing import get_password_hash_async
+
+router = APIRouter(route_class=CachedRoute)
+
+# Relationships serialized by RelationalAdminPublic; capped collections only embed their latest children
+ADMIN_CAPPED_COLLECTIONS = (Admin.posts,)
+
+# Cached responses of the list and by-id endpoints, keyed by the versions of the tables
+# RelationalAdminPublic serializes
+ADMIN_CACHE = ResponseCache(Admin, Post)
+
+# Query parameters of the search endpoint; every field and sort key is backed by an index
+ADMIN_SEARCH = SearchSpec(
+    Admin,
+    Contains(Admin.username),
+    Exact(Admin.email, EmailStr),
+    Exact(Admin.role, AdminRole),
+    Exact(Admin.status, AdminStatus),
+    Exact(Admin.national_id, str),
+    Exact(Admin.gender, Gender),
+    Exact(Admin.phone, int),
+)
 
 
 @router.get(
@@ -22,23 +47,29 @@ router = APIRouter()
 )
 async def get_admins(
     *,
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_read_session),
+    response: Response,
     offset: int = Query(default=0, ge=0),
     limit: int = Query(default=100, le=100),
-    _user: dict = Depends(
+    cursor: str | None = None,
+    _user: Principal = Depends(
         require_roles(
             AdminRole.SUPER_ADMIN.value,
             AdminRole.GENERAL_ADMIN.value,
         )
     ),
-    _token: str = Depends(oauth2_scheme),
+    _cached: None = Depends(ADMIN_CACHE),
 ):
-    if _user["role"] == AdminRole.GENERAL_ADMIN.value:
-        return await session.get(Admin, _user["id"])
-
-    admins_query = select(Admin).offset(offset).limit(limit).order_by(Admin.created_at)
-    admins = await session.execute(admins_query)
-    return admins.scalars().all()
+    if _user.role == AdminRole.GENERAL_ADMIN.value:
+        admin = await session.get(Admin, _user.id)
+        await load_latest_children(session, [admin], *ADMIN_CAPPED_COLLECTIONS)
+        return admin
+
+    admins_query = paginate(select(Admin), Admin, cursor=cursor, offset=offset, limit=limit)
+    admins = (await session.execute(admins_query)).scalars().all()
+    set_next_cursor(response, admins, limit)
+    await load_latest_children(session, admins, *ADMIN_CAPPED_COLLECTIONS)
+    return admins
 
 
 @router.post(
@@ -49,17 +80,16 @@ async def create_admin(
         *,
         session: AsyncSession = Depends(get_session),
         admin_create: AdminCreate,
-        _user: dict = Depends(
+        _user: Principal = Depends(
             require_roles(
                 AdminRole.SUPER_ADMIN.value,
                 AdminRole.GENERAL_ADMIN.value,
             )
         ),
-        _token: str = Depends(oauth2_scheme),
 ):
-    final_role = AdminRole.GENERAL_ADMIN.value if _user["role"] == AdminRole.GENERAL_ADMIN.value else admin_create.role
+    final_role = AdminRole.GENERAL_ADMIN.value if _user.role == AdminRole.GENERAL_ADMIN.value else admin_create.role
 
-    hashed_password = get_password_hash(admin_create.password)
+    hashed_password = await get_password_hash_async(admin_create.password)
 
     try:
         db_admin = Admin(
@@ -82,9 +112,9 @@ async def create_admin(
 
         session.add(db_admin)
         await session.commit()
-        await session.refresh(db_admin)
-
-        return db_admin
+        admin = await session.get(Admin, db_admin.id, populate_existing=True)
+        await load_latest_children(session, [admin], *ADMIN_CAPPED_COLLECTIONS)
+        return admin
 
     except IntegrityError:
         await session.rollback()
@@ -106,17 +136,17 @@ async def create_admin(
 )
 async def get_admin(
         *,
-        session: AsyncSession = Depends(get_session),
+        session: AsyncSession = Depends(get_read_session),
         admin_id: UUID,
-        _user: dict = Depends(
+        _user: Principal = Depends(
             require_roles(
                 AdminRole.SUPER_ADMIN.value,
                 AdminRole.GENERAL_ADMIN.value,
             )
         ),
-        _token: str = Depends(oauth2_scheme),
+        _cached: None = Depends(ADMIN_CACHE),
 ):
-    if _user["role"] == AdminRole.GENERAL_ADMIN.value and admin_id != UUID(_user["id"]):
+    if _user.role == AdminRole.GENERAL_ADMIN.value and admin_id != _user.id:
         raise HTTPException(status_code=403,
                             detail="شما دسترسی لازم برای مشاهده اطلاعات ادمین های  دیگر را ندارید")
 
@@ -124,6 +154,7 @@ async def get_admin(
     if not admin:
         raise HTTPException(status_code=404, detail="ادمین پیدا نشد")
 
+    await load_latest_children(session, [admin], *ADMIN_CAPPED_COLLECTIONS)
     return admin
 
 
@@ -136,16 +167,15 @@ async def patch_admin(
         session: AsyncSession = Depends(get_session),
         admin_id: UUID,
         admin_update: AdminUpdate,
-        _user: dict = Depends(
+        _user: Principal = Depends(
             require_roles(
                 AdminRole.SUPER_ADMIN.value,
                 AdminRole.GENERAL_ADMIN.value,
             )
         ),
-        _token: str = Depends(oauth2_scheme),
 ):
 
-    if _user["role"] == AdminRole.GENERAL_ADMIN.value and admin_id != UUID(_user["id"]):
+    if _user.role == AdminRole.GENERAL_ADMIN.value and admin_id != _user.id:
         raise HTTPException(status_code=403,
                             detail="شما دسترسی لازم برای ویرایش اطلاعات ادمین های  دیگر را ندارید")
 
@@ -155,13 +185,13 @@ async def patch_admin(
 
     update_data = admin_update.model_dump(exclude_unset=True)
     if "password" in update_data:
-        update_data["password"] = get_password_hash(update_data["password"])
+        update_data["password"] = await get_password_hash_async(update_data["password"])
 
     admin.sqlmodel_update(update_data)
 
     await session.commit()
-    await session.refresh(admin)
-
+    admin = await session.get(Admin, admin.id, populate_existing=True)
+    await load_latest_children(session, [admin], *ADMIN_CAPPED_COLLECTIONS)
     return admin
 
 
@@ -173,15 +203,14 @@ async def delete_admin(
     *,
     session: AsyncSession = Depends(get_session),
     admin_id: UUID,
-    _user: dict = Depends(
+    _user: Principal = Depends(
         require_roles(
             AdminRole.SUPER_ADMIN.value,
             AdminRole.GENERAL_ADMIN.value,
         )
     ),
-    _token: str = Depends(oauth2_scheme),
 ):
-    if _user["role"] == AdminRole.GENERAL_ADMIN.value and admin_id != UUID(_user["id"]):
+    if _user.role == AdminRole.GENERAL_ADMIN.value and admin_id != _user.id:
         raise HTTPException(status_code=403,
                             detail="شما دسترسی لازم برای حذف ادمین های  دیگر را ندارید")
 
@@ -201,56 +230,43 @@ async def delete_admin(
 )
 async def search_admins(
         *,
-        session: AsyncSession = Depends(get_session),
-        username: str | None = None,
-        email: EmailStr | None = None,
-        role: AdminRole | None = None,
-        status: AdminStatus | None = None,
-        national_id: str | None = None,
-        gender: str | None = None,
-        phone: int | None = None,
-        operator: LogicalOperator,
-        offset: int = Query(default=0, ge=0),
-        limit: int = Query(default=100, le=100),
-        _user: dict = Depends(
+        session: AsyncSession = Depends(get_read_session),
+        response: Response,
+        search: Search = Depends(ADMIN_SEARCH),
+        _user: Principal = Depends(
             require_roles(
                 AdminRole.SUPER_ADMIN.value,
             )
         ),
-        _token: str = Depends(oauth2_scheme),
 ):
-    conditions = []
-    if username:
-        conditions.append(Admin.username.ilike(f"%{username}%"))
-    if email:
-        conditions.append(Admin.email == email)
-    if role:
-        conditions.append(Admin.role == role)
-    if status:
-        conditions.append(Admin.status == status)
-    if national_id:
-        conditions.append(Admin.national_id == national_id)
-    if gender:
-        conditions.append(Admin.gender == gender)
-    if phone:
-        conditions.append(Admin.phone == phone)
-
-    if not conditions:
-        raise HTTPException(status_code=400, detail="هیچ مقداری برای جست و جو وجود ندارد")
-
-    if operator == LogicalOperator.AND:
-        query = select(Admin).where(and_(*conditions))
-    elif operator == LogicalOperator.OR:
-        query = select(Admin).where(or_(*conditions))
-    elif operator == LogicalOperator.NOT:
-        query = select(Admin).where(and_(not_(*conditions)))
-    else:
-        raise HTTPException(status_code=400, detail="عملگر نامعتبر مشخص شده است")
-
-    query = query.offset(offset).limit(limit)
-    result = await session.execute(query)
-    admins = result.scalars().all()
+    query = search.apply(select(Admin))
+    admins = (await session.execute(query)).scalars().all()
     if not admins:
         raise HTTPException(status_code=404, detail="مشتری پیدا نشد")
 
+    search.set_next_cursor(response, admins)
+    await load_latest_children(session, admins, *ADMIN_CAPPED_COLLECTIONS)
     return admins
+
+
+@router.get(
+    "/admins/lookup/",
+    response_model=list[AdminLookupPublic],
+)
+async def lookup_admins(
+        *,
+        session: AsyncSession = Depends(get_read_session),
+        q: Annotated[LookupText, Query()],
+        limit: int = Query(default=10, ge=1, le=50),
+        _user: Principal = Depends(
+            require_roles(
+                AdminRole.SUPER_ADMIN.value,
+            )
+        ),
+):
+    # Misspelled names and partial usernames, phone numbers or national IDs, the most similar first
+    lookup = fuzzy_lookup(Admin, q, limit=limit, trigram=await has_trigram_extension(session))
+    rows = (await session.execute(lookup)).all()
+    return [
+        AdminLookupPublic.model_validate(admin, update={"similarity": similarity}) for admin, similarity in rows
+    ]
@@ -56,7 +56,7 @@ async def login(
 
     user = await authenticate_user(credentials, session)
 
-    token_payload = {"role": user["role"], "id": str(user["user"].id)}
+    token_payload = {"role": user["role"], "id": str(user["id"])}
 
     access_token = create_access_token(
         data=token_payload,
@@ -70,7 +70,7 @@ async def login(
 
     return {
         "msg": "ورود موفقیت‌آمیز بود",
-        "id": str(user["user"].id),
+        "id": str(user["id"]),
         "role": user["role"],
         "access_token": access_token,
         "refresh_token": refresh_access_token
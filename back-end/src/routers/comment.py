@@ -1,32 +1,68 @@
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlmodel import select, and_, or_, not_
+from sqlalchemy.orm import joinedload
+from sqlmodel import select
 
-from dependencies import get_session, require_roles
-from models.relational_models import Comment
+from dependencies import ConditionalGet, Principal, ResponseCache, get_read_session, get_session, require_roles
+from models.relational_models import Comment, Customer
 from schemas.comment import CommentCreate, CommentUpdate
 from schemas.relational_schemas import RelationalCommentPublic
-from utilities.authentication import oauth2_scheme
-from utilities.enumerables import LogicalOperator, CommentSubject, CommentStatus, AdminRole, CustomerRole
-
-router = APIRouter()
+from utilities.cache import CachedRoute
+from utilities.enumerables import CommentSubject, CommentStatus, AdminRole, CustomerRole
+from utilities.pagination import paginate, set_next_cursor
+from utilities.search import Exact, Search, SearchSpec
+from utilities.text_search import full_text_search
+
+router = APIRouter(route_class=CachedRoute)
+
+# Relationships serialized by RelationalCommentPublic
+COMMENT_LOAD_OPTIONS = (joinedload(Comment.customer),)
+
+# Tables serialized by RelationalCommentPublic, whose versions tag the responses of the public
+# comment endpoints for conditional GETs and the response cache
+COMMENT_TABLES = (Comment, Customer)
+COMMENT_CONDITIONAL_GET = ConditionalGet(*COMMENT_TABLES)
+COMMENT_CACHE = ResponseCache(*COMMENT_TABLES)
+
+# Query parameters of the search endpoint; every field and sort key is backed by an index
+COMMENT_SEARCH = SearchSpec(
+    Comment,
+    Exact(Comment.subject, CommentSubject),
+    Exact(Comment.status, CommentStatus),
+)
 
 
 @router.get(
     "/comments/",
     response_model=list[RelationalCommentPublic],
+    dependencies=[Depends(COMMENT_CONDITIONAL_GET)],
 )
 async def get_comments(
     *,
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_read_session),
+    response: Response,
     offset: int = Query(default=0, ge=0),
     limit: int = Query(default=100, le=100),
+    cursor: str | None = None,
+    customer_id: UUID | None = None,
+    q: str | None = Query(default=None, max_length=200),
+    _cached: None = Depends(COMMENT_CACHE),
 ):
-    comments_query = select(Comment).offset(offset).limit(limit).order_by(Comment.created_at)
-    comments = await session.execute(comments_query)
-    return comments.scalars().all()
+    comments_query = select(Comment).options(*COMMENT_LOAD_OPTIONS)
+    if customer_id:
+        comments_query = comments_query.where(Comment.customer_id == customer_id)
+    if q:
+        comments_query = full_text_search(
+            comments_query, Comment.__table__.c.search_vector, q, offset=offset, limit=limit
+        )
+        return (await session.execute(comments_query)).scalars().all()
+
+    comments_query = paginate(comments_query, Comment, cursor=cursor, offset=offset, limit=limit)
+    comments = (await session.execute(comments_query)).scalars().all()
+    set_next_cursor(response, comments, limit)
+    return comments
 
 
 @router.post(
@@ -37,17 +73,16 @@ async def create_comment(
         *,
         session: AsyncSession = Depends(get_session),
         comment_create: CommentCreate,
-        _user: dict = Depends(
+        _user: Principal = Depends(
             require_roles(
                 AdminRole.SUPER_ADMIN.value,
                 AdminRole.GENERAL_ADMIN.value,
                 CustomerRole.CUSTOMER.value,
             )
         ),
-        _token: str = Depends(oauth2_scheme),
 ):
-    if _user["role"] == CustomerRole.CUSTOMER.value:
-        final_customer_id = UUID(_user["id"])
+    if _user.role == CustomerRole.CUSTOMER.value:
+        final_customer_id = _user.id
         final_status = CommentStatus.PENDING.value
     else:
         final_customer_id = comment_create.customer_id
@@ -63,9 +98,7 @@ async def create_comment(
 
         session.add(db_comment)
         await session.commit()
-        await session.refresh(db_comment)
-
-        return db_comment
+        return await session.get(Comment, db_comment.id, options=COMMENT_LOAD_OPTIONS, populate_existing=True)
 
     except Exception as e:
         await session.rollback()
@@ -80,10 +113,11 @@ async def create_comment(
 )
 async def get_comment(
         *,
-        session: AsyncSession = Depends(get_session),
+        session: AsyncSession = Depends(get_read_session),
         comment_id: UUID,
+        _cached: None = Depends(COMMENT_CACHE),
 ):
-    comment = await session.get(Comment, comment_id)
+    comment = await session.get(Comment, comment_id, options=COMMENT_LOAD_OPTIONS)
     if not comment:
         raise HTTPException(status_code=404, detail="کامنت پیدا نشد")
 
@@ -99,20 +133,19 @@ async def patch_comment(
         session: AsyncSession = Depends(get_session),
         comment_id: UUID,
         comment_update: CommentUpdate,
-        _user: dict = Depends(
+        _user: Principal = Depends(
             require_roles(
                 AdminRole.SUPER_ADMIN.value,
                 AdminRole.GENERAL_ADMIN.value,
                 CustomerRole.CUSTOMER.value,
             )
         ),
-        _token: str = Depends(oauth2_scheme),
 ):
     comment = await session.get(Comment, comment_id)
     if not comment:
         raise HTTPException(status_code=404, detail="کامنت پیدا نشد")
 
-    if _user["role"] == CustomerRole.CUSTOMER.value and comment.customer_id != UUID(_user["id"]):
+    if _user.role == CustomerRole.CUSTOMER.value and comment.customer_id != _user.id:
         raise HTTPException(status_code=403,
                             detail="شما دسترسی لازم برای ویرایش اطلاعات نظر های دیگر را ندارید")
 
@@ -121,9 +154,7 @@ async def patch_comment(
     comment.sqlmodel_update(comment_data)
 
     await session.commit()
-    await session.refresh(comment)
-
-    return comment
+    return await session.get(Comment, comment.id, options=COMMENT_LOAD_OPTIONS, populate_existing=True)
 
 
 @router.delete(
@@ -134,20 +165,19 @@ async def delete_comment(
     *,
     session: AsyncSession = Depends(get_session),
     comment_id: UUID,
-    _user: dict = Depends(
+    _user: Principal = Depends(
         require_roles(
             AdminRole.SUPER_ADMIN.value,
             AdminRole.GENERAL_ADMIN.value,
             CustomerRole.CUSTOMER.value,
         )
     ),
-    _token: str = Depends(oauth2_scheme),
 ):
     comment = await session.get(Comment, comment_id)
     if not comment:
         raise HTTPException(status_code=404, detail="کامنت پیدا نشد")
 
-    if _user["role"] == CustomerRole.CUSTOMER.value and comment.customer_id != UUID(_user["id"]):
+    if _user.role == CustomerRole.CUSTOMER.value and comment.customer_id != _user.id:
         raise HTTPException(status_code=403,
                             detail="شما دسترسی لازم برای ویرایش اطلاعات نظر های  دیگر را ندارید")
 
@@ -163,36 +193,14 @@ async def delete_comment(
 )
 async def search_comments(
         *,
-        session: AsyncSession = Depends(get_session),
-        subject: CommentSubject | None = None,
-        status: CommentStatus | None = None,
-        operator: LogicalOperator,
-        offset: int = Query(default=0, ge=0),
-        limit: int = Query(default=100, le=100),
+        session: AsyncSession = Depends(get_read_session),
+        response: Response,
+        search: Search = Depends(COMMENT_SEARCH),
 ):
-
-    conditions = []
-    if subject:
-        conditions.append(Comment.subject == subject)
-    if status:
-        conditions.append(Comment.status == status)
-
-    if not conditions:
-        raise HTTPException(status_code=400, detail="هیچ مقداری برای جست و جو وجود ندارد")
-
-    if operator == LogicalOperator.AND:
-        query = select(Comment).where(and_(*conditions))
-    elif operator == LogicalOperator.OR:
-        query = select(Comment).where(or_(*conditions))
-    elif operator == LogicalOperator.NOT:
-        query = select(Comment).where(and_(not_(*conditions)))
-    else:
-        raise HTTPException(status_code=400, detail="عملگر نامعتبر مشخص شده است")
-
-    query = query.offset(offset).limit(limit)
-    comment_db = await session.execute(query)
-    comments = comment_db.scalars().all()
+    query = search.apply(select(Comment).options(*COMMENT_LOAD_OPTIONS))
+    comments = (await session.execute(query)).scalars().all()
     if not comments:
         raise HTTPException(status_code=404, detail="کامنت پیدا نشد")
 
+    search.set_next_cursor(response, comments)
     return comments
@@ -1,18 +1,41 @@
+from typing import Annotated
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Response
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlmodel import select, and_, or_, not_
+from sqlmodel import select
 
-from dependencies import get_session, require_roles
-from models.relational_models import Customer
-from schemas.customer import CustomerCreate, CustomerUpdate
+from dependencies import Principal, ResponseCache, get_read_session, get_session, require_roles
+from models.relational_models import Comment, Customer, Rental
+from schemas.customer import CustomerCreate, CustomerLookupPublic, CustomerUpdate
 from schemas.relational_schemas import RelationalCustomerPublic
-from utilities.authentication import get_password_hash, oauth2_scheme
-from utilities.enumerables import LogicalOperator, Gender, AdminRole, CustomerRole
-
-router = APIRouter()
+from utilities.cache import CachedRoute
+from utilities.enumerables import Gender, AdminRole, CustomerRole, StreamFormat
+from utilities.lookup import LookupText, fuzzy_lookup, has_trigram_extension
+from utilities.nested_collections import load_latest_children
+from utilities.pagination import paginate, set_next_cursor
+from utilities.search import Contains, Exact, Search, SearchSpec
+from utilities.streaming import stream_list
+from utilities.password_hashing import get_password_hash_async
+
+router = APIRouter(route_class=CachedRoute)
+
+# Relationships serialized by RelationalCustomerPublic; capped collections only embed their latest children
+CUSTOMER_CAPPED_COLLECTIONS = (Customer.rentals, Customer.comments)
+
+# Cached responses of the list and by-id endpoints, keyed by the versions of the tables
+# RelationalCustomerPublic serializes
+CUSTOMER_CACHE = ResponseCache(Customer, Rental, Comment)
+
+# Query parameters of the search endpoint; every field and sort key is backed by an index
+CUSTOMER_SEARCH = SearchSpec(
+    Customer,
+    Contains(Customer.last_name),
+    Exact(Customer.gender, Gender),
+    Exact(Customer.national_id, str),
+    Exact(Customer.phone, int),
+)
 
 
 @router.get(
@@ -21,24 +44,37 @@ router = APIRouter()
 )
 async def get_customers(
     *,
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_read_session),
+    response: Response,
     offset: int = Query(default=0, ge=0),
     limit: int = Query(default=100, le=100),
-    _user: dict = Depends(
+    cursor: str | None = None,
+    stream: StreamFormat | None = None,
+    _user: Principal = Depends(
         require_roles(
             AdminRole.SUPER_ADMIN.value,
             AdminRole.GENERAL_ADMIN.value,
             CustomerRole.CUSTOMER.value,
         )
     ),
-    _token: str = Depends(oauth2_scheme),
+    _cached: None = Depends(CUSTOMER_CACHE),
 ):
-    if _user["role"] == CustomerRole.CUSTOMER.value:
-        return await session.get(Customer, _user["id"])
+    if _user.role == CustomerRole.CUSTOMER.value:
+        customer = await session.get(Customer, _user.id)
+        await load_latest_children(session, [customer], *CUSTOMER_CAPPED_COLLECTIONS)
+        return customer
+
+    if stream:
+        return stream_list(
+            session, select(Customer), Customer, schema=RelationalCustomerPublic, stream_format=stream,
+            capped_collections=CUSTOMER_CAPPED_COLLECTIONS,
+        )
 
-    customers_query = select(Customer).offset(offset).limit(limit).order_by(Customer.created_at)
-    customers = await session.execute(customers_query)
-    return customers.scalars().all()
+    customers_query = paginate(select(Customer), Customer, cursor=cursor, offset=offset, limit=limit)
+    customers = (await session.execute(customers_query)).scalars().all()
+    set_next_cursor(response, customers, limit)
+    await load_latest_children(session, customers, *CUSTOMER_CAPPED_COLLECTIONS)
+    return customers
 
 
 @router.post(
@@ -50,7 +86,7 @@ async def create_customer(
         session: AsyncSession = Depends(get_session),
         customer_create: CustomerCreate,
 ):
-    hashed_password = get_password_hash(customer_create.password)
+    hashed_password = await get_password_hash_async(customer_create.password)
 
     try:
         db_customer = Customer(
@@ -71,9 +107,9 @@ async def create_customer(
 
         session.add(db_customer)
         await session.commit()
-        await session.refresh(db_customer)
-
-        return db_customer
+        customer = await session.get(Customer, db_customer.id, populate_existing=True)
+        await load_latest_children(session, [customer], *CUSTOMER_CAPPED_COLLECTIONS)
+        return customer
 
     except IntegrityError:
         await session.rollback()
@@ -95,18 +131,18 @@ async def create_customer(
 )
 async def get_customer(
         *,
-        session: AsyncSession = Depends(get_session),
+        session: AsyncSession = Depends(get_read_session),
         customer_id: UUID,
-        _user: dict = Depends(
+        _user: Principal = Depends(
             require_roles(
                 AdminRole.SUPER_ADMIN.value,
                 AdminRole.GENERAL_ADMIN.value,
                 CustomerRole.CUSTOMER.value,
             )
         ),
-        _token: str = Depends(oauth2_scheme),
+        _cached: None = Depends(CUSTOMER_CACHE),
 ):
-    if _user["role"] == CustomerRole.CUSTOMER.value and customer_id != UUID(_user["id"]):
+    if _user.role == CustomerRole.CUSTOMER.value and customer_id != _user.id:
         raise HTTPException(status_code=403,
                             detail="شما دسترسی لازم برای مشاهده اطلاعات مشتری های  دیگر را ندارید")
 
@@ -114,6 +150,7 @@ async def get_customer(
     if not customer:
         raise HTTPException(status_code=404, detail="مشتری پیدا نشد")
 
+    await load_latest_children(session, [customer], *CUSTOMER_CAPPED_COLLECTIONS)
     return customer
 
 
@@ -126,16 +163,15 @@ async def patch_customer(
         session: AsyncSession = Depends(get_session),
         customer_id: UUID,
         customer_update: CustomerUpdate,
-        _user: dict = Depends(
+        _user: Principal = Depends(
             require_roles(
                 AdminRole.SUPER_ADMIN.value,
                 AdminRole.GENERAL_ADMIN.value,
                 CustomerRole.CUSTOMER.value,
             )
         ),
-        _token: str = Depends(oauth2_scheme),
 ):
-    if _user["role"] == CustomerRole.CUSTOMER.value and customer_id != UUID(_user["id"]):
+    if _user.role == CustomerRole.CUSTOMER.value and customer_id != _user.id:
         raise HTTPException(status_code=403,
                             detail="شما دسترسی لازم برای ویرایش اطلاعات مشتری های  دیگر را ندارید")
 
@@ -145,13 +181,13 @@ async def patch_customer(
 
     update_data = customer_update.model_dump(exclude_unset=True)
     if "password" in update_data:
-        update_data["password"] = get_password_hash(update_data["password"])
+        update_data["password"] = await get_password_hash_async(update_data["password"])
 
     customer.sqlmodel_update(update_data)
 
     await session.commit()
-    await session.refresh(customer)
-
+    customer = await session.get(Customer, customer.id, populate_existing=True)
+    await load_latest_children(session, [customer], *CUSTOMER_CAPPED_COLLECTIONS)
     return customer
 
 
@@ -163,16 +199,15 @@ async def delete_customer(
     *,
     session: AsyncSession = Depends(get_session),
     customer_id: UUID,
-    _user: dict = Depends(
+    _user: Principal = Depends(
         require_roles(
             AdminRole.SUPER_ADMIN.value,
             AdminRole.GENERAL_ADMIN.value,
             CustomerRole.CUSTOMER.value,
         )
     ),
-    _token: str = Depends(oauth2_scheme),
 ):
-    if _user["role"] == CustomerRole.CUSTOMER.value and customer_id != UUID(_user["id"]):
+    if _user.role == CustomerRole.CUSTOMER.value and customer_id != _user.id:
         raise HTTPException(status_code=403,
                             detail="شما دسترسی لازم برای حذف مشتری های  دیگر را ندارید")
 
@@ -191,49 +226,45 @@ async def delete_customer(
 )
 async def search_customers(
         *,
-        session: AsyncSession = Depends(get_session),
-        last_name: str | None = None,
-        gender: Gender | None = None,
-        national_id: str | None = None,
-        phone: int | None = None,
-        operator: LogicalOperator,
-        offset: int = Query(default=0, ge=0),
-        limit: int = Query(default=100, le=100),
-        _user: dict = Depends(
+        session: AsyncSession = Depends(get_read_session),
+        response: Response,
+        search: Search = Depends(CUSTOMER_SEARCH),
+        _user: Principal = Depends(
             require_roles(
                 AdminRole.SUPER_ADMIN.value,
                 AdminRole.GENERAL_ADMIN.value,
             )
         ),
-        _token: str = Depends(oauth2_scheme),
 ):
-
-    conditions = []
-    if last_name:
-        conditions.append(Customer.last_name.ilike(f"%{last_name}%"))
-    if national_id:
-        conditions.append(Customer.national_id == national_id)
-    if phone:
-        conditions.append(Customer.phone == phone)
-    if gender:
-        conditions.append(Customer.gender == gender)
-
-    if not conditions:
-        raise HTTPException(status_code=400, detail="هیچ مقداری برای جست و جو وجود ندارد")
-
-    if operator == LogicalOperator.AND:
-        query = select(Customer).where(and_(*conditions))
-    elif operator == LogicalOperator.OR:
-        query = select(Customer).where(or_(*conditions))
-    elif operator == LogicalOperator.NOT:
-        query = select(Customer).where(and_(not_(*conditions)))
-    else:
-        raise HTTPException(status_code=400, detail="عملگر نامعتبر مشخص شده است")
-
-    query = query.offset(offset).limit(limit)
-    customer_db = await session.execute(query)
-    customers = customer_db.scalars().all()
+    query = search.apply(select(Customer))
+    customers = (await session.execute(query)).scalars().all()
     if not customers:
         raise HTTPException(status_code=404, detail="مشتری پیدا نشد")
 
+    search.set_next_cursor(response, customers)
+    await load_latest_children(session, customers, *CUSTOMER_CAPPED_COLLECTIONS)
     return customers
+
+
+@router.get(
+    "/customers/lookup/",
+    response_model=list[CustomerLookupPublic],
+)
+async def lookup_customers(
+        *,
+        session: AsyncSession = Depends(get_read_session),
+        q: Annotated[LookupText, Query()],
+        limit: int = Query(default=10, ge=1, le=50),
+        _user: Principal = Depends(
+            require_roles(
+                AdminRole.SUPER_ADMIN.value,
+                AdminRole.GENERAL_ADMIN.value,
+            )
+        ),
+):
+    # Misspelled names and partial usernames, phone numbers or national IDs, the most similar first
+    lookup = fuzzy_lookup(Customer, q, limit=limit, trigram=await has_trigram_extension(session))
+    rows = (await session.execute(lookup)).all()
+    return [
+        CustomerLookupPublic.model_validate(customer, update={"similarity": similarity}) for customer, similarity in rows
+    ]
@@ -1,17 +1,40 @@
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlmodel import select, and_, or_, not_
+from sqlalchemy.orm import selectinload
+from sqlmodel import select
 
-from dependencies import get_session, require_roles
-from models.relational_models import Invoice, Rental
+from dependencies import Principal, ResponseCache, get_read_session, get_session, require_roles
+from models.relational_models import Invoice, Payment, Rental
 from schemas.invoice import InvoiceUpdate, InvoiceCreate
 from schemas.relational_schemas import RelationalInvoicePublic
-from utilities.authentication import oauth2_scheme
-from utilities.enumerables import LogicalOperator, InvoiceStatus, AdminRole, CustomerRole
-
-router = APIRouter()
+from utilities.cache import CachedRoute
+from utilities.enumerables import InvoiceStatus, AdminRole, CustomerRole, StreamFormat
+from utilities.nested_collections import load_latest_children
+from utilities.pagination import paginate, set_next_cursor
+from utilities.search import Exact, Range, Search, SearchSpec
+from utilities.streaming import stream_list
+
+router = APIRouter(route_class=CachedRoute)
+
+# Relationships serialized by RelationalInvoicePublic; capped collections only embed their latest children
+INVOICE_LOAD_OPTIONS = (selectinload(Invoice.rentals),)
+INVOICE_CAPPED_COLLECTIONS = (Invoice.payments,)
+
+# Cached responses of the list and by-id endpoints, keyed by the versions of the tables
+# RelationalInvoicePublic serializes
+INVOICE_CACHE = ResponseCache(Invoice, Rental, Payment)
+
+# Query parameters of the search endpoint; every field and sort key is backed by an index
+INVOICE_SEARCH = SearchSpec(
+    Invoice,
+    Range(Invoice.total_amount, int, minimum_alias=True),
+    Range(Invoice.tax, int, minimum_alias=True),
+    Range(Invoice.discount, int, minimum_alias=True),
+    Range(Invoice.final_amount, int, minimum_alias=True),
+    Exact(Invoice.status, InvoiceStatus),
+)
 
 
 @router.get(
@@ -20,31 +43,37 @@ router = APIRouter()
 )
 async def get_invoices(
     *,
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_read_session),
+    response: Response,
     offset: int = Query(default=0, ge=0),
     limit: int = Query(default=100, le=100),
-    _user: dict = Depends(
+    cursor: str | None = None,
+    stream: StreamFormat | None = None,
+    _user: Principal = Depends(
         require_roles(
             AdminRole.SUPER_ADMIN.value,
             AdminRole.GENERAL_ADMIN.value,
             CustomerRole.CUSTOMER.value
         )
     ),
-    _token: str = Depends(oauth2_scheme),
+    _cached: None = Depends(INVOICE_CACHE),
 ):
-    if _user["role"] == CustomerRole.CUSTOMER.value:
-        invoice_query = (
-            select(Invoice)
-            .join(Rental)
-            .where(Rental.customer_id == _user["id"])
-            .order_by(Invoice.created_at)
+    invoices_query = select(Invoice).options(*INVOICE_LOAD_OPTIONS)
+    if _user.role == CustomerRole.CUSTOMER.value:
+        # A semi-join keeps one row per invoice, so the page is cut in the database instead of after `.unique()`
+        customer_invoice_ids = select(Rental.invoice_id).where(Rental.customer_id == _user.id)
+        invoices_query = invoices_query.where(Invoice.id.in_(customer_invoice_ids))
+    if stream:
+        return stream_list(
+            session, invoices_query, Invoice, schema=RelationalInvoicePublic, stream_format=stream,
+            capped_collections=INVOICE_CAPPED_COLLECTIONS,
         )
-        result = await session.execute(invoice_query)
-        return result.scalars().unique().all()
 
-    invoices_query = select(Invoice).offset(offset).limit(limit).order_by(Invoice.created_at)
-    invoices = await session.execute(invoices_query)
-    return invoices.scalars().all()
+    invoices_query = paginate(invoices_query, Invoice, cursor=cursor, offset=offset, limit=limit)
+    invoices = (await session.execute(invoices_query)).scalars().all()
+    set_next_cursor(response, invoices, limit)
+    await load_latest_children(session, invoices, *INVOICE_CAPPED_COLLECTIONS)
+    return invoices
 
 
 @router.post(
@@ -55,14 +84,13 @@ async def create_invoice(
         *,
         session: AsyncSession = Depends(get_session),
         invoice_create: InvoiceCreate,
-        _user: dict = Depends(
+        _user: Principal = Depends(
             require_roles(
                 AdminRole.SUPER_ADMIN.value,
                 AdminRole.GENERAL_ADMIN.value,
                 CustomerRole.CUSTOMER.value,
             )
         ),
-        _token: str = Depends(oauth2_scheme),
 ):
     try:
         db_invoice = Invoice(
@@ -75,9 +103,9 @@ async def create_invoice(
 
         session.add(db_invoice)
         await session.commit()
-        await session.refresh(db_invoice)
-
-        return db_invoice
+        invoice = await session.get(Invoice, db_invoice.id, options=INVOICE_LOAD_OPTIONS, populate_existing=True)
+        await load_latest_children(session, [invoice], *INVOICE_CAPPED_COLLECTIONS)
+        return invoice
 
     except Exception as e:
         await session.rollback()
@@ -93,27 +121,27 @@ async def create_invoice(
 )
 async def get_invoice(
         *,
-        session: AsyncSession = Depends(get_session),
+        session: AsyncSession = Depends(get_read_session),
         invoice_id: UUID,
-        _user: dict = Depends(
+        _user: Principal = Depends(
             require_roles(
                 AdminRole.SUPER_ADMIN.value,
                 AdminRole.GENERAL_ADMIN.value,
                 CustomerRole.CUSTOMER.value
             )
         ),
-        _token: str = Depends(oauth2_scheme),
+        _cached: None = Depends(INVOICE_CACHE),
 ):
-    invoice = await session.get(Invoice, invoice_id)
+    invoice = await session.get(Invoice, invoice_id, options=INVOICE_LOAD_OPTIONS)
     if not invoice:
         raise HTTPException(status_code=404, detail="فاکتور پیدا نشد")
 
-    if _user["role"] == CustomerRole.CUSTOMER.value:
+    if _user.role == CustomerRole.CUSTOMER.value:
         invoice_query = (
             select(Invoice)
             .where(Invoice.id == invoice.id)
             .join(Rental)
-            .where(Rental.customer_id == _user["id"])
+            .where(Rental.customer_id == _user.id)
         )
         result = await session.execute(invoice_query)
 
@@ -121,6 +149,7 @@ async def get_invoice(
             raise HTTPException(status_code=403,
                                 detail="شما دسترسی لازم برای مشاهده اطلاعات فاکتور های  دیگر را ندارید")
 
+    await load_latest_children(session, [invoice], *INVOICE_CAPPED_COLLECTIONS)
     return invoice
 
 
@@ -134,25 +163,24 @@ async def patch_invoice(
         session: AsyncSession = Depends(get_session),
         invoice_id: UUID,
         invoice_update: InvoiceUpdate,
-        _user: dict = Depends(
+        _user: Principal = Depends(
             require_roles(
                 AdminRole.SUPER_ADMIN.value,
                 AdminRole.GENERAL_ADMIN.value,
                 CustomerRole.CUSTOMER.value
             )
         ),
-        _token: str = Depends(oauth2_scheme),
 ):
     invoice = await session.get(Invoice, invoice_id)
     if not invoice:
         raise HTTPException(status_code=404, detail="فاکتور پیدا نشد")
 
-    if _user["role"] == CustomerRole.CUSTOMER.value:
+    if _user.role == CustomerRole.CUSTOMER.value:
         invoice_query = (
             select(Invoice)
             .where(Invoice.id == invoice.id)
             .join(Rental)
-            .where(Rental.customer_id == _user["id"])
+            .where(Rental.customer_id == _user.id)
         )
         result = await session.execute(invoice_query)
 
@@ -165,8 +193,8 @@ async def patch_invoice(
     invoice.sqlmodel_update(invoice_data)
 
     await session.commit()
-    await session.refresh(invoice)
-
+    invoice = await session.get(Invoice, invoice.id, options=INVOICE_LOAD_OPTIONS, populate_existing=True)
+    await load_latest_children(session, [invoice], *INVOICE_CAPPED_COLLECTIONS)
     return invoice
 
 
@@ -178,25 +206,24 @@ async def delete_invoice(
     *,
     session: AsyncSession = Depends(get_session),
     invoice_id: UUID,
-    _user: dict = Depends(
+    _user: Principal = Depends(
         require_roles(
             AdminRole.SUPER_ADMIN.value,
             AdminRole.GENERAL_ADMIN.value,
             CustomerRole.CUSTOMER.value
         )
     ),
-    _token: str = Depends(oauth2_scheme),
 ):
     invoice = await session.get(Invoice, invoice_id)
     if not invoice:
         raise HTTPException(status_code=404, detail="فاکتور پیدا نشد")
 
-    if _user["role"] == CustomerRole.CUSTOMER.value:
+    if _user.role == CustomerRole.CUSTOMER.value:
         invoice_query = (
             select(Invoice)
             .where(Invoice.id == invoice.id)
             .join(Rental)
-            .where(Rental.customer_id == _user["id"])
+            .where(Rental.customer_id == _user.id)
         )
         result = await session.execute(invoice_query)
 
@@ -216,55 +243,25 @@ async def delete_invoice(
 )
 async def search_invoices(
         *,
-        session: AsyncSession = Depends(get_session),
-        total_amount: int | None = None,
-        tax: int | None = None,
-        discount: int | None = None,
-        final_amount: int | None = None,
-        status: InvoiceStatus | None = None,
-        operator: LogicalOperator,
-        offset: int = Query(default=0, ge=0),
-        limit: int = Query(default=100, le=100),
-        _user: dict = Depends(
+        session: AsyncSession = Depends(get_read_session),
+        response: Response,
+        search: Search = Depends(INVOICE_SEARCH),
+        _user: Principal = Depends(
             require_roles(
                 AdminRole.SUPER_ADMIN.value,
                 AdminRole.GENERAL_ADMIN.value,
                 CustomerRole.CUSTOMER.value
             )
         ),
-        _token: str = Depends(oauth2_scheme),
 ):
-    conditions = []
-    if total_amount:
-        conditions.append(Invoice.total_amount >= total_amount)
-    if tax:
-        conditions.append(Invoice.tax >= tax)
-    if discount:
-        conditions.append(Invoice.discount >= discount)
-    if final_amount:
-        conditions.append(Invoice.final_amount >= final_amount)
-    if status:
-        conditions.append(Invoice.status == status)
-
-    if not conditions:
-        raise HTTPException(status_code=400, detail="هیچ مقداری برای جست و جو وجود ندارد")
-
-    if operator == LogicalOperator.AND:
-        query = select(Invoice).where(and_(*conditions))
-    elif operator == LogicalOperator.OR:
-        query = select(Invoice).where(or_(*conditions))
-    elif operator == LogicalOperator.NOT:
-        query = select(Invoice).where(and_(not_(*conditions)))
-    else:
-        raise HTTPException(status_code=400, detail="عملگر نامعتبر مشخص شده است")
-
-    query = query.offset(offset).limit(limit)
-    if _user["role"] == CustomerRole.CUSTOMER.value:
-        query = query.join(Rental).where(Rental.customer_id == _user["id"])
-
-    invoice_db = await session.execute(query)
-    invoices = invoice_db.scalars().all()
+    query = search.apply(select(Invoice).options(*INVOICE_LOAD_OPTIONS))
+    if _user.role == CustomerRole.CUSTOMER.value:
+        customer_invoice_ids = select(Rental.invoice_id).where(Rental.customer_id == _user.id)
+        query = query.where(Invoice.id.in_(customer_invoice_ids))
+    invoices = (await session.execute(query)).scalars().all()
     if not invoices:
         raise HTTPException(status_code=404, detail="فاکتور پیدا نشد")
 
+    search.set_next_cursor(response, invoices)
+    await load_latest_children(session, invoices, *INVOICE_CAPPED_COLLECTIONS)
     return invoices
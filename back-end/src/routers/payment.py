@@ -1,18 +1,41 @@
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Response
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlmodel import select, and_, or_, not_
+from sqlalchemy.orm import joinedload
+from sqlmodel import select
 
-from dependencies import get_session, require_roles
-from models.relational_models import Payment
+from dependencies import Principal, ResponseCache, get_read_session, get_session, require_roles
+from models.relational_models import Invoice, Payment
 from schemas.payment import PaymentCreate, PaymentUpdate
 from schemas.relational_schemas import RelationalPaymentPublic
-from utilities.authentication import oauth2_scheme
-from utilities.enumerables import LogicalOperator, PaymentMethod, PaymentStatus, AdminRole
-
-router = APIRouter()
+from utilities.cache import CachedRoute
+from utilities.enumerables import PaymentMethod, PaymentStatus, AdminRole, StreamFormat
+from utilities.fields_validator import JalaliDateTime
+from utilities.pagination import paginate, set_next_cursor
+from utilities.search import Exact, Range, Search, SearchSpec
+from utilities.streaming import stream_list
+
+router = APIRouter(route_class=CachedRoute)
+
+# Relationships serialized by RelationalPaymentPublic
+PAYMENT_LOAD_OPTIONS = (joinedload(Payment.invoice),)
+
+# Cached responses of the list and by-id endpoints, keyed by the versions of the tables
+# RelationalPaymentPublic serializes
+PAYMENT_CACHE = ResponseCache(Payment, Invoice)
+
+# Query parameters of the search endpoint; every field and sort key is backed by an index
+PAYMENT_SEARCH = SearchSpec(
+    Payment,
+    Exact(Payment.payment_at, JalaliDateTime, name="payment_datetime"),
+    Range(Payment.payment_at, JalaliDateTime, name="payment_datetime"),
+    Exact(Payment.transaction_id, str),
+    Exact(Payment.payment_method, PaymentMethod),
+    Exact(Payment.payment_status, PaymentStatus),
+    sort_keys={"payment_datetime": Payment.payment_at},
+)
 
 
 @router.get(
@@ -21,21 +44,32 @@ router = APIRouter()
 )
 async def get_payments(
     *,
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_read_session),
+    response: Response,
     offset: int = Query(default=0, ge=0),
     limit: int = Query(default=100, le=100),
-    _user: dict = Depends(
+    cursor: str | None = None,
+    stream: StreamFormat | None = None,
+    invoice_id: UUID | None = None,
+    _user: Principal = Depends(
         require_roles(
             AdminRole.SUPER_ADMIN.value,
             AdminRole.GENERAL_ADMIN.value,
         )
     ),
-    _token: str = Depends(oauth2_scheme),
+    _cached: None = Depends(PAYMENT_CACHE),
 ):
 
-    payments_query = select(Payment).offset(offset).limit(limit).order_by(Payment.created_at)
-    payments = await session.execute(payments_query)
-    return payments.scalars().all()
+    payments_query = select(Payment).options(*PAYMENT_LOAD_OPTIONS)
+    if invoice_id:
+        payments_query = payments_query.where(Payment.invoice_id == invoice_id)
+    if stream:
+        return stream_list(session, payments_query, Payment, schema=RelationalPaymentPublic, stream_format=stream)
+
+    payments_query = paginate(payments_query, Payment, cursor=cursor, offset=offset, limit=limit)
+    payments = (await session.execute(payments_query)).scalars().all()
+    set_next_cursor(response, payments, limit)
+    return payments
 
 
 @router.post(
@@ -46,13 +80,12 @@ async def create_payment(
         *,
         session: AsyncSession = Depends(get_session),
         payment_create: PaymentCreate,
-        _user: dict = Depends(
+        _user: Principal = Depends(
             require_roles(
                 AdminRole.SUPER_ADMIN.value,
                 AdminRole.GENERAL_ADMIN.value,
             )
         ),
-        _token: str = Depends(oauth2_scheme),
 ):
     try:
         db_payment = Payment(
@@ -66,9 +99,7 @@ async def create_payment(
 
         session.add(db_payment)
         await session.commit()
-        await session.refresh(db_payment)
-
-        return db_payment
+        return await session.get(Payment, db_payment.id, options=PAYMENT_LOAD_OPTIONS, populate_existing=True)
 
     except IntegrityError:
         await session.rollback()
@@ -90,18 +121,18 @@ async def create_payment(
 )
 async def get_payment(
         *,
-        session: AsyncSession = Depends(get_session),
+        session: AsyncSession = Depends(get_read_session),
         payment_id: UUID,
-        _user: dict = Depends(
+        _user: Principal = Depends(
             require_roles(
                 AdminRole.SUPER_ADMIN.value,
                 AdminRole.GENERAL_ADMIN.value,
             )
         ),
-        _token: str = Depends(oauth2_scheme),
+        _cached: None = Depends(PAYMENT_CACHE),
 ):
 
-    payment = await session.get(Payment, payment_id)
+    payment = await session.get(Payment, payment_id, options=PAYMENT_LOAD_OPTIONS)
     if not payment:
         raise HTTPException(status_code=404, detail="پرداخت پیدا نشد")
 
@@ -117,13 +148,12 @@ async def patch_payment(
         session: AsyncSession = Depends(get_session),
         payment_id: UUID,
         payment_update: PaymentUpdate,
-        _user: dict = Depends(
+        _user: Principal = Depends(
             require_roles(
                 AdminRole.SUPER_ADMIN.value,
                 AdminRole.GENERAL_ADMIN.value,
             )
         ),
-        _token: str = Depends(oauth2_scheme),
 ):
     payment = await session.get(Payment, payment_id)
     if not payment:
@@ -134,9 +164,7 @@ async def patch_payment(
     payment.sqlmodel_update(payment_data)
 
     await session.commit()
-    await session.refresh(payment)
-
-    return payment
+    return await session.get(Payment, payment.id, options=PAYMENT_LOAD_OPTIONS, populate_existing=True)
 
 
 @router.delete(
@@ -147,13 +175,12 @@ async def delete_payment(
     *,
     session: AsyncSession = Depends(get_session),
     payment_id: UUID,
-    _user: dict = Depends(
+    _user: Principal = Depends(
         require_roles(
             AdminRole.SUPER_ADMIN.value,
             AdminRole.GENERAL_ADMIN.value,
         )
     ),
-    _token: str = Depends(oauth2_scheme),
 ):
     payment = await session.get(Payment, payment_id)
     if not payment:
@@ -170,48 +197,20 @@ async def delete_payment(
 )
 async def search_payments(
         *,
-        session: AsyncSession = Depends(get_session),
-        payment_datetime: str | None = None,
-        transaction_id: int | None = None,
-        payment_method: PaymentMethod | None = None,
-        payment_status: PaymentStatus | None = None,
-        operator: LogicalOperator,
-        offset: int = Query(default=0, ge=0),
-        limit: int = Query(default=100, le=100),
-        _user: dict = Depends(
+        session: AsyncSession = Depends(get_read_session),
+        response: Response,
+        search: Search = Depends(PAYMENT_SEARCH),
+        _user: Principal = Depends(
             require_roles(
                 AdminRole.SUPER_ADMIN.value,
                 AdminRole.GENERAL_ADMIN.value,
             )
         ),
-        _token: str = Depends(oauth2_scheme),
 ):
-    conditions = []
-    if payment_datetime:
-        conditions.append(Payment.payment_datetime == payment_datetime)
-    if transaction_id:
-        conditions.append(Payment.transaction_id == transaction_id)
-    if payment_method:
-        conditions.append(Payment.payment_method == payment_method)
-    if payment_status:
-        conditions.append(Payment.payment_status == payment_status)
-
-    if not conditions:
-        raise HTTPException(status_code=400, detail="هیچ مقداری برای جست و جو وجود ندارد")
-
-    if operator == LogicalOperator.AND:
-        query = select(Payment).where(and_(*conditions))
-    elif operator == LogicalOperator.OR:
-        query = select(Payment).where(or_(*conditions))
-    elif operator == LogicalOperator.NOT:
-        query = select(Payment).where(and_(not_(*conditions)))
-    else:
-        raise HTTPException(status_code=400, detail="عملگر نامعتبر مشخص شده است")
-
-    query = query.offset(offset).limit(limit)
-    payment_db = await session.execute(query)
-    payments = payment_db.scalars().all()
+    query = search.apply(select(Payment).options(*PAYMENT_LOAD_OPTIONS))
+    payments = (await session.execute(query)).scalars().all()
     if not payments:
         raise HTTPException(status_code=404, detail="پرداخت پیدا نشد")
 
+    search.set_next_cursor(response, payments)
     return payments
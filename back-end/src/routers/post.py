@@ -1,32 +1,66 @@
 import uuid
 
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlmodel import select, and_, or_, not_
+from sqlalchemy.orm import joinedload
+from sqlmodel import select
 
-from dependencies import get_session, require_roles
-from models.relational_models import Post
+from dependencies import ConditionalGet, Principal, ResponseCache, get_read_session, get_session, require_roles
+from models.relational_models import Admin, Post
 from schemas.post import PostCreate, PostUpdate
 from schemas.relational_schemas import RelationalPostPublic
-from utilities.authentication import oauth2_scheme
-from utilities.enumerables import LogicalOperator, AdminRole
-
-router = APIRouter()
+from utilities.cache import CachedRoute
+from utilities.enumerables import AdminRole
+from utilities.pagination import paginate, set_next_cursor
+from utilities.search import Contains, Search, SearchSpec
+from utilities.text_search import full_text_search
+
+router = APIRouter(route_class=CachedRoute)
+
+# Relationships serialized by RelationalPostPublic
+POST_LOAD_OPTIONS = (joinedload(Post.admin),)
+
+# Tables serialized by RelationalPostPublic, whose versions tag the responses of the public
+# post endpoints for conditional GETs and the response cache
+POST_TABLES = (Post, Admin)
+POST_CONDITIONAL_GET = ConditionalGet(*POST_TABLES)
+POST_CACHE = ResponseCache(*POST_TABLES)
+
+# Query parameters of the search endpoint; every field and sort key is backed by an index
+POST_SEARCH = SearchSpec(
+    Post,
+    Contains(Post.thumbnail),
+    Contains(Post.subject),
+)
 
 
 @router.get(
     "/posts/",
     response_model=list[RelationalPostPublic],
+    dependencies=[Depends(POST_CONDITIONAL_GET)],
 )
 async def get_posts(
     *,
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_read_session),
+    response: Response,
     offset: int = Query(default=0, ge=0),
     limit: int = Query(default=100, le=100),
+    cursor: str | None = None,
+    admin_id: uuid.UUID | None = None,
+    q: str | None = Query(default=None, max_length=200),
+    _cached: None = Depends(POST_CACHE),
 ):
-    posts_query = select(Post).offset(offset).limit(limit).order_by(Post.created_at)
-    posts = await session.execute(posts_query)
-    return posts.scalars().all()
+    posts_query = select(Post).options(*POST_LOAD_OPTIONS)
+    if admin_id:
+        posts_query = posts_query.where(Post.admin_id == admin_id)
+    if q:
+        posts_query = full_text_search(posts_query, Post.__table__.c.search_vector, q, offset=offset, limit=limit)
+        return (await session.execute(posts_query)).scalars().all()
+
+    posts_query = paginate(posts_query, Post, cursor=cursor, offset=offset, limit=limit)
+    posts = (await session.execute(posts_query)).scalars().all()
+    set_next_cursor(response, posts, limit)
+    return posts
 
 
 @router.post(
@@ -37,15 +71,14 @@ async def create_post(
         *,
         session: AsyncSession = Depends(get_session),
         post_create: PostCreate,
-        _user: dict = Depends(
+        _user: Principal = Depends(
             require_roles(
                 AdminRole.SUPER_ADMIN.value,
                 AdminRole.GENERAL_ADMIN.value,
             )
         ),
-        _token: str = Depends(oauth2_scheme),
 ):
-    final_admin_id = uuid.UUID(_user["id"]) if _user["role"] == AdminRole.GENERAL_ADMIN.value else post_create.admin_id
+    final_admin_id = _user.id if _user.role == AdminRole.GENERAL_ADMIN.value else post_create.admin_id
 
     try:
         db_post = Post(
@@ -57,9 +90,7 @@ async def create_post(
 
         session.add(db_post)
         await session.commit()
-        await session.refresh(db_post)
-
-        return db_post
+        return await session.get(Post, db_post.id, options=POST_LOAD_OPTIONS, populate_existing=True)
 
     except Exception as e:
         await session.rollback()
@@ -75,10 +106,11 @@ async def create_post(
 )
 async def get_post(
         *,
-        session: AsyncSession = Depends(get_session),
+        session: AsyncSession = Depends(get_read_session),
         post_id: uuid.UUID,
+        _cached: None = Depends(POST_CACHE),
 ):
-    post = await session.get(Post, post_id)
+    post = await session.get(Post, post_id, options=POST_LOAD_OPTIONS)
     if not post:
         raise HTTPException(status_code=404, detail="پست پیدا نشد")
 
@@ -94,19 +126,18 @@ async def patch_post(
         session: AsyncSession = Depends(get_session),
         post_id: uuid.UUID,
         post_update: PostUpdate,
-        _user: dict = Depends(
+        _user: Principal = Depends(
             require_roles(
                 AdminRole.SUPER_ADMIN.value,
                 AdminRole.GENERAL_ADMIN.value,
             )
         ),
-        _token: str = Depends(oauth2_scheme),
 ):
     post = await session.get(Post, post_id)
     if not post:
         raise HTTPException(status_code=404, detail="پست پیدا نشد")
 
-    if _user["role"] == AdminRole.GENERAL_ADMIN.value and post.admin_id != uuid.UUID(_user["id"]):
+    if _user.role == AdminRole.GENERAL_ADMIN.value and post.admin_id != _user.id:
         raise HTTPException(status_code=403,
                             detail="شما دسترسی لازم برای ویرایش اطلاعات پست های  دیگر را ندارید")
 
@@ -115,9 +146,7 @@ async def patch_post(
     post.sqlmodel_update(post_data)
 
     await session.commit()
-    await session.refresh(post)
-
-    return post
+    return await session.get(Post, post.id, options=POST_LOAD_OPTIONS, populate_existing=True)
 
 
 @router.delete(
@@ -128,19 +157,18 @@ async def delete_post(
     *,
     session: AsyncSession = Depends(get_session),
     post_id: uuid.UUID,
-    _user: dict = Depends(
+    _user: Principal = Depends(
         require_roles(
             AdminRole.SUPER_ADMIN.value,
             AdminRole.GENERAL_ADMIN.value,
         )
     ),
-    _token: str = Depends(oauth2_scheme),
 ):
     post = await session.get(Post, post_id)
     if not post:
         raise HTTPException(status_code=404, detail="پست پیدا نشد")
 
-    if _user["role"] == AdminRole.GENERAL_ADMIN.value and post.admin_id != uuid.UUID(_user["id"]):
+    if _user.role == AdminRole.GENERAL_ADMIN.value and post.admin_id != _user.id:
         raise HTTPException(status_code=403,
                             detail="شما دسترسی لازم برای حذف پست های  دیگر را ندارید")
 
@@ -156,37 +184,14 @@ async def delete_post(
 )
 async def search_posts(
         *,
-        session: AsyncSession = Depends(get_session),
-        thumbnail: str | None = None,
-        subject: str | None = None,
-        operator: LogicalOperator,
-        offset: int = Query(default=0, ge=0),
-        limit: int = Query(default=100, le=100),
+        session: AsyncSession = Depends(get_read_session),
+        response: Response,
+        search: Search = Depends(POST_SEARCH),
 ):
-
-    conditions = []
-    if thumbnail:
-        conditions.append(Post.thumbnail.ilike(f"%{thumbnail}%"))
-    if subject:
-        conditions.append(Post.subject.ilike(f"%{subject}%"))
-
-    if not conditions:
-        raise HTTPException(status_code=400, detail="هیچ مقداری برای جست و جو وجود ندارد")
-
-    if operator == LogicalOperator.AND:
-        query = select(Post).where(and_(*conditions))
-    elif operator == LogicalOperator.OR:
-        query = select(Post).where(or_(*conditions))
-    elif operator == LogicalOperator.NOT:
-        query = select(Post).where(and_(not_(*conditions)))
-    else:
-        raise HTTPException(status_code=400, detail="عملگر نامعتبر مشخص شده است")
-
-    query = query.offset(offset).limit(limit)
-
-    post_db = await session.execute(query)
-    posts = post_db.scalars().all()
+    query = search.apply(select(Post).options(*POST_LOAD_OPTIONS))
+    posts = (await session.execute(query)).scalars().all()
     if not posts:
         raise HTTPException(status_code=404, detail="پست پیدا نشد")
 
+    search.set_next_cursor(response, posts)
     return posts
@@ -1,17 +1,43 @@
 import uuid
 
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlmodel import select, and_, or_, not_
+from sqlalchemy.orm import joinedload
+from sqlmodel import select
 
-from dependencies import get_session, require_roles
-from models.relational_models import Rental, Vehicle
+from dependencies import Principal, ResponseCache, get_read_session, get_session, require_roles
+from models.relational_models import Customer, Invoice, Rental, Vehicle
 from schemas.relational_schemas import RelationalRentalPublic
 from schemas.rental import RentalCreate, RentalUpdate
-from utilities.authentication import oauth2_scheme
-from utilities.enumerables import LogicalOperator, AdminRole, CustomerRole, CarStatus
-
-router = APIRouter()
+from utilities.cache import CachedRoute
+from utilities.enumerables import AdminRole, CustomerRole, CarStatus, StreamFormat
+from utilities.fields_validator import JalaliDate
+from utilities.pagination import paginate, set_next_cursor
+from utilities.search import Exact, Range, Search, SearchSpec
+from utilities.streaming import stream_list
+
+router = APIRouter(route_class=CachedRoute)
+
+# Relationships serialized by RelationalRentalPublic
+RENTAL_LOAD_OPTIONS = (joinedload(Rental.customer), joinedload(Rental.vehicle), joinedload(Rental.invoice))
+
+# Cached responses of the list and by-id endpoints, keyed by the versions of the tables
+# RelationalRentalPublic serializes
+RENTAL_CACHE = ResponseCache(Rental, Customer, Vehicle, Invoice)
+
+# Query parameters of the search endpoint; every field and sort key is backed by an index
+RENTAL_SEARCH = SearchSpec(
+    Rental,
+    Exact(Rental.rental_start_on, JalaliDate, name="rental_start_date"),
+    Range(Rental.rental_start_on, JalaliDate, name="rental_start_date"),
+    Exact(Rental.rental_end_on, JalaliDate, name="rental_end_date"),
+    Range(Rental.rental_end_on, JalaliDate, name="rental_end_date"),
+    Range(Rental.total_amount, int, minimum_alias=True),
+    Exact(Rental.customer_id, uuid.UUID),
+    Exact(Rental.vehicle_id, uuid.UUID),
+    Exact(Rental.invoice_id, uuid.UUID),
+    sort_keys={"rental_start_date": Rental.rental_start_on, "rental_end_date": Rental.rental_end_on},
+)
 
 
 @router.get(
@@ -20,26 +46,38 @@ router = APIRouter()
 )
 async def get_rentals(
     *,
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_read_session),
+    response: Response,
     offset: int = Query(default=0, ge=0),
     limit: int = Query(default=100, le=100),
-    _user: dict = Depends(
+    cursor: str | None = None,
+    stream: StreamFormat | None = None,
+    vehicle_id: uuid.UUID | None = None,
+    customer_id: uuid.UUID | None = None,
+    _user: Principal = Depends(
         require_roles(
             AdminRole.SUPER_ADMIN.value,
             AdminRole.GENERAL_ADMIN.value,
             CustomerRole.CUSTOMER.value,
         )
     ),
-    _token: str = Depends(oauth2_scheme),
+    _cached: None = Depends(RENTAL_CACHE),
 ):
-    if _user["role"] == CustomerRole.CUSTOMER.value:
-        rental_query = select(Rental).where(Rental.customer_id == _user["id"]).order_by(Rental.created_at)
-        rentals = await session.execute(rental_query)
-        return rentals.scalars().all()
+    rentals_query = select(Rental).options(*RENTAL_LOAD_OPTIONS)
+    if _user.role == CustomerRole.CUSTOMER.value:
+        # Customers only see their own rentals, whatever `customer_id` they pass
+        customer_id = _user.id
+    if vehicle_id:
+        rentals_query = rentals_query.where(Rental.vehicle_id == vehicle_id)
+    if customer_id:
+        rentals_query = rentals_query.where(Rental.customer_id == customer_id)
+    if stream:
+        return stream_list(session, rentals_query, Rental, schema=RelationalRentalPublic, stream_format=stream)
 
-    rentals_query = select(Rental).offset(offset).limit(limit).order_by(Rental.created_at)
-    rentals = await session.execute(rentals_query)
-    return rentals.scalars().all()
+    rentals_query = paginate(rentals_query, Rental, cursor=cursor, offset=offset, limit=limit)
+    rentals = (await session.execute(rentals_query)).scalars().all()
+    set_next_cursor(response, rentals, limit)
+    return rentals
 
 
 @router.post(
@@ -50,16 +88,15 @@ async def create_rental(
         *,
         session: AsyncSession = Depends(get_session),
         rental_create: RentalCreate,
-        _user: dict = Depends(
+        _user: Principal = Depends(
             require_roles(
                 AdminRole.SUPER_ADMIN.value,
                 AdminRole.GENERAL_ADMIN.value,
                 CustomerRole.CUSTOMER.value,
             )
         ),
-        _token: str = Depends(oauth2_scheme),
 ):
-    final_customer_id = uuid.UUID(_user["id"]) if _user["role"] == AdminRole.GENERAL_ADMIN.value else rental_create.customer_id
+    final_customer_id = _user.id if _user.role == AdminRole.GENERAL_ADMIN.value else rental_create.customer_id
 
     try:
         db_rental = Rental(
@@ -76,9 +113,7 @@ async def create_rental(
 
         session.add(db_rental)
         await session.commit()
-        await session.refresh(db_rental)
-
-        return db_rental
+        return await session.get(Rental, db_rental.id, options=RENTAL_LOAD_OPTIONS, populate_existing=True)
 
     except Exception as e:
         await session.rollback()
@@ -94,22 +129,22 @@ async def create_rental(
 )
 async def get_rental(
         *,
-        session: AsyncSession = Depends(get_session),
+        session: AsyncSession = Depends(get_read_session),
         rental_id: uuid.UUID,
-        _user: dict = Depends(
+        _user: Principal = Depends(
             require_roles(
                 AdminRole.SUPER_ADMIN.value,
                 AdminRole.GENERAL_ADMIN.value,
                 CustomerRole.CUSTOMER.value,
             )
         ),
-        _token: str = Depends(oauth2_scheme),
+        _cached: None = Depends(RENTAL_CACHE),
 ):
-    rental = await session.get(Rental, rental_id)
+    rental = await session.get(Rental, rental_id, options=RENTAL_LOAD_OPTIONS)
     if not rental:
         raise HTTPException(status_code=404, detail="کرایه پیدا نشد")
 
-    if _user["role"] == CustomerRole.CUSTOMER.value and rental.customer_id != uuid.UUID(_user["id"]):
+    if _user.role == CustomerRole.CUSTOMER.value and rental.customer_id != _user.id:
         raise HTTPException(status_code=403,
                             detail="شما دسترسی لازم برای مشاهده اطلاعات کرایه های  دیگر را ندارید")
 
@@ -125,20 +160,19 @@ async def patch_rental(
         session: AsyncSession = Depends(get_session),
         rental_id: uuid.UUID,
         rental_update: RentalUpdate,
-        _user: dict = Depends(
+        _user: Principal = Depends(
             require_roles(
                 AdminRole.SUPER_ADMIN.value,
                 AdminRole.GENERAL_ADMIN.value,
                 CustomerRole.CUSTOMER.value,
             )
         ),
-        _token: str = Depends(oauth2_scheme),
 ):
     rental = await session.get(Rental, rental_id)
     if not rental:
         raise HTTPException(status_code=404, detail="کرایه پیدا نشد")
 
-    if _user["role"] == CustomerRole.CUSTOMER.value and rental.customer_id != uuid.UUID(_user["id"]):
+    if _user.role == CustomerRole.CUSTOMER.value and rental.customer_id != _user.id:
         raise HTTPException(status_code=403,
                             detail="شما دسترسی لازم برای ویرایش اطلاعات کرایه های  دیگر را ندارید")
 
@@ -147,9 +181,7 @@ async def patch_rental(
     rental.sqlmodel_update(rental_data)
 
     await session.commit()
-    await session.refresh(rental)
-
-    return rental
+    return await session.get(Rental, rental.id, options=RENTAL_LOAD_OPTIONS, populate_existing=True)
 
 
 @router.delete(
@@ -160,21 +192,20 @@ async def delete_rental(
     *,
     session: AsyncSession = Depends(get_session),
     rental_id: uuid.UUID,
-    _user: dict = Depends(
+    _user: Principal = Depends(
         require_roles(
             AdminRole.SUPER_ADMIN.value,
             AdminRole.GENERAL_ADMIN.value,
             CustomerRole.CUSTOMER.value,
         )
     ),
-    _token: str = Depends(oauth2_scheme),
 ):
     rental = await session.get(Rental, rental_id)
 
     if not rental:
         raise HTTPException(status_code=404, detail="کرایه پیدا نشد")
 
-    if _user["role"] == CustomerRole.CUSTOMER.value and rental.customer_id != uuid.UUID(_user["id"]):
+    if _user.role == CustomerRole.CUSTOMER.value and rental.customer_id != _user.id:
         raise HTTPException(status_code=403,
                             detail="شما دسترسی لازم برای حذف کرایه های  دیگر را ندارید")
 
@@ -192,59 +223,23 @@ async def delete_rental(
 )
 async def search_rentals(
         *,
-        session: AsyncSession = Depends(get_session),
-        rental_start_date: str | None = None,
-        rental_end_date: str | None = None,
-        total_amount: int | None = None,
-        customer_id: uuid.UUID | None = None,
-        vehicle_id: uuid.UUID | None = None,
-        invoice_id: uuid.UUID | None = None,
-        operator: LogicalOperator,
-        offset: int = Query(default=0, ge=0),
-        limit: int = Query(default=100, le=100),
-        _user: dict = Depends(
+        session: AsyncSession = Depends(get_read_session),
+        response: Response,
+        search: Search = Depends(RENTAL_SEARCH),
+        _user: Principal = Depends(
             require_roles(
                 AdminRole.SUPER_ADMIN.value,
                 AdminRole.GENERAL_ADMIN.value,
                 CustomerRole.CUSTOMER.value
             )
         ),
-        _token: str = Depends(oauth2_scheme),
 ):
-    conditions = []
-    if rental_start_date:
-        conditions.append(Rental.rental_start_date == rental_start_date)
-    if rental_end_date:
-        conditions.append(Rental.rental_end_date == rental_end_date)
-    if total_amount:
-        conditions.append(Rental.total_amount >= total_amount)
-    if customer_id:
-        conditions.append(Rental.customer_id == customer_id)
-    if vehicle_id:
-        conditions.append(Rental.vehicle_id == vehicle_id)
-    if invoice_id:
-        conditions.append(Rental.invoice_id == invoice_id)
-
-    if not conditions:
-        raise HTTPException(status_code=400, detail="هیچ مقداری برای جست و جو وجود ندارد")
-
-    if operator == LogicalOperator.AND:
-        query = select(Rental).where(and_(*conditions))
-    elif operator == LogicalOperator.OR:
-        query = select(Rental).where(or_(*conditions))
-    elif operator == LogicalOperator.NOT:
-        query = select(Rental).where(and_(not_(*conditions)))
-    else:
-        raise HTTPException(status_code=400, detail="عملگر نامعتبر مشخص شده است")
-
-    query = query.offset(offset).limit(limit)
-
-    if _user["role"] == CustomerRole.CUSTOMER.value:
-        query = query.where(Rental.customer_id == _user["id"])
-
-    rental_db = await session.execute(query)
-    rentals = rental_db.scalars().all()
+    query = search.apply(select(Rental).options(*RENTAL_LOAD_OPTIONS))
+    if _user.role == CustomerRole.CUSTOMER.value:
+        query = query.where(Rental.customer_id == _user.id)
+    rentals = (await session.execute(query)).scalars().all()
     if not rentals:
         raise HTTPException(status_code=404, detail="کرایه پیدا نشد")
 
+    search.set_next_cursor(response, rentals)
     return rentals
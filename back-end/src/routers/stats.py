@@ -1,85 +1,250 @@
-from jdatetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from zoneinfo import ZoneInfo
 
-from fastapi import APIRouter, Depends
-from sqlalchemy import func, select
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import ScalarSelect, func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from dependencies import get_session, require_roles
-from models.relational_models import Vehicle, Comment, Post, Invoice, Customer, Admin, Payment
-from utilities.authentication import oauth2_scheme
-from utilities.enumerables import AdminRole
+from database import async_engine, async_read_engine
+from dependencies import Principal, get_read_session, recent_writers, require_roles
+from models.counter import DailyPurchaseCount, TableRowCount
+from models.relational_models import Vehicle, Comment, Post, Invoice, Customer, Admin
+from models.sales_rollup import SalesRollup
+from schemas.stats import (
+    BranchUtilizationPublic, DayRange, FleetUtilizationPublic, SalesBucket, VehicleUtilizationPublic,
+)
+from utilities.analytics import ANALYTICS_MAX_BUCKETS, bucket_bounds, jalali
+from utilities.authentication import token_cache
+from utilities.cache import response_cache
+from utilities.counters import PURCHASE_TIME_ZONE
+from utilities.enumerables import AdminRole, AnalyticsDimension, AnalyticsInterval, Brand, BranchLocations
+from utilities.facets import bucket, bucket_ranges
+from utilities.fields_validator import JalaliDate
+from utilities.pagination import paginate, set_next_cursor
+from utilities.utilization import fleet_utilization, vehicle_utilization
 
 router = APIRouter()
 
+# Tables counted for each role, in the order of the response
+GENERAL_ADMIN_COUNTS = (Vehicle, Comment, Invoice, Customer)
+SUPER_ADMIN_COUNTS = (Vehicle, Comment, Post, Invoice, Customer, Admin)
+
+
+def row_count(model: type) -> ScalarSelect:
+    """
+    Selects the row count of a table, as kept by the triggers of `utilities.counters`.
+    """
+    return select(
+        func.coalesce(func.max(TableRowCount.row_count), 0)
+    ).where(
+        TableRowCount.table_name == model.__tablename__
+    ).scalar_subquery()
+
 
 @router.get("/stats/")
 async def get_stats(*,
-              session: AsyncSession = Depends(get_session),
-              _user: dict = Depends(
+              session: AsyncSession = Depends(get_read_session),
+              _user: Principal = Depends(
+                  require_roles(
+                      AdminRole.SUPER_ADMIN.value,
+                      AdminRole.GENERAL_ADMIN.value,
+                  )
+              ),
+              ):
+    # Today's purchases, counted on the day of the Jalali calendar in Tehran
+    today = datetime.now(ZoneInfo(PURCHASE_TIME_ZONE)).date()
+    counted_models = GENERAL_ADMIN_COUNTS if _user.role == AdminRole.GENERAL_ADMIN.value else SUPER_ADMIN_COUNTS
+
+    # The counters kept by triggers, read in one statement instead of counting the tables
+    stmt = select(
+        *(row_count(model).label(f"{model.__tablename__}_count") for model in counted_models),
+        select(
+            func.coalesce(func.max(DailyPurchaseCount.purchase_count), 0)
+        ).where(
+            DailyPurchaseCount.day == today
+        ).scalar_subquery().label("today_purchase_count"),
+    )
+
+    result = await session.execute(stmt)
+    return dict(result.one()._mapping)
+
+
+@router.get(
+    "/stats/analytics/",
+    response_model=list[SalesBucket],
+)
+async def get_analytics(*,
+              session: AsyncSession = Depends(get_read_session),
+              start_date: JalaliDate,
+              end_date: JalaliDate,
+              interval: AnalyticsInterval = AnalyticsInterval.DAY,
+              group_by: list[AnalyticsDimension] = Query(default=[]),
+              location: BranchLocations | None = None,
+              brand: Brand | None = None,
+              _user: Principal = Depends(
                   require_roles(
                       AdminRole.SUPER_ADMIN.value,
                       AdminRole.GENERAL_ADMIN.value,
                   )
               ),
-              _token: str = Depends(oauth2_scheme),
               ):
-    tehran_now = datetime.now(ZoneInfo("Asia/Tehran"))
-    today_start = tehran_now.replace(hour=0, minute=0, second=0, microsecond=0)
-    today_end = today_start + timedelta(days=1)
-
-    fmt = "%Y/%m/%d %H:%M:%S"
-    today_start_str = today_start.strftime(fmt)
-    today_end_str = today_end.strftime(fmt)
-
-    if _user["role"] == AdminRole.GENERAL_ADMIN.value:
-        stmt = select(
-            select(func.count(Vehicle.id)).scalar_subquery().label("vehicle_count"),
-            select(func.count(Comment.id)).scalar_subquery().label("comment_count"),
-            select(func.count(Invoice.id)).scalar_subquery().label("invoice_count"),
-            select(func.count(Customer.id)).scalar_subquery().label("customer_count"),
-            select(
-                func.count(Payment.id)
-            ).where(
-                Payment.payment_datetime.between(today_start_str, today_end_str)
-            ).scalar_subquery().label("today_purchase_count"),
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="تاریخ پایان باید بعد از تاریخ شروع باشد")
+    bounds = bucket_bounds(start_date, end_date, interval)
+    if len(bounds) > ANALYTICS_MAX_BUCKETS:
+        raise HTTPException(status_code=400, detail="بازه زمانی برای این تفکیک بیش از حد طولانی است")
+
+    # Only the rollup is read, never the payments; writes reach it at the next refresh of the workers
+    dimensions = [getattr(SalesRollup, dimension.value) for dimension in dict.fromkeys(group_by)]
+    index = bucket(SalesRollup.day, bounds).label("bucket")
+    sales_query = select(
+        index,
+        *dimensions,
+        func.sum(SalesRollup.revenue).label("revenue"),
+        func.sum(SalesRollup.payment_count).label("payment_count"),
+        func.sum(SalesRollup.rental_count).label("rental_count"),
+    ).where(
+        SalesRollup.day >= start_date, SalesRollup.day <= end_date
+    ).group_by(index, *dimensions).order_by(index, *dimensions)
+    if location:
+        sales_query = sales_query.where(SalesRollup.location == location)
+    if brand:
+        sales_query = sales_query.where(SalesRollup.brand == brand)
+
+    # Each bound is formatted once, not once per branch and brand
+    ranges = [
+        (jalali(first), jalali(last if last is not None else end_date))
+        for first, last in bucket_ranges(bounds, timedelta(days=1))
+    ]
+    return [
+        SalesBucket(
+            start=ranges[row.bucket][0],
+            end=ranges[row.bucket][1],
+            location=row._mapping.get("location"),
+            brand=row._mapping.get("brand"),
+            revenue=row.revenue,
+            payment_count=row.payment_count,
+            rental_count=row.rental_count,
         )
-    else:
-        stmt = select(
-            select(func.count(Vehicle.id)).scalar_subquery().label("vehicle_count"),
-            select(func.count(Comment.id)).scalar_subquery().label("comment_count"),
-            select(func.count(Post.id)).scalar_subquery().label("post_count"),
-            select(func.count(Invoice.id)).scalar_subquery().label("invoice_count"),
-            select(func.count(Customer.id)).scalar_subquery().label("customer_count"),
-            select(func.count(Admin.id)).scalar_subquery().label("admin_count"),
-            select(
-                func.count(Payment.id)
-            ).where(
-                Payment.payment_datetime.between(today_start_str, today_end_str)
-            ).scalar_subquery().label("today_purchase_count"),
+        for row in await session.execute(sales_query)
+    ]
+
+
+def day_ranges(ranges: list[tuple[date, date]]) -> list[DayRange]:
+    """
+    Formats ranges of days, both ends included, as Jalali dates.
+    """
+    return [DayRange(start=jalali(start), end=jalali(end)) for start, end in ranges]
+
+
+@router.get(
+    "/stats/utilization/",
+    response_model=FleetUtilizationPublic,
+)
+async def get_utilization(*,
+              session: AsyncSession = Depends(get_read_session),
+              start_date: JalaliDate,
+              end_date: JalaliDate,
+              location: BranchLocations | None = None,
+              brand: Brand | None = None,
+              _user: Principal = Depends(
+                  require_roles(
+                      AdminRole.SUPER_ADMIN.value,
+                      AdminRole.GENERAL_ADMIN.value,
+                  )
+              ),
+              ):
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="تاریخ پایان باید بعد از تاریخ شروع باشد")
+
+    fleet, branches = await fleet_utilization(session, start_date, end_date, location=location, brand=brand)
+    return FleetUtilizationPublic(
+        start=jalali(start_date),
+        end=jalali(end_date),
+        days=fleet.days,
+        vehicle_count=fleet.vehicle_count,
+        rented_days=fleet.rented_days,
+        utilization=fleet.utilization,
+        peak_rented_vehicles=fleet.peak_rented_vehicles,
+        peak_windows=day_ranges(fleet.peak_windows),
+        branches=[
+            BranchUtilizationPublic(
+                location=branch,
+                vehicle_count=utilization.vehicle_count,
+                rented_days=utilization.rented_days,
+                utilization=utilization.utilization,
+                peak_rented_vehicles=utilization.peak_rented_vehicles,
+                peak_windows=day_ranges(utilization.peak_windows),
+            )
+            for branch, utilization in branches.items()
+        ],
+    )
+
+
+@router.get(
+    "/stats/utilization/vehicles/",
+    response_model=list[VehicleUtilizationPublic],
+)
+async def get_vehicle_utilization(*,
+              session: AsyncSession = Depends(get_read_session),
+              response: Response,
+              start_date: JalaliDate,
+              end_date: JalaliDate,
+              location: BranchLocations | None = None,
+              brand: Brand | None = None,
+              offset: int = Query(default=0, ge=0),
+              limit: int = Query(default=100, le=100),
+              cursor: str | None = None,
+              _user: Principal = Depends(
+                  require_roles(
+                      AdminRole.SUPER_ADMIN.value,
+                      AdminRole.GENERAL_ADMIN.value,
+                  )
+              ),
+              ):
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="تاریخ پایان باید بعد از تاریخ شروع باشد")
+
+    vehicles_query = select(Vehicle)
+    if location:
+        vehicles_query = vehicles_query.where(Vehicle.location == location)
+    if brand:
+        vehicles_query = vehicles_query.where(Vehicle.brand == brand)
+    vehicles_query = paginate(vehicles_query, Vehicle, cursor=cursor, offset=offset, limit=limit)
+    vehicles = (await session.execute(vehicles_query)).scalars().all()
+    set_next_cursor(response, vehicles, limit)
+
+    # Only the rentals of the vehicles of the page are read
+    utilizations = await vehicle_utilization(session, start_date, end_date, [vehicle.id for vehicle in vehicles])
+    return [
+        VehicleUtilizationPublic(
+            vehicle_id=vehicle.id,
+            plate_number=vehicle.plate_number,
+            location=vehicle.location,
+            brand=vehicle.brand,
+            rented_days=utilization.rented_days,
+            utilization=utilization.utilization,
+            idle_gaps=day_ranges(utilization.idle_gaps),
         )
+        for vehicle, utilization in zip(vehicles, utilizations)
+    ]
 
-    result = await session.execute(stmt)
-    row = result.one()
-
-
-    if _user["role"] == AdminRole.GENERAL_ADMIN.value:
-        stats = {
-            "vehicle_count": row.vehicle_count,
-            "comment_count": row.comment_count,
-            "invoice_count": row.invoice_count,
-            "customer_count": row.customer_count,
-            "today_purchase_count": row.today_purchase_count
-        }
-    else:
-        stats = {
-            "vehicle_count": row.vehicle_count,
-            "comment_count": row.comment_count,
-            "post_count": row.post_count,
-            "invoice_count": row.invoice_count,
-            "customer_count": row.customer_count,
-            "admin_count": row.admin_count,
-            "today_purchase_count": row.today_purchase_count
-        }
-
-    return stats
+
+@router.get("/stats/database/")
+async def get_database_stats(*,
+              _user: Principal = Depends(
+                  require_roles(
+                      AdminRole.SUPER_ADMIN.value,
+                  )
+              ),
+              ):
+    return {
+        "pool": async_engine.pool.metrics.snapshot(async_engine.pool),
+        "replica_pool": (
+            async_read_engine.pool.metrics.snapshot(async_read_engine.pool)
+            if async_read_engine is not async_engine else None
+        ),
+        "recent_writers": recent_writers.stats(),
+        "token_cache": token_cache.stats(),
+        "response_cache": await response_cache.stats(),
+    }
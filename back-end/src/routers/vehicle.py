@@ -1,33 +1,127 @@
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Request, Response
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlmodel import select, and_, or_, not_
+from sqlalchemy.orm import selectinload
+from sqlmodel import select
 
-from dependencies import get_session, require_roles
-from models.relational_models import Vehicle
-from schemas.relational_schemas import RelationalVehiclePublic
+from dependencies import (
+    ConditionalGet, Principal, ResponseCache, get_read_session, get_session, read_table_versions, require_roles,
+)
+from models.relational_models import Rental, Vehicle, VehicleInsurance
+from schemas.relational_schemas import RelationalVehiclePublic, RelationalVehicleSearchPublic
 from schemas.vehicle import VehicleCreate, VehicleUpdate
-from utilities.authentication import oauth2_scheme
-from utilities.enumerables import LogicalOperator, CarStatus, Brand, AdminRole, CustomerRole
+from utilities.availability import RENTABLE_STATUSES, rental_window
+from utilities.cache import CachedRoute
+from utilities.enumerables import BranchLocations, CarStatus, Brand, AdminRole, CustomerRole, StreamFormat
+from utilities.facets import bucket, bucket_ranges, count_facets
+from utilities.fields_validator import JalaliDate
+from utilities.nested_collections import load_latest_children
+from utilities.pagination import paginate, set_next_cursor
+from utilities.search import Exact, Range, Search, SearchSpec
+from utilities.streaming import stream_list
+
+router = APIRouter(route_class=CachedRoute)
+
+# Relationships serialized by RelationalVehiclePublic; capped collections only embed their latest children
+VEHICLE_LOAD_OPTIONS = (selectinload(Vehicle.insurances),)
+VEHICLE_CAPPED_COLLECTIONS = (Vehicle.rentals,)
+
+# Tables serialized by RelationalVehiclePublic, whose versions tag the responses of the public
+# vehicle endpoints for conditional GETs and the response cache
+VEHICLE_TABLES = (Vehicle, VehicleInsurance, Rental)
+VEHICLE_CONDITIONAL_GET = ConditionalGet(*VEHICLE_TABLES)
+VEHICLE_CACHE = ResponseCache(*VEHICLE_TABLES)
 
-router = APIRouter()
+# Query parameters of the search endpoint; every field and sort key is backed by an index
+VEHICLE_SEARCH = SearchSpec(
+    Vehicle,
+    Range(Vehicle.hourly_rental_rate, int, minimum_alias=True),
+    Range(Vehicle.security_deposit, int, minimum_alias=True),
+    Range(Vehicle.year, int),
+    Range(Vehicle.mileage, int),
+    Exact(Vehicle.status, CarStatus),
+    Exact(Vehicle.brand, Brand),
+    Exact(Vehicle.location, BranchLocations),
+    Exact(Vehicle.plate_number, str),
+    sort_keys=(Vehicle.year, Vehicle.mileage),
+)
+
+# Lower bounds of the hourly rental rate ranges counted by the search facets
+VEHICLE_PRICE_BUCKETS = (0, 500_000, 1_000_000, 2_000_000, 5_000_000)
+
+# Facets the search endpoint counts over all the searched vehicles when asked for them
+VEHICLE_FACETS = {
+    "brand": Vehicle.brand,
+    "status": Vehicle.status,
+    "location": Vehicle.location,
+    "hourly_rental_rate": bucket(Vehicle.hourly_rental_rate, VEHICLE_PRICE_BUCKETS),
+}
 
 
 @router.get(
     "/vehicles/",
     response_model=list[RelationalVehiclePublic],
+    dependencies=[Depends(VEHICLE_CONDITIONAL_GET)],
 )
 async def get_vehicles(
     *,
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_read_session),
+    response: Response,
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=100, le=100),
+    cursor: str | None = None,
+    stream: StreamFormat | None = None,
+    _cached: None = Depends(VEHICLE_CACHE),
+):
+    vehicles_query = select(Vehicle).options(*VEHICLE_LOAD_OPTIONS)
+    if stream:
+        return stream_list(
+            session, vehicles_query, Vehicle, schema=RelationalVehiclePublic, stream_format=stream,
+            capped_collections=VEHICLE_CAPPED_COLLECTIONS,
+        )
+
+    vehicles_query = paginate(vehicles_query, Vehicle, cursor=cursor, offset=offset, limit=limit)
+    vehicles = (await session.execute(vehicles_query)).scalars().all()
+    set_next_cursor(response, vehicles, limit)
+    await load_latest_children(session, vehicles, *VEHICLE_CAPPED_COLLECTIONS)
+    return vehicles
+
+
+@router.get(
+    "/vehicles/available/",
+    response_model=list[RelationalVehiclePublic],
+)
+async def get_available_vehicles(
+    *,
+    session: AsyncSession = Depends(get_read_session),
+    response: Response,
+    location: BranchLocations,
+    start_date: JalaliDate,
+    end_date: JalaliDate,
     offset: int = Query(default=0, ge=0),
     limit: int = Query(default=100, le=100),
+    cursor: str | None = None,
 ):
-    vehicles_query = select(Vehicle).offset(offset).limit(limit).order_by(Vehicle.created_at)
-    vehicles = await session.execute(vehicles_query)
-    return vehicles.scalars().all()
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="تاریخ پایان باید بعد از تاریخ شروع باشد")
+
+    # Rentals of the vehicle holding any day of the window, found through the GiST index on their periods
+    overlapping_rentals = select(Rental.id).where(
+        Rental.vehicle_id == Vehicle.id,
+        Rental.__table__.c.rental_period.op("&&")(rental_window(start_date, end_date)),
+    )
+    vehicles_query = select(Vehicle).options(*VEHICLE_LOAD_OPTIONS).where(
+        Vehicle.location == location,
+        Vehicle.status.in_(RENTABLE_STATUSES),
+        ~overlapping_rentals.exists(),
+    )
+    vehicles_query = paginate(vehicles_query, Vehicle, cursor=cursor, offset=offset, limit=limit)
+    vehicles = (await session.execute(vehicles_query)).scalars().all()
+    set_next_cursor(response, vehicles, limit)
+    await load_latest_children(session, vehicles, *VEHICLE_CAPPED_COLLECTIONS)
+    return vehicles
 
 
 @router.post(
@@ -38,13 +132,12 @@ async def create_vehicle(
         *,
         session: AsyncSession = Depends(get_session),
         vehicle_create: VehicleCreate,
-        _user: dict = Depends(
+        _user: Principal = Depends(
             require_roles(
                 AdminRole.SUPER_ADMIN.value,
                 AdminRole.GENERAL_ADMIN.value,
             )
         ),
-        _token: str = Depends(oauth2_scheme),
 ):
     try:
         db_vehicle = Vehicle(
@@ -64,9 +157,9 @@ async def create_vehicle(
 
         session.add(db_vehicle)
         await session.commit()
-        await session.refresh(db_vehicle)
-
-        return db_vehicle
+        vehicle = await session.get(Vehicle, db_vehicle.id, options=VEHICLE_LOAD_OPTIONS, populate_existing=True)
+        await load_latest_children(session, [vehicle], *VEHICLE_CAPPED_COLLECTIONS)
+        return vehicle
 
     except IntegrityError:
         await session.rollback()
@@ -85,16 +178,19 @@ async def create_vehicle(
 @router.get(
     "/vehicles/{vehicle_id}",
     response_model=RelationalVehiclePublic,
+    dependencies=[Depends(VEHICLE_CONDITIONAL_GET)],
 )
 async def get_vehicle(
         *,
-        session: AsyncSession = Depends(get_session),
+        session: AsyncSession = Depends(get_read_session),
         vehicle_id: UUID,
+        _cached: None = Depends(VEHICLE_CACHE),
 ):
-    vehicle = await session.get(Vehicle, vehicle_id)
+    vehicle = await session.get(Vehicle, vehicle_id, options=VEHICLE_LOAD_OPTIONS)
     if not vehicle:
         raise HTTPException(status_code=404, detail="وسیله نقلیه پیدا نشد")
 
+    await load_latest_children(session, [vehicle], *VEHICLE_CAPPED_COLLECTIONS)
     return vehicle
 
 
@@ -107,13 +203,12 @@ async def patch_vehicle(
         session: AsyncSession = Depends(get_session),
         vehicle_id: UUID,
         vehicle_update: VehicleUpdate,
-        _user: dict = Depends(
+        _user: Principal = Depends(
             require_roles(
                 AdminRole.SUPER_ADMIN.value,
                 AdminRole.GENERAL_ADMIN.value,
             )
         ),
-        _token: str = Depends(oauth2_scheme),
 ):
     vehicle = await session.get(Vehicle, vehicle_id)
     if not vehicle:
@@ -124,8 +219,8 @@ async def patch_vehicle(
     vehicle.sqlmodel_update(vehicle_data)
 
     await session.commit()
-    await session.refresh(vehicle)
-
+    vehicle = await session.get(Vehicle, vehicle.id, options=VEHICLE_LOAD_OPTIONS, populate_existing=True)
+    await load_latest_children(session, [vehicle], *VEHICLE_CAPPED_COLLECTIONS)
     return vehicle
 
 
@@ -137,13 +232,12 @@ async def delete_vehicle(
     *,
     session: AsyncSession = Depends(get_session),
     vehicle_id: UUID,
-    _user: dict = Depends(
+    _user: Principal = Depends(
         require_roles(
             AdminRole.SUPER_ADMIN.value,
             AdminRole.GENERAL_ADMIN.value,
         )
     ),
-    _token: str = Depends(oauth2_scheme),
 ):
     vehicle = await session.get(Vehicle, vehicle_id)
     if not vehicle:
@@ -157,49 +251,41 @@ async def delete_vehicle(
 
 @router.get(
     "/vehicles/search/",
-    response_model=list[RelationalVehiclePublic],
+    response_model=list[RelationalVehiclePublic] | RelationalVehicleSearchPublic,
 )
 async def search_vehicles(
         *,
-        session: AsyncSession = Depends(get_session),
-        hourly_rental_rate: int | None = None,
-        security_deposit: int | None = None,
-        status: CarStatus | None = None,
-        brand: Brand | None = None,
-        plate_number: str | None = None,
-        operator: LogicalOperator,
-        offset: int = Query(default=0, ge=0),
-        limit: int = Query(default=100, le=100),
+        session: AsyncSession = Depends(get_read_session),
+        request: Request,
+        response: Response,
+        search: Search = Depends(VEHICLE_SEARCH),
+        facets: bool = False,
 ):
-    conditions = []
-    if hourly_rental_rate:
-        conditions.append(Vehicle.hourly_rental_rate >= hourly_rental_rate)
-    if security_deposit:
-        conditions.append(Vehicle.security_deposit >= security_deposit)
-    if status:
-        conditions.append(Vehicle.status == status)
-    if brand:
-        conditions.append(Vehicle.brand == brand)
-    if plate_number:
-        conditions.append(Vehicle.plate_number == plate_number)
-
-    if not conditions:
-        raise HTTPException(status_code=400, detail="هیچ مقداری برای جست و جو وجود ندارد")
-
-
-    if operator == LogicalOperator.AND:
-        query = select(Vehicle).where(and_(*conditions))
-    elif operator == LogicalOperator.OR:
-        query = select(Vehicle).where(or_(*conditions))
-    elif operator == LogicalOperator.NOT:
-        query = select(Vehicle).where(and_(not_(*conditions)))
-    else:
-        raise HTTPException(status_code=400, detail="عملگر نامعتبر مشخص شده است")
-
-    query = query.offset(offset).limit(limit)
-    vehicle_db = await session.execute(query)
-    vehicles = vehicle_db.scalars().all()
+    query = search.apply(select(Vehicle).options(*VEHICLE_LOAD_OPTIONS))
+    vehicles = (await session.execute(query)).scalars().all()
     if not vehicles:
         raise HTTPException(status_code=404, detail="وسیله نقلیه پیدا نشد")
 
-    return vehicles
+    search.set_next_cursor(response, vehicles)
+    await load_latest_children(session, vehicles, *VEHICLE_CAPPED_COLLECTIONS)
+    if not facets:
+        return vehicles
+
+    # The counts cover every page of the search, so they are shared by all its pages and sort orders
+    # until a vehicle is written
+    cache_key = (search.key, await read_table_versions(request, session, ("vehicle",)))
+    counts = await count_facets(session, search.where(select(Vehicle)), VEHICLE_FACETS, cache_key=cache_key)
+    rate_counts = counts["hourly_rental_rate"]
+    return {
+        "vehicles": vehicles,
+        "facets": {
+            "brand": counts["brand"],
+            "status": counts["status"],
+            "location": counts["location"],
+            "hourly_rental_rate": [
+                {"minimum": minimum, "maximum": maximum, "count": rate_counts[index]}
+                for index, (minimum, maximum) in enumerate(bucket_ranges(VEHICLE_PRICE_BUCKETS))
+                if index in rate_counts
+            ],
+        },
+    }
@@ -1,18 +1,41 @@
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Response
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlmodel import select, and_, or_, not_
+from sqlalchemy.orm import joinedload
+from sqlmodel import select
 
-from dependencies import get_session, require_roles
-from models.relational_models import VehicleInsurance
+from dependencies import Principal, ResponseCache, get_read_session, get_session, require_roles
+from models.relational_models import Vehicle, VehicleInsurance
 from schemas.relational_schemas import RelationalVehicleInsurancePublic
 from schemas.vehicle_insurance import VehicleInsuranceCreate, VehicleInsuranceUpdate
-from utilities.authentication import oauth2_scheme
-from utilities.enumerables import LogicalOperator, InsuranceType, AdminRole
-
-router = APIRouter()
+from utilities.cache import CachedRoute
+from utilities.enumerables import InsuranceType, AdminRole
+from utilities.fields_validator import JalaliDate
+from utilities.pagination import paginate, set_next_cursor
+from utilities.search import Exact, Range, Search, SearchSpec
+
+router = APIRouter(route_class=CachedRoute)
+
+# Relationships serialized by RelationalVehicleInsurancePublic
+VEHICLE_INSURANCE_LOAD_OPTIONS = (joinedload(VehicleInsurance.vehicle),)
+
+# Cached responses of the list and by-id endpoints, keyed by the versions of the tables
+# RelationalVehicleInsurancePublic serializes
+VEHICLE_INSURANCE_CACHE = ResponseCache(VehicleInsurance, Vehicle)
+
+# Query parameters of the search endpoint; every field and sort key is backed by an index
+VEHICLE_INSURANCE_SEARCH = SearchSpec(
+    VehicleInsurance,
+    Exact(VehicleInsurance.policy_number, str),
+    Exact(VehicleInsurance.insurance_type, InsuranceType),
+    Exact(VehicleInsurance.start_on, JalaliDate, name="start_date"),
+    Range(VehicleInsurance.start_on, JalaliDate, name="start_date"),
+    Exact(VehicleInsurance.expiration_on, JalaliDate, name="expiration_date"),
+    Range(VehicleInsurance.expiration_on, JalaliDate, name="expiration_date"),
+    sort_keys={"start_date": VehicleInsurance.start_on, "expiration_date": VehicleInsurance.expiration_on},
+)
 
 
 @router.get(
@@ -21,20 +44,23 @@ router = APIRouter()
 )
 async def get_vehicle_insurances(
     *,
-    session: AsyncSession = Depends(get_session),
+    session: AsyncSession = Depends(get_read_session),
+    response: Response,
     offset: int = Query(default=0, ge=0),
     limit: int = Query(default=100, le=100),
-    _user: dict = Depends(
+    cursor: str | None = None,
+    _user: Principal = Depends(
         require_roles(
             AdminRole.SUPER_ADMIN.value,
             AdminRole.GENERAL_ADMIN.value,
         )
     ),
-    _token: str = Depends(oauth2_scheme),
+    _cached: None = Depends(VEHICLE_INSURANCE_CACHE),
 ):
-    vehicle_insurances_query = select(VehicleInsurance).offset(offset).limit(limit).order_by(VehicleInsurance.created_at)
-    vehicle_insurances = await session.execute(vehicle_insurances_query)
-    return vehicle_insurances.scalars().all()
+    vehicle_insurances_query = paginate(select(VehicleInsurance).options(*VEHICLE_INSURANCE_LOAD_OPTIONS), VehicleInsurance, cursor=cursor, offset=offset, limit=limit)
+    vehicle_insurances = (await session.execute(vehicle_insurances_query)).scalars().all()
+    set_next_cursor(response, vehicle_insurances, limit)
+    return vehicle_insurances
 
 
 @router.post(
@@ -45,13 +71,12 @@ async def create_vehicle_insurance(
         *,
         session: AsyncSession = Depends(get_session),
         vehicle_insurance_create: VehicleInsuranceCreate,
-        _user: dict = Depends(
+        _user: Principal = Depends(
             require_roles(
                 AdminRole.SUPER_ADMIN.value,
                 AdminRole.GENERAL_ADMIN.value,
             )
         ),
-    _token: str = Depends(oauth2_scheme),
 ):
     try:
         db_vehicle_insurance = VehicleInsurance(
@@ -66,9 +91,7 @@ async def create_vehicle_insurance(
 
         session.add(db_vehicle_insurance)
         await session.commit()
-        await session.refresh(db_vehicle_insurance)
-
-        return db_vehicle_insurance
+        return await session.get(VehicleInsurance, db_vehicle_insurance.id, options=VEHICLE_INSURANCE_LOAD_OPTIONS, populate_existing=True)
 
     except IntegrityError:
         await session.rollback()
@@ -90,17 +113,17 @@ async def create_vehicle_insurance(
 )
 async def get_vehicle_insurance(
         *,
-        session: AsyncSession = Depends(get_session),
+        session: AsyncSession = Depends(get_read_session),
         vehicle_insurance_id: UUID,
-        _user: dict = Depends(
+        _user: Principal = Depends(
             require_roles(
                 AdminRole.SUPER_ADMIN.value,
                 AdminRole.GENERAL_ADMIN.value,
             )
         ),
-        _token: str = Depends(oauth2_scheme),
+        _cached: None = Depends(VEHICLE_INSURANCE_CACHE),
 ):
-    vehicle_insurance = await session.get(VehicleInsurance, vehicle_insurance_id)
+    vehicle_insurance = await session.get(VehicleInsurance, vehicle_insurance_id, options=VEHICLE_INSURANCE_LOAD_OPTIONS)
     if not vehicle_insurance:
         raise HTTPException(status_code=404, detail="بیمه وسیله نقلیه پیدا نشد")
 
@@ -116,13 +139,12 @@ async def patch_vehicle_insurance(
         session: AsyncSession = Depends(get_session),
         vehicle_insurance_id: UUID,
         vehicle_insurance_update: VehicleInsuranceUpdate,
-        _user: dict = Depends(
+        _user: Principal = Depends(
             require_roles(
                 AdminRole.SUPER_ADMIN.value,
                 AdminRole.GENERAL_ADMIN.value,
             )
         ),
-        _token: str = Depends(oauth2_scheme),
 ):
     vehicle_insurance = await session.get(VehicleInsurance, vehicle_insurance_id)
     if not vehicle_insurance:
@@ -133,9 +155,7 @@ async def patch_vehicle_insurance(
     vehicle_insurance.sqlmodel_update(vehicle_insurance_data)
 
     await session.commit()
-    await session.refresh(vehicle_insurance)
-
-    return vehicle_insurance
+    return await session.get(VehicleInsurance, vehicle_insurance.id, options=VEHICLE_INSURANCE_LOAD_OPTIONS, populate_existing=True)
 
 
 @router.delete(
@@ -146,13 +166,12 @@ async def delete_vehicle_insurance(
     *,
     session: AsyncSession = Depends(get_session),
     vehicle_insurance_id: UUID,
-    _user: dict = Depends(
+    _user: Principal = Depends(
         require_roles(
             AdminRole.SUPER_ADMIN.value,
             AdminRole.GENERAL_ADMIN.value,
         )
     ),
-    _token: str = Depends(oauth2_scheme),
 ):
     vehicle_insurance = await session.get(VehicleInsurance, vehicle_insurance_id)
 
@@ -170,49 +189,20 @@ async def delete_vehicle_insurance(
 )
 async def search_vehicle_insurances(
         *,
-        session: AsyncSession = Depends(get_session),
-        policy_number: str | None = None,
-        insurance_type: InsuranceType | None = None,
-        start_date: str | None = None,
-        expiration_date: str | None = None,
-        operator: LogicalOperator,
-        offset: int = Query(default=0, ge=0),
-        limit: int = Query(default=100, le=100),
-        _user: dict = Depends(
+        session: AsyncSession = Depends(get_read_session),
+        response: Response,
+        search: Search = Depends(VEHICLE_INSURANCE_SEARCH),
+        _user: Principal = Depends(
             require_roles(
                 AdminRole.SUPER_ADMIN.value,
                 AdminRole.GENERAL_ADMIN.value,
             )
         ),
-        _token: str = Depends(oauth2_scheme),
 ):
-
-    conditions = []
-    if policy_number:
-        conditions.append(VehicleInsurance.policy_number == policy_number)
-    if insurance_type:
-        conditions.append(VehicleInsurance.insurance_type == insurance_type)
-    if start_date:
-        conditions.append(VehicleInsurance.start_date == start_date)
-    if expiration_date:
-        conditions.append(VehicleInsurance.expiration_date == expiration_date)
-
-    if not conditions:
-        raise HTTPException(status_code=400, detail="هیچ مقداری برای جست و جو وجود ندارد")
-
-    if operator == LogicalOperator.AND:
-        query = select(VehicleInsurance).where(and_(*conditions))
-    elif operator == LogicalOperator.OR:
-        query = select(VehicleInsurance).where(or_(*conditions))
-    elif operator == LogicalOperator.NOT:
-        query = select(VehicleInsurance).where(and_(not_(*conditions)))
-    else:
-        raise HTTPException(status_code=400, detail="عملگر نامعتبر مشخص شده است")
-
-    query = query.offset(offset).limit(limit)
-    vehicle_insurance_db = await session.execute(query)
-    vehicle_insurances = vehicle_insurance_db.scalars().all()
+    query = search.apply(select(VehicleInsurance).options(*VEHICLE_INSURANCE_LOAD_OPTIONS))
+    vehicle_insurances = (await session.execute(query)).scalars().all()
     if not vehicle_insurances:
         raise HTTPException(status_code=404, detail="بیمه وسیله نقلیه پیدا نشد")
 
+    search.set_next_cursor(response, vehicle_insurances)
     return vehicle_insurances
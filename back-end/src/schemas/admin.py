@@ -26,6 +26,10 @@ class AdminPublic(AdminBase):
     id: UUID
 
 
+class AdminLookupPublic(AdminPublic):
+    similarity: float
+
+
 class AdminUpdate(SQLModel):
     name_prefix: str | None = Field(
         default=None,
@@ -8,9 +8,7 @@ from utilities.fields_validator import validate_payment_datetime
 
 
 class PaymentBase(SQLModel):
-    payment_datetime: str = Field(
-        index=True,
-    )
+    payment_datetime: str
 
     payment_method: PaymentMethod = Field(
         ...
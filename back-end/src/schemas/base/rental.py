@@ -7,13 +7,9 @@ from utilities.fields_validator import validate_rental_start_date, validate_rent
 
 
 class RentalBase(SQLModel):
-    rental_start_date: str = Field(
-        index=True,
-    )
+    rental_start_date: str
 
-    rental_end_date: str = Field(
-        index=True,
-    )
+    rental_end_date: str
 
     total_amount: int = Field(
         ge=1000,
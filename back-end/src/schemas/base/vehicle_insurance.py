@@ -26,13 +26,9 @@ class VehicleInsuranceBase(SQLModel):
         index=True,
     )
 
-    start_date: str = Field(
-        index = True,
-    )
+    start_date: str
 
-    expiration_date: str = Field(
-        index = True,
-    )
+    expiration_date: str
 
     premium: int = Field(
         ge=0,
@@ -27,6 +27,10 @@ class CustomerPublic(CustomerBase):
     id: UUID
 
 
+class CustomerLookupPublic(CustomerPublic):
+    similarity: float
+
+
 class CustomerUpdate(SQLModel):
     name_prefix: str | None = Field(
         default=None,
@@ -1,3 +1,6 @@
+from pydantic import computed_field
+from sqlmodel import SQLModel
+
 from schemas.admin import AdminPublic
 from schemas.comment import CommentPublic
 from schemas.customer import CustomerPublic
@@ -5,13 +8,23 @@ from schemas.invoice import InvoicePublic
 from schemas.payment import PaymentPublic
 from schemas.post import PostPublic
 from schemas.rental import RentalPublic
-from schemas.vehicle import VehiclePublic
+from schemas.vehicle import VehicleFacets, VehiclePublic
 from schemas.vehicle_insurance import VehicleInsurancePublic
 
 
 class RelationalVehiclePublic(VehiclePublic):
     insurances: list[VehicleInsurancePublic] = []
     rentals: list[RentalPublic] = []
+    rentals_total: int | None = None
+
+    @computed_field
+    @property
+    def rentals_url(self) -> str:
+        return f"/rentals/?vehicle_id={self.id}"
+
+class RelationalVehicleSearchPublic(SQLModel):
+    vehicles: list[RelationalVehiclePublic]
+    facets: VehicleFacets
 
 class RelationalVehicleInsurancePublic(VehicleInsurancePublic):
     vehicle: VehiclePublic
@@ -19,10 +32,28 @@ class RelationalVehicleInsurancePublic(VehicleInsurancePublic):
 class RelationalCustomerPublic(CustomerPublic):
     rentals: list[RentalPublic] = []
     comments: list[CommentPublic] = []
+    rentals_total: int | None = None
+    comments_total: int | None = None
+
+    @computed_field
+    @property
+    def rentals_url(self) -> str:
+        return f"/rentals/?customer_id={self.id}"
+
+    @computed_field
+    @property
+    def comments_url(self) -> str:
+        return f"/comments/?customer_id={self.id}"
 
 class RelationalInvoicePublic(InvoicePublic):
     rentals: list[RentalPublic] = []
     payments: list[PaymentPublic] = []
+    payments_total: int | None = None
+
+    @computed_field
+    @property
+    def payments_url(self) -> str:
+        return f"/payments/?invoice_id={self.id}"
 
 class RelationalRentalPublic(RentalPublic):
     customer: CustomerPublic
@@ -37,6 +68,12 @@ class RelationalCommentPublic(CommentPublic):
 
 class RelationalAdminPublic(AdminPublic):
     posts: list[PostPublic] = []
+    posts_total: int | None = None
+
+    @computed_field
+    @property
+    def posts_url(self) -> str:
+        return f"/posts/?admin_id={self.id}"
 
 class RelationalPostPublic(PostPublic):
     admin: AdminPublic
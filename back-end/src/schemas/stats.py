@@ -0,0 +1,51 @@
+from uuid import UUID
+
+from sqlmodel import SQLModel
+
+from utilities.enumerables import Brand, BranchLocations
+
+
+class SalesBucket(SQLModel):
+    start: str
+    end: str
+    location: BranchLocations | None = None
+    brand: Brand | None = None
+    revenue: int
+    payment_count: int
+    rental_count: int
+
+
+class DayRange(SQLModel):
+    start: str
+    end: str
+
+
+class BranchUtilizationPublic(SQLModel):
+    location: BranchLocations
+    vehicle_count: int
+    rented_days: int
+    utilization: float
+    peak_rented_vehicles: int
+    peak_windows: list[DayRange]
+
+
+class FleetUtilizationPublic(SQLModel):
+    start: str
+    end: str
+    days: int
+    vehicle_count: int
+    rented_days: int
+    utilization: float
+    peak_rented_vehicles: int
+    peak_windows: list[DayRange]
+    branches: list[BranchUtilizationPublic]
+
+
+class VehicleUtilizationPublic(SQLModel):
+    vehicle_id: UUID
+    plate_number: str
+    location: BranchLocations
+    brand: Brand
+    rented_days: int
+    utilization: float
+    idle_gaps: list[DayRange]
@@ -81,4 +81,17 @@ class VehicleUpdate(SQLModel):
         default=None,
         min_length=5,
         max_length=50,
-    )
\ No newline at end of file
+    )
+
+
+class PriceRangeCount(SQLModel):
+    minimum: int
+    maximum: int | None
+    count: int
+
+
+class VehicleFacets(SQLModel):
+    brand: dict[Brand, int]
+    status: dict[CarStatus, int]
+    location: dict[BranchLocations, int]
+    hourly_rental_rate: list[PriceRangeCount]
\ No newline at end of file
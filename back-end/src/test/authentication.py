@@ -0,0 +1,90 @@
+import random
+import uuid
+
+import pytest
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import async_engine
+from models.relational_models import Admin, Customer
+from utilities.enumerables import AdminRole, AdminStatus
+from utilities.password_hashing import get_password_hash_async
+
+PASSWORD = "Customer-Password-1234"
+
+
+@pytest.mark.asyncio
+async def test_login_uses_single_statement(async_client, statements):
+
+    username = f"login{uuid.uuid4().hex[:12]}user"
+    customer = Customer(
+        first_name="test",
+        last_name="customer",
+        gender="MALE",
+        birthday="1370/01/01",
+        national_id=f"{random.randrange(10 ** 10):010d}",
+        phone=9120000000,
+        username=username,
+        email=None,
+        address="test address",
+        password=await get_password_hash_async(PASSWORD),
+    )
+    customer_id = customer.id
+    async with AsyncSession(async_engine) as session:
+        session.add(customer)
+        await session.commit()
+
+    try:
+        statements.clear()
+        response = await async_client.post("/login/", data={"username": username, "password": PASSWORD})
+
+        assert response.status_code == 200
+        assert response.json()["role"] == "Customer"
+        assert response.json()["id"] == str(customer_id)
+        assert len([s for s in statements if s.lstrip().upper().startswith("SELECT")]) == 1
+    finally:
+        async with AsyncSession(async_engine) as session:
+            await session.delete(await session.get(Customer, customer_id))
+            await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_login_prefers_admin_with_same_username(async_client):
+
+    username = f"login{uuid.uuid4().hex[:12]}both"
+    national_id = f"{random.randrange(10 ** 10):010d}"
+    hashed_password = await get_password_hash_async(PASSWORD)
+    admin = Admin(
+        first_name="test", last_name="admin", username=username, email=f"{username}@example.com", role=AdminRole.GENERAL_ADMIN,
+        status=AdminStatus.ACTIVE, national_id=national_id, gender="MALE", birthday="1370/01/01",
+        phone=9120000001, address="test address", password=hashed_password,
+    )
+    customer = Customer(
+        first_name="test", last_name="customer", gender="MALE", birthday="1370/01/01", national_id=national_id,
+        phone=9120000002, username=username, email=None, address="test address", password=hashed_password,
+    )
+    admin_id, customer_id = admin.id, customer.id
+    async with AsyncSession(async_engine) as session:
+        session.add_all([admin, customer])
+        await session.commit()
+
+    try:
+        response = await async_client.post("/login/", data={"username": username, "password": PASSWORD})
+
+        assert response.status_code == 200
+        assert response.json()["id"] == str(admin_id)
+        assert response.json()["role"] == AdminRole.GENERAL_ADMIN.value
+    finally:
+        async with AsyncSession(async_engine) as session:
+            await session.delete(await session.get(Admin, admin_id))
+            await session.delete(await session.get(Customer, customer_id))
+            await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_login_rejects_wrong_password(async_client):
+
+    response = await async_client.post(
+        "/login/", data={"username": f"missing{uuid.uuid4().hex[:8]}user", "password": PASSWORD}
+    )
+
+    assert response.status_code == 401
@@ -0,0 +1,68 @@
+from datetime import timedelta
+
+import pytest
+from jdatetime import date as jalali_date
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import async_engine
+from models.relational_models import Vehicle
+from utilities.enumerables import BranchLocations, CarStatus
+from utilities.pagination import NEXT_CURSOR_HEADER
+
+
+async def available_vehicle_ids(async_client, start: jalali_date, end: jalali_date) -> set[str]:
+    params = {
+        "location": BranchLocations.TEHRAN.value,
+        "start_date": start.strftime("%Y/%m/%d"),
+        "end_date": end.strftime("%Y/%m/%d"),
+    }
+    ids = set()
+    while True:
+        response = await async_client.get("/vehicles/available/", params=params)
+        assert response.status_code == 200
+        ids |= {vehicle["id"] for vehicle in response.json()}
+        if NEXT_CURSOR_HEADER not in response.headers:
+            return ids
+        params["cursor"] = response.headers[NEXT_CURSOR_HEADER]
+
+
+@pytest.mark.asyncio
+async def test_vehicles_with_overlapping_rentals_are_not_available(async_client, sample_data):
+    # The sample vehicle is in Tehran, rented from tomorrow for two days
+    tomorrow = jalali_date.today() + timedelta(days=1)
+    vehicle_id = str(sample_data["vehicle"])
+
+    assert vehicle_id not in await available_vehicle_ids(async_client, tomorrow, tomorrow)
+    assert vehicle_id not in await available_vehicle_ids(async_client, tomorrow - timedelta(days=3), tomorrow)
+    assert vehicle_id not in await available_vehicle_ids(
+        async_client, tomorrow + timedelta(days=1), tomorrow + timedelta(days=9)
+    )
+    assert vehicle_id in await available_vehicle_ids(
+        async_client, tomorrow + timedelta(days=2), tomorrow + timedelta(days=9)
+    )
+    assert vehicle_id in await available_vehicle_ids(
+        async_client, tomorrow - timedelta(days=5), tomorrow - timedelta(days=1)
+    )
+
+    async with AsyncSession(async_engine) as session:
+        await session.execute(
+            update(Vehicle).where(Vehicle.id == sample_data["vehicle"]).values(status=CarStatus.MAINTENANCE)
+        )
+        await session.commit()
+    assert vehicle_id not in await available_vehicle_ids(
+        async_client, tomorrow + timedelta(days=2), tomorrow + timedelta(days=9)
+    )
+
+
+@pytest.mark.asyncio
+async def test_availability_window_must_not_be_reversed(async_client):
+    response = await async_client.get("/vehicles/available/", params={
+        "location": BranchLocations.SHIRAZ.value, "start_date": "1404/02/10", "end_date": "1404/02/01",
+    })
+    assert response.status_code == 400
+
+    response = await async_client.get("/vehicles/available/", params={
+        "location": BranchLocations.SHIRAZ.value, "start_date": "1404/02/40", "end_date": "1404/02/41",
+    })
+    assert response.status_code == 422
@@ -0,0 +1,157 @@
+import asyncio
+import csv
+import io
+import zipfile
+
+import orjson
+import pytest
+from sqlalchemy import text
+
+from database import async_engine
+from utilities.backup import ALEMBIC_VERSION_TABLE, UNRESTORED_TABLES, backup_chunks, restore_archive
+
+
+def read_csv(zf: zipfile.ZipFile, name: str) -> list[dict[str, str]]:
+    return list(csv.DictReader(io.TextIOWrapper(zf.open(name), encoding="utf-8", newline="")))
+
+
+async def read_backup() -> int:
+    size = 0
+    async for chunk in backup_chunks(async_engine, {"backup_time_utc": "2000-01-01T00:00:00+00:00Z"}):
+        size += len(chunk)
+    return size
+
+
+@pytest.mark.asyncio
+async def test_backup_archives_every_table(async_client, fake_admin_token, sample_data):
+    response = await async_client.get("/backup/", headers={"Authorization": f"Bearer {fake_admin_token}"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/zip"
+
+    with zipfile.ZipFile(io.BytesIO(response.content)) as zf:
+        names = set(zf.namelist())
+        assert "metadata.json" in names
+        assert orjson.loads(zf.read("metadata.json"))["format"] == "csv"
+        assert not names & {f"{table}.csv" for table in UNRESTORED_TABLES}
+        invoices = read_csv(zf, "invoice.csv")
+        rentals = read_csv(zf, "rental.csv")
+
+    assert str(sample_data["invoice"]) in {invoice["id"] for invoice in invoices}
+    assert str(sample_data["rental"]) in {rental["id"] for rental in rentals}
+    # Generated columns are computed again on restore
+    assert all("rental_period" not in rental for rental in rentals)
+
+
+@pytest.mark.asyncio
+async def test_backup_memory_does_not_grow_with_rows(old_invoices, peak_memory):
+    # Enough rows for the server to send its largest chunks in both backups
+    await old_invoices(20000)
+    await peak_memory(read_backup())  # Warms up the caches
+    small_peak, small_size = await peak_memory(read_backup())
+
+    await old_invoices(40000)
+    large_peak, large_size = await peak_memory(read_backup())
+
+    # The archive grows with the rows, the memory used to write it does not
+    assert large_size - small_size > 40000 * 20
+    assert large_peak < 1.2 * small_peak
+
+
+@pytest.mark.asyncio
+async def test_restore_copies_the_backup_back(async_client, fake_admin_token, sample_data, old_invoices):
+    headers = {"Authorization": f"Bearer {fake_admin_token}"}
+    await old_invoices(100)
+    archive = (await async_client.get("/backup/", headers=headers)).content
+
+    # Rows added after the backup are gone once it is restored
+    await old_invoices(50)
+    response = await async_client.post(
+        "/restore/", headers=headers, files={"file": ("backup.zip", archive, "application/zip")},
+    )
+    assert response.status_code == 200
+
+    async with async_engine.connect() as connection:
+        old_count = await connection.scalar(
+            text("SELECT count(*) FROM invoice WHERE created_at < :before"), {"before": old_invoices.before}
+        )
+        rental_period = await connection.scalar(
+            text("SELECT rental_period FROM rental WHERE id = :id"), {"id": sample_data["rental"]}
+        )
+    assert old_count == 100
+    # Generated columns are computed again from the restored rows
+    assert rental_period is not None
+
+
+def with_invoice_columns(archive: bytes, *, drop: str, add: str) -> bytes:
+    """
+    Rewrites the invoices of an archive as if taken at a schema without the `drop` column and
+    with an `add` column, which the invoices no longer have.
+    """
+    rewritten = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(archive)) as source, zipfile.ZipFile(rewritten, "w") as target:
+        for name in source.namelist():
+            data = source.read(name)
+            if name == "invoice.csv":
+                rows = list(csv.DictReader(io.StringIO(data.decode())))
+                entry = io.StringIO()
+                fields = [field for field in rows[0] if field != drop] + [add]
+                writer = csv.DictWriter(entry, fieldnames=fields, extrasaction="ignore")
+                writer.writeheader()
+                writer.writerows({**row, add: "old value"} for row in rows)
+                data = entry.getvalue().encode()
+            target.writestr(name, data)
+    return rewritten.getvalue()
+
+
+@pytest.mark.asyncio
+async def test_restore_into_a_schema_that_changed_since(async_client, fake_admin_token, sample_data, old_invoices):
+    headers = {"Authorization": f"Bearer {fake_admin_token}"}
+    await old_invoices(100)
+    archive = (await async_client.get("/backup/", headers=headers)).content
+    with zipfile.ZipFile(io.BytesIO(archive)) as zf:
+        assert f"{ALEMBIC_VERSION_TABLE}.csv" not in zf.namelist()
+
+    async with async_engine.connect() as connection:
+        revision = await connection.scalar(text(f"SELECT version_num FROM {ALEMBIC_VERSION_TABLE}"))
+    archive = with_invoice_columns(archive, drop="updated_at", add="legacy_reference")
+    async with async_engine.connect() as connection:
+        await connection.execute(
+            text("UPDATE invoice SET updated_at = now() WHERE id = :id"), {"id": sample_data["invoice"]}
+        )
+        await connection.commit()
+
+    with zipfile.ZipFile(io.BytesIO(archive)) as zf:
+        restored = await restore_archive(async_engine, zf)
+
+    assert restored["invoice"] >= 101
+    async with async_engine.connect() as connection:
+        old_count = await connection.scalar(
+            text("SELECT count(*) FROM invoice WHERE created_at < :before"), {"before": old_invoices.before}
+        )
+        updated_at = await connection.scalar(
+            text("SELECT updated_at FROM invoice WHERE id = :id"), {"id": sample_data["invoice"]}
+        )
+        assert await connection.scalar(text(f"SELECT version_num FROM {ALEMBIC_VERSION_TABLE}")) == revision
+    assert old_count == 100
+    # The column missing from the backup gets its default
+    assert updated_at is None
+
+
+@pytest.mark.asyncio
+async def test_backup_closed_midway_ends_the_copy(old_invoices):
+    await old_invoices(20000)
+
+    chunks, size = backup_chunks(async_engine, {"backup_time_utc": "2000-01-01T00:00:00+00:00Z"}), 0
+    # Stops reading inside the invoices, as a client that disconnected would
+    async for chunk in chunks:
+        size += len(chunk)
+        if size > 100_000:
+            break
+    await asyncio.wait_for(chunks.aclose(), timeout=5)
+
+    assert async_engine.pool.checkedout() == 0
+    async with async_engine.connect() as connection:
+        copies = await connection.scalar(text(
+            "SELECT count(*) FROM pg_stat_activity WHERE query LIKE 'COPY%' AND pid <> pg_backend_pid()"
+        ))
+    assert copies == 0
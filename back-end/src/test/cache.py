@@ -0,0 +1,151 @@
+import asyncio
+import time
+from datetime import timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import dependencies
+from database import async_engine
+from models.relational_models import Rental
+from utilities.authentication import create_access_token
+from utilities.cache import RedisCache, read_reply
+
+
+@pytest_asyncio.fixture
+async def redis_url():
+    """
+    Serves the commands `RedisCache` sends from memory, over the Redis protocol, on a free local port.
+    """
+    values: dict[bytes, tuple[bytes, float]] = {}
+
+    async def reply(command: list[bytes]) -> bytes:
+        name = command[0].upper()
+        if name in (b"AUTH", b"SELECT"):
+            return b"+OK\r\n"
+        if name == b"GET":
+            value, expires_at = values.get(command[1], (None, 0))
+            if value is None or expires_at < time.time():
+                return b"$-1\r\n"
+            return b"$%d\r\n%s\r\n" % (len(value), value)
+        if name == b"SET" and command[3].upper() == b"PX":
+            values[command[1]] = (command[2], time.time() + int(command[4]) / 1000)
+            return b"+OK\r\n"
+        if name == b"INFO":
+            info = b"# Stats\r\nevicted_keys:0\r\n"
+            return b"$%d\r\n%s\r\n" % (len(info), info)
+        return b"-ERR unknown command\r\n"
+
+    async def serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                writer.write(await reply(await read_reply(reader)))
+                await writer.drain()
+        except asyncio.IncompleteReadError:
+            writer.close()
+
+    server = await asyncio.start_server(serve, "127.0.0.1", 0)
+    yield f"redis://127.0.0.1:{server.sockets[0].getsockname()[1]}/1"
+    server.close()
+
+
+@pytest.mark.asyncio
+async def test_cached_responses_skip_the_queries(async_client, fake_admin_token, sample_data, statements):
+    path = f"/rentals/{sample_data['rental']}"
+    headers = {"Authorization": f"Bearer {fake_admin_token}"}
+    first = await async_client.get(path, headers=headers)
+    assert first.status_code == 200
+
+    statements.clear()
+    second = await async_client.get(path, headers=headers)
+    assert second.status_code == 200
+    assert second.content == first.content
+    assert second.headers["Content-Type"] == first.headers["Content-Type"]
+    # Only the table versions are read
+    assert len(statements) == 1
+
+
+@pytest.mark.asyncio
+async def test_writes_make_cached_responses_stale(async_client, fake_admin_token, sample_data):
+    path = f"/rentals/{sample_data['rental']}"
+    headers = {"Authorization": f"Bearer {fake_admin_token}"}
+    assert (await async_client.get(path, headers=headers)).json()["total_amount"] == 1000000
+
+    # Written outside the API, as any write to the table bumps its version
+    async with AsyncSession(async_engine) as session:
+        await session.execute(update(Rental).where(Rental.id == sample_data["rental"]).values(total_amount=2000000))
+        await session.commit()
+
+    assert (await async_client.get(path, headers=headers)).json()["total_amount"] == 2000000
+
+
+@pytest.mark.asyncio
+async def test_cached_responses_are_kept_per_user(async_client, fake_admin_token, sample_data):
+    admin_rentals = await async_client.get("/rentals/", headers={"Authorization": f"Bearer {fake_admin_token}"})
+    assert admin_rentals.status_code == 200
+
+    # A customer is still only shown their own rentals, and anonymous requests still fail
+    customer_token = create_access_token(
+        data={"id": str(sample_data["customer"]), "role": "Customer"}, expires_delta=timedelta(minutes=5),
+    )
+    customer_rentals = await async_client.get("/rentals/", headers={"Authorization": f"Bearer {customer_token}"})
+    assert customer_rentals.status_code == 200
+    assert {rental["customer"]["id"] for rental in customer_rentals.json()} == {str(sample_data["customer"])}
+    assert (await async_client.get("/rentals/")).status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_redis_cache_expires_values(redis_url):
+    cache = RedisCache(redis_url, ttl=60)
+    assert await cache.get("key") is None
+    await cache.set("key", b"line\r\nvalue")
+    assert await cache.get("key") == b"line\r\nvalue"
+
+    await cache.set("short", b"value", ttl=0.01)
+    await asyncio.sleep(0.05)
+    assert await cache.get("short") is None
+
+    assert await cache.stats() == {"backend": "redis", "hits": 1, "misses": 2, "errors": 0, "evictions": 0}
+    await cache.close()
+
+
+@pytest.mark.asyncio
+async def test_redis_commands_wait_for_a_pooled_connection(redis_url, monkeypatch):
+    cache = RedisCache(redis_url, ttl=60, max_connections=3)
+    opened = []
+    connect = cache._connect
+
+    async def counted_connect():
+        opened.append(await connect())
+        return opened[-1]
+
+    monkeypatch.setattr(cache, "_connect", counted_connect)
+    await asyncio.gather(*(cache.get(f"key{index}") for index in range(50)))
+    assert len(opened) == 3
+    assert cache.misses == 50
+    await cache.close()
+
+
+@pytest.mark.asyncio
+async def test_responses_are_shared_through_redis(async_client, sample_data, redis_url, monkeypatch):
+    cache = RedisCache(redis_url, ttl=60)
+    monkeypatch.setattr(dependencies, "response_cache", cache)
+    path = f"/vehicles/{sample_data['vehicle']}"
+
+    first = await async_client.get(path)
+    second = await async_client.get(path)
+    assert second.content == first.content
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert (cache.hits, cache.misses) == (1, 1)
+    await cache.close()
+
+
+@pytest.mark.asyncio
+async def test_unreachable_redis_misses():
+    # Nothing listens on the discard port
+    cache = RedisCache("redis://127.0.0.1:9", ttl=60)
+    await cache.set("key", b"value")
+    assert await cache.get("key") is None
+    assert cache.errors == 2
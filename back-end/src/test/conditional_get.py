@@ -0,0 +1,58 @@
+import pytest
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import async_engine
+from models.relational_models import Customer, Rental
+from utilities.table_versions import etag_matches
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("path", ["/vehicles/", "/posts/", "/comments/"])
+async def test_unchanged_lists_are_not_modified(async_client, sample_data, path):
+    response = await async_client.get(path, params={"limit": 5})
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert etag.startswith('W/"') and "no-cache" in response.headers["Cache-Control"]
+
+    response = await async_client.get(path, params={"limit": 5}, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+    # Another page is another resource
+    response = await async_client.get(path, params={"limit": 6}, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+
+@pytest.mark.asyncio
+async def test_writes_to_embedded_tables_change_the_etag(async_client, sample_data):
+    path = f"/vehicles/{sample_data['vehicle']}"
+    etag = (await async_client.get(path)).headers["ETag"]
+
+    # The vehicle embeds its latest rentals, so a rental update is a change of the vehicle
+    async with AsyncSession(async_engine) as session:
+        await session.execute(update(Rental).where(Rental.id == sample_data["rental"]).values(total_amount=2000))
+        await session.commit()
+
+    response = await async_client.get(path, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    etag = response.headers["ETag"]
+
+    # Customers are not part of a vehicle response
+    async with AsyncSession(async_engine) as session:
+        await session.execute(update(Customer).where(Customer.id == sample_data["customer"]).values(address="moved"))
+        await session.commit()
+
+    assert (await async_client.get(path, headers={"If-None-Match": etag})).status_code == 304
+
+
+def test_if_none_match_uses_weak_comparison():
+    assert etag_matches('W/"abc"', 'W/"abc"')
+    assert etag_matches('"abc"', 'W/"abc"')
+    assert etag_matches('W/"xyz", W/"abc"', 'W/"abc"')
+    assert etag_matches("*", 'W/"abc"')
+    assert not etag_matches('W/"abcd"', 'W/"abc"')
+    assert not etag_matches(None, 'W/"abc"')
@@ -1,11 +1,32 @@
+import random
+import tracemalloc
 import uuid
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone
+
+from jdatetime import date as jdate
 
 from httpx import AsyncClient, ASGITransport
+import pytest
 import pytest_asyncio
+from sqlalchemy import delete, event, text
+from sqlmodel.ext.asyncio.session import AsyncSession
+
 from config import app
+from database import async_engine
+from models.relational_models import Admin, Comment, Customer, Invoice, Payment, Post, Rental, Vehicle, \
+    VehicleInsurance
 from utilities.authentication import create_access_token
+from utilities.enumerables import AdminRole, AdminStatus, Brand, BranchLocations, CarStatus, CommentStatus, \
+    CommentSubject, Gender, InsuranceType, InvoiceStatus, PaymentMethod, PaymentStatus
+
 
+@pytest_asyncio.fixture(autouse=True)
+async def dispose_engine():
+    """
+    Drops pooled connections after each test, since they belong to that test's event loop.
+    """
+    yield
+    await async_engine.dispose()
 
 @pytest_asyncio.fixture
 async def async_client():
@@ -17,3 +38,124 @@ async def fake_admin_token():
     admin_id = str(uuid.uuid4())
     token = create_access_token(data={"id": admin_id, "role": "SuperAdmin"}, expires_delta=timedelta(minutes=60))
     return token
+
+@pytest.fixture
+def statements():
+    """
+    Collects the SQL statements sent to the database while the test runs.
+    """
+    executed = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    yield executed
+    event.remove(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+
+@pytest_asyncio.fixture
+async def old_invoices():
+    """
+    Inserts generated invoices dated in the year 1999, returning a function that adds more;
+    the function's `before` is a time all of them were created before.
+    """
+    async def seed(rows: int) -> None:
+        async with async_engine.begin() as connection:
+            await connection.execute(text(
+                "INSERT INTO invoice (id, total_amount, tax, discount, final_amount, status, created_at) "
+                "SELECT gen_random_uuid(), 1000, 0, 0, 1000, 'CREATED', "
+                "timestamptz '1999-01-01' + n * interval '1 second' "
+                "FROM generate_series(1, :rows) AS n"
+            ), {"rows": rows})
+
+    seed.before = datetime(2000, 1, 1, tzinfo=timezone.utc)
+    yield seed
+
+    async with async_engine.begin() as connection:
+        await connection.execute(delete(Invoice).where(Invoice.created_at < seed.before))
+
+
+@pytest.fixture
+def peak_memory():
+    """
+    Returns a function that awaits a coroutine, returning the peak of the memory allocated
+    meanwhile and the coroutine's result.
+    """
+    async def measure(coroutine):
+        tracemalloc.start()
+        try:
+            result = await coroutine
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return peak, result
+
+    return measure
+
+
+@pytest_asyncio.fixture
+async def sample_data():
+    """
+    Inserts one row of every relational model, linked to each other, and removes them afterwards.
+    """
+    suffix = "".join(random.choices("abcdefghijklmnopqrstuvwxyz", k=8))
+    digits = "".join(random.choices("0123456789", k=10))
+    # Response models validate dates relative to today
+    today = jdate.today()
+    tomorrow, next_year, last_year = today + timedelta(days=1), today + timedelta(days=365), today - timedelta(days=365)
+
+    admin = Admin(
+        first_name="test", last_name="admin", username=f"admin{suffix}", email=f"admin{suffix}@example.com",
+        role=AdminRole.SUPER_ADMIN, status=AdminStatus.ACTIVE, national_id=digits, gender=Gender.MALE,
+        birthday="1370/01/01", phone=9000000000 + random.randint(0, 999999999), address="test", password="x",
+    )
+    customer = Customer(
+        first_name="test", last_name="customer", gender=Gender.FEMALE, birthday="1370/01/01",
+        national_id=digits, phone=9000000000 + random.randint(0, 999999999), username=f"customer{suffix}",
+        email=f"customer{suffix}@example.com", address="test", password="x",
+    )
+    vehicle = Vehicle(
+        plate_number=f"{digits[:2]}ب{digits[2:5]}-{digits[5:7]}", location=BranchLocations.TEHRAN,
+        local_image_address="/images/test.png", brand=Brand.TOYOTA, model="Corolla", year=1400, color="white",
+        mileage=0, status=CarStatus.AVAILABLE, hourly_rental_rate=100000, security_deposit=1000000,
+    )
+    invoice = Invoice(total_amount=1000000, tax=0, discount=0, final_amount=1000000, status=InvoiceStatus.COMPLETED)
+    rows = {
+        "admin": admin,
+        "customer": customer,
+        "vehicle": vehicle,
+        "invoice": invoice,
+        "post": Post(subject="test", content="test", admin_id=admin.id),
+        "comment": Comment(
+            subject=CommentSubject.FEEDBACK, content="test", status=CommentStatus.APPROVED, customer_id=customer.id,
+        ),
+        "vehicle_insurance": VehicleInsurance(
+            insurance_company="test", insurance_type=InsuranceType.ThirdParty, policy_number=f"{digits}/1/1",
+            start_date=last_year.strftime("%Y/%m/%d"), expiration_date=next_year.strftime("%Y/%m/%d"), premium=1000, vehicle_id=vehicle.id,
+        ),
+        "payment": Payment(
+            payment_datetime=f"{last_year.strftime('%Y/%m/%d')} 10:00:00", payment_method=PaymentMethod.ONLINE_PAYMENT, transaction_id=suffix,
+            amount=1000000, payment_status=PaymentStatus.COMPLETED, invoice_id=invoice.id,
+        ),
+        "rental": Rental(
+            rental_start_date=tomorrow.strftime("%Y/%m/%d"),
+            rental_end_date=(tomorrow + timedelta(days=1)).strftime("%Y/%m/%d"), total_amount=1000000,
+            customer_id=customer.id, vehicle_id=vehicle.id, invoice_id=invoice.id,
+        ),
+    }
+    ids = {name: row.id for name, row in rows.items()}
+
+    async with AsyncSession(async_engine) as session:
+        session.add_all([admin, customer, vehicle, invoice])
+        await session.flush()
+        session.add_all(row for name, row in rows.items() if name not in ("admin", "customer", "vehicle", "invoice"))
+        await session.commit()
+
+    yield ids
+
+    # Every other row is removed by the ON DELETE CASCADE foreign keys
+    async with AsyncSession(async_engine) as session:
+        for model in (Admin, Customer, Vehicle, Invoice):
+            await session.execute(delete(model).where(model.id == ids[model.__tablename__]))
+        await session.commit()
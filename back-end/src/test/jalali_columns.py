@@ -0,0 +1,77 @@
+from zoneinfo import ZoneInfo
+
+import psycopg2
+import pytest
+from jdatetime import datetime as jalali_datetime
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import POSTGRESQL_URL, async_engine
+from models.relational_models import Payment, Rental, VehicleInsurance
+from utilities.enumerables import PaymentMethod, PaymentStatus
+from utilities.fields_validator import jalali_to_date, jalali_to_datetime
+from utilities.jalali_columns import backfill_jalali_columns
+
+
+async def typed_values(sample_data) -> tuple:
+    async with AsyncSession(async_engine) as session:
+        rental = await session.get(Rental, sample_data["rental"])
+        payment = await session.get(Payment, sample_data["payment"])
+        insurance = await session.get(VehicleInsurance, sample_data["vehicle_insurance"])
+        return (
+            (rental.rental_start_on, jalali_to_date(rental.rental_start_date)),
+            (rental.rental_end_on, jalali_to_date(rental.rental_end_date)),
+            (payment.payment_at, jalali_to_datetime(payment.payment_datetime)),
+            (insurance.start_on, jalali_to_date(insurance.start_date)),
+            (insurance.expiration_on, jalali_to_date(insurance.expiration_date)),
+        )
+
+
+@pytest.mark.asyncio
+async def test_typed_columns_follow_the_jalali_strings(sample_data):
+    for typed, expected in await typed_values(sample_data):
+        assert typed == expected
+
+    async with AsyncSession(async_engine) as session:
+        rental = await session.get(Rental, sample_data["rental"])
+        rental.rental_end_date = "1404/12/29"
+        await session.commit()
+        await session.refresh(rental)
+        assert rental.rental_end_on == jalali_to_date("1404/12/29")
+
+
+@pytest.mark.asyncio
+async def test_backfill_fills_typed_columns_written_around_the_models(sample_data):
+    async with AsyncSession(async_engine) as session:
+        await session.execute(
+            update(Rental).where(Rental.id == sample_data["rental"]).values(rental_start_on=None, rental_end_on=None)
+        )
+        await session.execute(update(Payment).where(Payment.id == sample_data["payment"]).values(payment_at=None))
+        await session.commit()
+
+    connection = psycopg2.connect("postgres" + POSTGRESQL_URL[18:])
+    try:
+        with connection, connection.cursor() as cursor:
+            assert backfill_jalali_columns(cursor) >= 2
+    finally:
+        connection.close()
+
+    for typed, expected in await typed_values(sample_data):
+        assert typed == expected
+
+
+@pytest.mark.asyncio
+async def test_today_purchases_are_counted_on_the_typed_column(async_client, fake_admin_token, sample_data):
+    headers = {"Authorization": f"Bearer {fake_admin_token}"}
+    before = (await async_client.get("/stats/", headers=headers)).json()["today_purchase_count"]
+
+    async with AsyncSession(async_engine) as session:
+        session.add(Payment(
+            payment_datetime=jalali_datetime.now(ZoneInfo("Asia/Tehran")).strftime("%Y/%m/%d %H:%M:%S"),
+            payment_method=PaymentMethod.ONLINE_PAYMENT, amount=1000, payment_status=PaymentStatus.COMPLETED,
+            invoice_id=sample_data["invoice"],
+        ))
+        await session.commit()
+
+    after = (await async_client.get("/stats/", headers=headers)).json()["today_purchase_count"]
+    assert after == before + 1
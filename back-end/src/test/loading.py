@@ -0,0 +1,97 @@
+import pytest
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import utilities.nested_collections
+from database import async_engine
+from models.relational_models import Rental
+
+# Statements per request: the table versions tagging the cached response, the entity query and one query per
+# embedded collection
+ENDPOINTS = [
+    ("vehicles", "vehicle", 4),
+    ("vehicle_insurances", "vehicle_insurance", 2),
+    ("customers", "customer", 4),
+    ("invoices", "invoice", 4),
+    ("rentals", "rental", 2),
+    ("payments", "payment", 2),
+    ("comments", "comment", 2),
+    ("admins", "admin", 3),
+    ("posts", "post", 2),
+]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("path, name, expected", ENDPOINTS)
+async def test_get_by_id_statement_count(async_client, fake_admin_token, sample_data, statements, path, name,
+                                         expected):
+    statements.clear()
+    response = await async_client.get(f"/{path}/{sample_data[name]}",
+                                      headers={"Authorization": f"Bearer {fake_admin_token}"})
+
+    assert response.status_code == 200
+    assert len(statements) == expected
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("path, name, expected", ENDPOINTS)
+async def test_list_statement_count(async_client, fake_admin_token, sample_data, statements, path, name, expected):
+    statements.clear()
+    response = await async_client.get(f"/{path}/", headers={"Authorization": f"Bearer {fake_admin_token}"})
+
+    assert response.status_code == 200
+    assert str(sample_data[name]) in {item["id"] for item in response.json()}
+    assert len(statements) == expected
+
+
+@pytest.mark.asyncio
+async def test_patch_returns_relationships(async_client, fake_admin_token, sample_data, statements):
+    statements.clear()
+    response = await async_client.patch(f"/rentals/{sample_data['rental']}", json={"total_amount": 2000000},
+                                        headers={"Authorization": f"Bearer {fake_admin_token}"})
+
+    assert response.status_code == 200
+    assert response.json()["vehicle"]["id"] == str(sample_data["vehicle"])
+    # Load, update, then a single joined query for the response
+    assert len(statements) == 3
+
+
+@pytest.mark.asyncio
+async def test_delete_does_not_load_children(async_client, fake_admin_token, sample_data, statements):
+    statements.clear()
+    response = await async_client.delete(f"/vehicles/{sample_data['vehicle']}",
+                                         headers={"Authorization": f"Bearer {fake_admin_token}"})
+
+    assert response.status_code == 200
+    assert len(statements) == 2
+
+
+@pytest.mark.asyncio
+async def test_nested_collections_are_capped(async_client, fake_admin_token, sample_data, monkeypatch):
+    async with AsyncSession(async_engine) as session:
+        for _ in range(3):
+            rental = await session.get(Rental, sample_data["rental"])
+            session.add(Rental(
+                rental_start_date=rental.rental_start_date, rental_end_date=rental.rental_end_date,
+                total_amount=rental.total_amount, customer_id=rental.customer_id,
+                vehicle_id=rental.vehicle_id, invoice_id=rental.invoice_id,
+            ))
+            # Separate transactions, so every rental gets its own created_at
+            await session.commit()
+
+    monkeypatch.setattr(utilities.nested_collections, "NESTED_COLLECTION_LIMIT", 2)
+    headers = {"Authorization": f"Bearer {fake_admin_token}"}
+
+    vehicle = (await async_client.get(f"/vehicles/{sample_data['vehicle']}", headers=headers)).json()
+    assert len(vehicle["rentals"]) == 2
+    assert vehicle["rentals_total"] == 4
+    assert vehicle["rentals"][0]["created_at"] > vehicle["rentals"][1]["created_at"]
+    assert str(sample_data["rental"]) not in {rental["id"] for rental in vehicle["rentals"]}
+
+    response = await async_client.get(vehicle["rentals_url"], headers=headers)
+    assert len(response.json()) == 4
+
+    customer = (await async_client.get(f"/customers/{sample_data['customer']}", headers=headers)).json()
+    assert (len(customer["rentals"]), customer["rentals_total"]) == (2, 4)
+    assert (len(customer["comments"]), customer["comments_total"]) == (1, 1)
+    response = await async_client.get(customer["comments_url"], headers=headers)
+    assert [comment["id"] for comment in response.json()] == [str(sample_data["comment"])]
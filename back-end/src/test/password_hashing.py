@@ -0,0 +1,12 @@
+import pytest
+
+from utilities.password_hashing import get_password_hash_async, verify_password_async
+
+
+@pytest.mark.asyncio
+async def test_password_hash_round_trip():
+
+    hashed_password = await get_password_hash_async("Correct-Horse-Battery-1")
+
+    assert await verify_password_async("Correct-Horse-Battery-1", hashed_password)
+    assert not await verify_password_async("Wrong-Horse-Battery-1", hashed_password)
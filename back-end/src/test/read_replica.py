@@ -0,0 +1,97 @@
+import random
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import event
+
+import dependencies
+from database import POSTGRESQL_URL, async_engine, create_engine
+
+
+@pytest_asyncio.fixture
+async def replica(monkeypatch):
+    """
+    Routes reads to a second engine on the same database, standing in for a replica,
+    and counts the statements each engine executes.
+    """
+    replica_engine = create_engine(POSTGRESQL_URL)
+    monkeypatch.setattr(dependencies, "async_read_engine", replica_engine)
+    dependencies.recent_writers.clear()
+
+    executed = {"primary": 0, "replica": 0}
+
+    def counter(name):
+        def before_cursor_execute(*_):
+            executed[name] += 1
+        return before_cursor_execute
+
+    primary_listener, replica_listener = counter("primary"), counter("replica")
+    event.listen(async_engine.sync_engine, "before_cursor_execute", primary_listener)
+    event.listen(replica_engine.sync_engine, "before_cursor_execute", replica_listener)
+    yield executed
+    event.remove(async_engine.sync_engine, "before_cursor_execute", primary_listener)
+    event.remove(replica_engine.sync_engine, "before_cursor_execute", replica_listener)
+    await replica_engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_reads_go_to_replica_except_after_a_write(async_client, fake_admin_token, replica):
+    headers = {"Authorization": f"Bearer {fake_admin_token}"}
+
+    response = await async_client.get("/vehicles/", headers=headers)
+    assert response.status_code == 200
+    assert replica["primary"] == 0 and replica["replica"] > 0
+
+    response = await async_client.post("/vehicles/", headers=headers, json={
+        "plate_number": f"{random.randint(10, 99)}ب{random.randint(100, 999)}-{random.randint(10, 99)}",
+        "location": "تهران",
+        "local_image_address": "/images/test.png",
+        "brand": "تویوتا",
+        "model": "Corolla",
+        "year": 1400,
+        "color": "سفید",
+        "mileage": 0,
+        "status": "موجود",
+        "hourly_rental_rate": 100000,
+        "security_deposit": 1000000,
+    })
+    assert response.status_code == 200
+    assert dependencies.LAST_WRITE_COOKIE in response.cookies
+    vehicle_id = response.json()["id"]
+
+    try:
+        # The writer reads its own vehicle from the primary
+        replica.update(primary=0, replica=0)
+        response = await async_client.get(f"/vehicles/{vehicle_id}", headers=headers)
+        assert response.status_code == 200
+        assert replica["replica"] == 0 and replica["primary"] > 0
+
+        # The cookie alone is enough, e.g. when another worker served the write
+        dependencies.recent_writers.clear()
+        replica.update(primary=0, replica=0)
+        await async_client.get(f"/vehicles/{vehicle_id}", headers=headers)
+        assert replica["replica"] == 0
+
+        # Once neither is present, reads go back to the replica
+        async_client.cookies.clear()
+        replica.update(primary=0, replica=0)
+        await async_client.get(f"/vehicles/{vehicle_id}", headers=headers)
+        assert replica["primary"] == 0 and replica["replica"] > 0
+    finally:
+        response = await async_client.delete(f"/vehicles/{vehicle_id}", headers=headers)
+        assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_failed_writes_do_not_pin_reads_to_primary(async_client, fake_admin_token, replica):
+    headers = {"Authorization": f"Bearer {fake_admin_token}"}
+
+    response = await async_client.delete(
+        "/vehicles/00000000-0000-0000-0000-000000000000", headers=headers
+    )
+    assert response.status_code == 404
+    assert dependencies.LAST_WRITE_COOKIE not in response.cookies
+
+    replica.update(primary=0, replica=0)
+    await async_client.get("/vehicles/", headers=headers)
+    assert replica["primary"] == 0 and replica["replica"] > 0
@@ -0,0 +1,221 @@
+import uuid
+from datetime import date, datetime, timezone
+from enum import Enum
+from typing import Annotated, get_args, get_origin
+
+import pytest
+from sqlalchemy import Date, DateTime, Integer, event, func, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import async_engine
+from models.relational_models import Admin, Customer, Vehicle
+from routers.admin import ADMIN_SEARCH
+from routers.comment import COMMENT_SEARCH
+from routers.customer import CUSTOMER_SEARCH
+from routers.invoice import INVOICE_SEARCH
+from routers.payment import PAYMENT_SEARCH
+from routers.post import POST_SEARCH
+from routers.rental import RENTAL_SEARCH
+from routers.vehicle import VEHICLE_SEARCH
+from routers.vehicle_insurance import VEHICLE_INSURANCE_SEARCH
+from utilities.enumerables import BranchLocations
+from utilities.facets import facet_cache
+from utilities.lookup import LOOKUP_EXPRESSIONS, fuzzy_lookup
+from utilities.pagination import encode_cursor, paginate
+from utilities.search import Contains, Exact, Range
+
+SPECS = (
+    ADMIN_SEARCH, COMMENT_SEARCH, CUSTOMER_SEARCH, INVOICE_SEARCH, PAYMENT_SEARCH, POST_SEARCH, RENTAL_SEARCH,
+    VEHICLE_SEARCH, VEHICLE_INSURANCE_SEARCH,
+)
+
+
+def sample(value_type):
+    if get_origin(value_type) is Annotated:
+        # Jalali query parameters are validated into the type of their typed column
+        value_type = get_args(value_type)[0]
+    if value_type is datetime:
+        return datetime(2000, 1, 1, tzinfo=timezone.utc)
+    if value_type is date:
+        return date(2000, 1, 1)
+    if isinstance(value_type, type) and issubclass(value_type, Enum):
+        return next(iter(value_type))
+    if value_type is int:
+        return 1
+    if value_type is uuid.UUID:
+        return uuid.uuid4()
+    return "test@example.com"
+
+
+def search_values(field):
+    values = {parameter.name: None for spec in SPECS for f in spec.fields for parameter in f.parameters()}
+    if isinstance(field, Exact):
+        values[field.key] = [sample(field.type), sample(field.type)]
+    elif isinstance(field, Range):
+        values[f"{field.key}_min"] = values[f"{field.key}_max"] = sample(field.type)
+    else:
+        values[field.key] = "test"
+    return values
+
+
+async def explain(query, *disabled: str) -> str:
+    """
+    Returns the plan of a query, with sequential scans (and any other given plan node) priced out,
+    so that any index that can serve it is used whatever the table statistics are.
+    """
+    def add_explain(conn, cursor, statement, parameters, context, executemany):
+        return f"EXPLAIN {statement}", parameters
+
+    async with async_engine.connect() as connection:
+        for setting in ("enable_seqscan", *disabled):
+            await connection.execute(text(f"SET {setting} = off"))
+        event.listen(connection.sync_connection, "before_cursor_execute", add_explain, retval=True)
+        plan = "\n".join(row[0] for row in await connection.execute(query))
+        event.remove(connection.sync_connection, "before_cursor_execute", add_explain)
+    return plan
+
+
+async def has_trigram_extension() -> bool:
+    async with async_engine.connect() as connection:
+        return await connection.scalar(text("SELECT EXISTS (SELECT FROM pg_extension WHERE extname = 'pg_trgm')"))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("spec, field", [
+    pytest.param(spec, field, id=f"{spec.model.__tablename__}.{field.key}:{type(field).__name__}")
+    for spec in SPECS for field in spec.fields
+])
+async def test_search_fields_use_an_index(spec, field):
+    if isinstance(field, Contains) and not await has_trigram_extension():
+        pytest.skip("substring search is indexed with pg_trgm, which is not installed")
+
+    plan = await explain(select(spec.model).where(field.condition(search_values(field))))
+    assert "Seq Scan" not in plan and "Index Cond" in plan, plan
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("spec, sort_key", [
+    pytest.param(spec, key, id=f"{spec.model.__tablename__}.{key}")
+    for spec in SPECS for key in spec.sort_keys
+])
+async def test_search_sort_keys_use_an_index(spec, sort_key):
+    column = spec.sort_keys[sort_key]
+    if sort_key == "created_at":
+        value = "2000-01-01T00:00:00+00:00"
+    elif isinstance(column.type, (Date, DateTime)):
+        value = sample(column.type.python_type).isoformat()
+    else:
+        value = sample(int if isinstance(column.type, Integer) else str)
+    query = paginate(
+        select(spec.model), spec.model, cursor=encode_cursor(value, uuid.uuid4()), offset=0, limit=10,
+        sort_column=column,
+    )
+
+    plan = await explain(query, "enable_sort")
+    assert "Seq Scan" not in plan and "Sort" not in plan and "Index Cond" in plan, plan
+
+
+@pytest.mark.asyncio
+async def test_search_ranges_lists_and_negation(async_client, fake_admin_token, sample_data):
+    headers = {"Authorization": f"Bearer {fake_admin_token}"}
+    rental = (await async_client.get(f"/rentals/{sample_data['rental']}", headers=headers)).json()
+
+    response = await async_client.get("/rentals/search/", headers=headers, params={
+        "operator": "and",
+        "customer_id": [str(sample_data["customer"]), str(uuid.uuid4())],
+        "rental_start_date_min": rental["rental_start_date"],
+        "rental_start_date_max": rental["rental_start_date"],
+        "sort": "rental_start_date",
+    })
+    assert response.status_code == 200
+    assert [row["id"] for row in response.json()] == [str(sample_data["rental"])]
+
+    # NOT excludes the rows matching any of the conditions
+    response = await async_client.get("/rentals/search/", headers=headers, params={
+        "operator": "not",
+        "customer_id": str(sample_data["customer"]),
+        "total_amount_max": 0,
+    })
+    assert response.status_code in (200, 404)
+    if response.status_code == 200:
+        assert str(sample_data["rental"]) not in {row["id"] for row in response.json()}
+
+    response = await async_client.get("/rentals/search/", headers=headers, params={
+        "operator": "and", "total_amount": 1, "sort": "total_amount",
+    })
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_vehicle_search_facets_count_every_page(async_client, sample_data):
+    async with AsyncSession(async_engine) as session:
+        vehicle = await session.get(Vehicle, sample_data["vehicle"])
+        total = await session.scalar(select(func.count()).where(Vehicle.brand == vehicle.brand))
+
+    facet_cache.clear()
+    params = {"operator": "and", "brand": vehicle.brand.value, "limit": 1, "facets": True}
+    response = await async_client.get("/vehicles/search/", params=params)
+    assert response.status_code == 200
+    body = response.json()
+    assert len(body["vehicles"]) == 1
+    facets = body["facets"]
+    assert facets["brand"] == {vehicle.brand.value: total}
+    for name in ("status", "location"):
+        assert sum(facets[name].values()) == total
+    assert facets["location"][vehicle.location.value] >= 1
+    assert sum(bucket["count"] for bucket in facets["hourly_rental_rate"]) == total
+    assert any(
+        bucket["minimum"] <= vehicle.hourly_rental_rate <= (bucket["maximum"] or vehicle.hourly_rental_rate)
+        for bucket in facets["hourly_rental_rate"]
+    )
+
+    # Other sort orders and pages of the same search reuse the counts
+    hits = facet_cache.hits
+    response = await async_client.get("/vehicles/search/", params={**params, "sort": "year", "limit": 2})
+    assert response.json()["facets"] == facets
+    assert facet_cache.hits == hits + 1
+
+    # A write to the vehicles is counted by the next request
+    async with AsyncSession(async_engine) as session:
+        await session.execute(
+            update(Vehicle).where(Vehicle.id == vehicle.id).values(location=next(
+                location for location in BranchLocations if location != vehicle.location
+            ))
+        )
+        await session.commit()
+    response = await async_client.get("/vehicles/search/", params=params)
+    assert response.json()["facets"]["location"] != facets["location"]
+
+    response = await async_client.get("/vehicles/search/", params={**params, "facets": False})
+    assert isinstance(response.json(), list)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("model", [Admin, Customer])
+async def test_lookups_use_the_trigram_indexes(model):
+    if not await has_trigram_extension():
+        pytest.skip("lookups are indexed with pg_trgm, which is not installed")
+
+    plan = await explain(fuzzy_lookup(model, "test", limit=10))
+    assert "Seq Scan" not in plan and plan.count("Bitmap Index Scan") == len(LOOKUP_EXPRESSIONS), plan
+
+
+@pytest.mark.asyncio
+async def test_customer_lookup_matches_partial_values(async_client, fake_admin_token, sample_data):
+    headers = {"Authorization": f"Bearer {fake_admin_token}"}
+    # Surrounding spaces do not count towards the minimum length
+    for q in ("ab", "  ab  "):
+        response = await async_client.get("/customers/lookup/", params={"q": q}, headers=headers)
+        assert response.status_code == 422
+
+    # Without pg_trgm, the lookup falls back to matching substrings
+    async with AsyncSession(async_engine) as session:
+        customer = await session.get(Customer, sample_data["customer"])
+    # The random end of the username, and the last digits of the phone number
+    for q in (customer.username[-8:], str(customer.phone)[-7:]):
+        response = await async_client.get("/customers/lookup/", params={"q": q}, headers=headers)
+        assert response.status_code == 200
+        matches = response.json()
+        assert matches[0]["id"] == str(customer.id)
+        similarities = [match["similarity"] for match in matches]
+        assert similarities == sorted(similarities, reverse=True) and 0 < similarities[0] <= 1
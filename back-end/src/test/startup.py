@@ -0,0 +1,33 @@
+import logging
+
+import pytest
+
+import database
+
+
+@pytest.mark.asyncio
+async def test_current_schema_is_checked_with_one_query(monkeypatch, statements):
+    current = await database.get_current_revisions()
+    monkeypatch.setattr(database, "get_head_revisions", lambda: current)
+    statements.clear()
+
+    await database.check_schema()
+
+    assert len(statements) == 1
+    assert "alembic_version" in statements[0]
+
+
+@pytest.mark.asyncio
+async def test_outdated_schema_logs_a_warning_without_ddl(monkeypatch, statements, caplog):
+    monkeypatch.setattr(database, "get_head_revisions", lambda: {"ffffffffffff"})
+    monkeypatch.setattr(database, "CREATE_TABLES", False)
+
+    with caplog.at_level(logging.WARNING, logger=database.__name__):
+        await database.check_schema()
+
+    assert len(statements) == 1
+    assert "alembic upgrade head" in caplog.text
+
+
+def test_head_revisions_are_read_from_the_migration_scripts():
+    assert database.get_head_revisions()
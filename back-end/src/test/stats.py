@@ -0,0 +1,289 @@
+import asyncio
+import contextlib
+import uuid
+from datetime import date, timedelta
+from zoneinfo import ZoneInfo
+
+import pytest
+from jdatetime import date as jalali_date, datetime as jalali_datetime
+from sqlalchemy import delete, func, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import async_engine
+from models.relational_models import Invoice, Payment, Rental, Vehicle
+from utilities.analytics import bucket_bounds, refresh_sales_rollup
+from utilities.authentication import create_access_token
+from utilities.counters import (
+    COUNTED_TABLES, COUNTER_RECONCILE_LOCK, DAILY_PURCHASE_COUNT_TABLE, ROW_COUNT_TABLE, reconcile_counters,
+    reconcile_counters_periodically,
+)
+from utilities.enumerables import (
+    AdminRole, AnalyticsDimension, AnalyticsInterval, Brand, BranchLocations, CarStatus, PaymentMethod, PaymentStatus,
+)
+from utilities.pagination import NEXT_CURSOR_HEADER
+
+
+@pytest.mark.asyncio
+async def test_database_stats_endpoint(async_client, fake_admin_token):
+
+    headers = {"Authorization": f"Bearer {fake_admin_token}"}
+    await async_client.get("/admins/", headers=headers)
+    response = await async_client.get("/stats/database/", headers=headers)
+
+    assert response.status_code == 200
+    pool = response.json()["pool"]
+    assert pool["checkouts"] >= 1
+    assert pool["checkout_time_ms_histogram"]["+Inf"] == pool["checkouts"]
+
+
+async def table_counts(tables):
+    async with async_engine.connect() as connection:
+        return {
+            f"{table}_count": (await connection.execute(text(f"SELECT count(*) FROM {table}"))).scalar_one()
+            for table in tables
+        }
+
+
+@pytest.mark.asyncio
+async def test_stats_are_the_row_counts(async_client, fake_admin_token, sample_data):
+    response = await async_client.get("/stats/", headers={"Authorization": f"Bearer {fake_admin_token}"})
+
+    assert response.status_code == 200
+    stats = response.json()
+    assert stats.pop("today_purchase_count") >= 0
+    assert stats == await table_counts(["vehicle", "comment", "post", "invoice", "customer", "admin"])
+
+    general_admin_token = create_access_token(
+        data={"id": str(uuid.uuid4()), "role": AdminRole.GENERAL_ADMIN.value}, expires_delta=timedelta(minutes=5),
+    )
+    response = await async_client.get("/stats/", headers={"Authorization": f"Bearer {general_admin_token}"})
+    assert list(response.json()) == [
+        "vehicle_count", "comment_count", "invoice_count", "customer_count", "today_purchase_count",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_payments_moved_or_deleted_are_recounted(async_client, fake_admin_token, sample_data):
+    headers = {"Authorization": f"Bearer {fake_admin_token}"}
+    before = (await async_client.get("/stats/", headers=headers)).json()
+
+    # The sample payment was made a year ago
+    async with AsyncSession(async_engine) as session:
+        await session.execute(
+            update(Payment).where(Payment.id == sample_data["payment"]).values(payment_at=func.now())
+        )
+        await session.commit()
+    assert (await async_client.get("/stats/", headers=headers)).json()["today_purchase_count"] == (
+        before["today_purchase_count"] + 1
+    )
+
+    # Deleting the invoice deletes its payments
+    async with AsyncSession(async_engine) as session:
+        await session.execute(delete(Invoice).where(Invoice.id == sample_data["invoice"]))
+        await session.commit()
+    after = (await async_client.get("/stats/", headers=headers)).json()
+    assert after["today_purchase_count"] == before["today_purchase_count"]
+    assert after["invoice_count"] == before["invoice_count"] - 1
+
+
+@pytest.mark.asyncio
+async def test_reconciliation_corrects_drift(sample_data):
+    async with async_engine.begin() as connection:
+        await connection.execute(text(
+            f"UPDATE {ROW_COUNT_TABLE} SET row_count = row_count + 5 WHERE table_name = 'post'"
+        ))
+        await connection.execute(text(
+            f"INSERT INTO {DAILY_PURCHASE_COUNT_TABLE} (day, purchase_count) VALUES ('1900-01-01', 3)"
+        ))
+
+    async with async_engine.connect() as connection:
+        drift = await reconcile_counters(connection)
+
+    assert drift["post"] == -5
+    assert drift["purchases"] == 1
+    assert {name: value for name, value in drift.items() if name not in ("post", "purchases")} == dict.fromkeys(
+        ["admin", "comment", "customer", "invoice", "payment", "vehicle"], 0
+    )
+    async with async_engine.connect() as connection:
+        assert await reconcile_counters(connection) == dict.fromkeys([*COUNTED_TABLES, "purchases"], 0)
+
+
+async def post_count_drift() -> int:
+    async with async_engine.connect() as connection:
+        return await connection.scalar(text(
+            f"SELECT row_count - (SELECT count(*) FROM post) FROM {ROW_COUNT_TABLE} WHERE table_name = 'post'"
+        ))
+
+
+async def reconcile_for(seconds: float) -> None:
+    task = asyncio.create_task(reconcile_counters_periodically(async_engine, interval=0.05))
+    await asyncio.sleep(seconds)
+    task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await task
+
+
+@pytest.mark.asyncio
+async def test_reconciliation_runs_on_the_worker_holding_the_lock(sample_data):
+    async with async_engine.begin() as connection:
+        await connection.execute(text(
+            f"UPDATE {ROW_COUNT_TABLE} SET row_count = row_count + 5 WHERE table_name = 'post'"
+        ))
+
+    # Another worker leads the reconciliation
+    async with async_engine.connect() as leader:
+        await leader.execute(text("SELECT pg_advisory_lock(:key)"), {"key": COUNTER_RECONCILE_LOCK})
+        try:
+            await reconcile_for(0.3)
+            assert await post_count_drift() == 5
+        finally:
+            await leader.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": COUNTER_RECONCILE_LOCK})
+
+    # It stopped, so this worker takes over
+    await reconcile_for(0.3)
+    assert await post_count_drift() == 0
+
+
+def sales_of_day(buckets, day):
+    """
+    Sums the buckets holding a Jalali day, one per branch and brand.
+    """
+    holding = [bucket for bucket in buckets if bucket["start"] <= day <= bucket["end"]]
+    return {key: sum(bucket[key] for bucket in holding) for key in ("revenue", "payment_count", "rental_count")}
+
+
+async def refresh_sales():
+    """
+    Refreshes the rollup as the workers do in the background.
+    """
+    async with async_engine.begin() as connection:
+        await connection.run_sync(refresh_sales_rollup)
+
+
+@pytest.mark.asyncio
+async def test_analytics_sums_payments_and_rentals(async_client, fake_admin_token, sample_data):
+    headers = {"Authorization": f"Bearer {fake_admin_token}"}
+    today = jalali_date.today()
+    params = {
+        "start_date": (today - timedelta(days=400)).strftime("%Y/%m/%d"),
+        "end_date": (today + timedelta(days=30)).strftime("%Y/%m/%d"),
+        "interval": AnalyticsInterval.MONTH.value,
+        "group_by": [AnalyticsDimension.LOCATION.value, AnalyticsDimension.BRAND.value],
+    }
+    await refresh_sales()
+    before = (await async_client.get("/stats/analytics/", params=params, headers=headers)).json()
+    # Months start on the first of the Jalali month, except the one holding the start date
+    assert all(bucket["start"] == params["start_date"] or bucket["start"].endswith("/01") for bucket in before)
+
+    async with AsyncSession(async_engine) as session:
+        session.add(Payment(
+            payment_datetime=jalali_datetime.now(ZoneInfo("Asia/Tehran")).strftime("%Y/%m/%d %H:%M:%S"),
+            payment_method=PaymentMethod.ONLINE_PAYMENT, amount=500, payment_status=PaymentStatus.COMPLETED,
+            invoice_id=sample_data["invoice"],
+        ))
+        await session.commit()
+    # Writes reach the chart once the rollup is refreshed
+    stale = (await async_client.get("/stats/analytics/", params=params, headers=headers)).json()
+    assert sales_of_day(stale, today.strftime("%Y/%m/%d")) == sales_of_day(before, today.strftime("%Y/%m/%d"))
+    await refresh_sales()
+
+    response = await async_client.get("/stats/analytics/", params=params, headers=headers)
+    assert response.status_code == 200
+    day = today.strftime("%Y/%m/%d")
+    assert sales_of_day(response.json(), day) == {
+        **sales_of_day(before, day),
+        "revenue": sales_of_day(before, day)["revenue"] + 500,
+        "payment_count": sales_of_day(before, day)["payment_count"] + 1,
+    }
+
+    # The sample payments and rental are counted for the branch of the vehicle of the invoice's rental
+    mashhad = {**params, "location": BranchLocations.MASHHAD.value, "brand": Brand.TOYOTA.value}
+    before = (await async_client.get("/stats/analytics/", params=mashhad, headers=headers)).json()
+    async with AsyncSession(async_engine) as session:
+        await session.execute(
+            update(Vehicle).where(Vehicle.id == sample_data["vehicle"]).values(location=BranchLocations.MASHHAD)
+        )
+        await session.commit()
+    await refresh_sales()
+    after = (await async_client.get("/stats/analytics/", params=mashhad, headers=headers)).json()
+
+    assert {bucket["location"] for bucket in after} == {BranchLocations.MASHHAD.value}
+    assert sum(bucket["revenue"] for bucket in after) == sum(bucket["revenue"] for bucket in before) + 1000500
+    assert sum(bucket["rental_count"] for bucket in after) == sum(bucket["rental_count"] for bucket in before) + 1
+
+
+@pytest.mark.asyncio
+async def test_analytics_rejects_too_many_buckets(async_client, fake_admin_token):
+    response = await async_client.get("/stats/analytics/", params={
+        "start_date": "1380/01/01", "end_date": "1404/01/01", "interval": AnalyticsInterval.DAY.value,
+    }, headers={"Authorization": f"Bearer {fake_admin_token}"})
+
+    assert response.status_code == 400
+
+
+def test_weeks_start_on_saturday():
+    # 1403/01/01 was a Wednesday
+    bounds = bucket_bounds(date(2024, 3, 20), date(2024, 4, 10), AnalyticsInterval.WEEK)
+
+    assert bounds[0] == date(2024, 3, 20)
+    assert bounds[1:] == [date(2024, 3, 23), date(2024, 3, 30), date(2024, 4, 6)]
+
+
+@pytest.mark.asyncio
+async def test_utilization_merges_rentals_into_gaps_and_peaks(async_client, fake_admin_token, sample_data):
+    headers = {"Authorization": f"Bearer {fake_admin_token}"}
+    # Days of a window far ahead, where only the rentals below hold vehicles
+    first = jalali_date.today() + timedelta(days=3000)
+
+    def day(offset: int) -> str:
+        return (first + timedelta(days=offset)).strftime("%Y/%m/%d")
+
+    digits = str(uuid.uuid4().int)
+    other_vehicle = Vehicle(
+        plate_number=f"{digits[:2]}ب{digits[2:5]}-{digits[5:7]}", location=BranchLocations.TEHRAN,
+        local_image_address="/images/test.png", brand=Brand.TOYOTA, model="Corolla", year=1400, color="white",
+        mileage=0, status=CarStatus.AVAILABLE, hourly_rental_rate=100000, security_deposit=1000000,
+    )
+    other_vehicle_id = other_vehicle.id
+    # Overlapping rentals of the sample vehicle count their days once
+    periods = [(sample_data["vehicle"], 0, 4), (sample_data["vehicle"], 3, 6), (sample_data["vehicle"], 9, 9),
+               (other_vehicle_id, 2, 3)]
+    async with AsyncSession(async_engine) as session:
+        session.add(other_vehicle)
+        await session.flush()
+        session.add_all(
+            Rental(rental_start_date=day(start), rental_end_date=day(end), total_amount=0,
+                   customer_id=sample_data["customer"], vehicle_id=vehicle_id, invoice_id=sample_data["invoice"])
+            for vehicle_id, start, end in periods
+        )
+        await session.commit()
+
+    try:
+        params = {"start_date": day(0), "end_date": day(19), "brand": Brand.TOYOTA.value}
+        response = await async_client.get("/stats/utilization/", params=params, headers=headers)
+        assert response.status_code == 200
+        fleet = response.json()
+        assert (fleet["days"], fleet["rented_days"], fleet["peak_rented_vehicles"]) == (20, 10, 2)
+        assert fleet["peak_windows"] == [{"start": day(2), "end": day(3)}]
+        assert fleet["utilization"] == pytest.approx(10 / (20 * fleet["vehicle_count"]))
+        tehran, = [branch for branch in fleet["branches"] if branch["location"] == BranchLocations.TEHRAN.value]
+        assert (tehran["rented_days"], tehran["peak_rented_vehicles"]) == (10, 2)
+
+        vehicles = {}
+        while True:
+            response = await async_client.get("/stats/utilization/vehicles/", params=params, headers=headers)
+            assert response.status_code == 200
+            vehicles |= {vehicle["vehicle_id"]: vehicle for vehicle in response.json()}
+            if NEXT_CURSOR_HEADER not in response.headers:
+                break
+            params["cursor"] = response.headers[NEXT_CURSOR_HEADER]
+        sample_vehicle = vehicles[str(sample_data["vehicle"])]
+        assert (sample_vehicle["rented_days"], sample_vehicle["utilization"]) == (8, 0.4)
+        assert sample_vehicle["idle_gaps"] == [{"start": day(7), "end": day(8)}, {"start": day(10), "end": day(19)}]
+        assert vehicles[str(other_vehicle_id)]["idle_gaps"] == [
+            {"start": day(0), "end": day(1)}, {"start": day(4), "end": day(19)},
+        ]
+    finally:
+        async with AsyncSession(async_engine) as session:
+            await session.execute(delete(Vehicle).where(Vehicle.id == other_vehicle_id))
+            await session.commit()
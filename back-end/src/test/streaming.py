@@ -0,0 +1,63 @@
+from datetime import datetime
+
+import orjson
+import pytest
+from sqlalchemy import select
+
+from database import async_engine
+from models.relational_models import Invoice
+from routers.invoice import INVOICE_CAPPED_COLLECTIONS, INVOICE_LOAD_OPTIONS
+from schemas.relational_schemas import RelationalInvoicePublic
+from utilities import streaming
+from utilities.enumerables import StreamFormat
+from utilities.streaming import stream_rows
+
+
+async def read_stream(before: datetime) -> tuple[int, int]:
+    query = (
+        select(Invoice).options(*INVOICE_LOAD_OPTIONS).where(Invoice.created_at < before)
+        .order_by(Invoice.created_at, Invoice.id)
+    )
+    chunks = stream_rows(async_engine, query, RelationalInvoicePublic, StreamFormat.NDJSON, INVOICE_CAPPED_COLLECTIONS)
+    streamed, size = 0, 0
+    async for chunk in chunks:
+        streamed += chunk.count(b"\n")
+        size += len(chunk)
+    return streamed, size
+
+
+@pytest.mark.asyncio
+async def test_streamed_lists_match_paginated_lists(async_client, fake_admin_token, old_invoices):
+    await old_invoices(150)
+    headers = {"Authorization": f"Bearer {fake_admin_token}"}
+
+    page = (await async_client.get("/invoices/", params={"limit": 100}, headers=headers)).json()
+
+    response = await async_client.get("/invoices/", params={"stream": "ndjson"}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    ndjson = [orjson.loads(line) for line in response.content.splitlines()]
+
+    response = await async_client.get("/invoices/", params={"stream": "json"}, headers=headers)
+    assert response.status_code == 200
+    assert response.json() == ndjson
+    # Streaming ignores the page size, but keeps the order and the serialization of the list
+    assert len(ndjson) >= 150
+    assert ndjson[:100] == page
+
+
+@pytest.mark.asyncio
+async def test_streaming_memory_does_not_grow_with_rows(monkeypatch, old_invoices, peak_memory):
+    monkeypatch.setattr(streaming, "STREAM_BATCH_SIZE", 100)
+
+    await old_invoices(500)
+    await peak_memory(read_stream(old_invoices.before))  # Warms up the statement caches
+    small_peak, (streamed, small_size) = await peak_memory(read_stream(old_invoices.before))
+    assert streamed == 500
+
+    await old_invoices(4500)
+    large_peak, (streamed, large_size) = await peak_memory(read_stream(old_invoices.before))
+    assert streamed == 5000
+
+    assert large_size > 9 * small_size
+    assert large_peak < 1.5 * small_peak
@@ -0,0 +1,55 @@
+import pytest
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import async_engine
+from models.relational_models import Comment, Post
+from utilities.text_search import normalize_persian
+
+
+def test_normalize_persian_folds_arabic_and_zero_width_characters():
+    assert normalize_persian("كيف‌هاي") == "کیف های"
+    assert normalize_persian("کیف") == "کیف"
+
+
+@pytest.mark.asyncio
+async def test_posts_are_searched_in_normalized_form_and_ranked(async_client, sample_data):
+    async with AsyncSession(async_engine) as session:
+        # Written with the Arabic kaf and yeh, and a zero-width non-joiner
+        await session.execute(
+            update(Post).where(Post.id == sample_data["post"]).values(
+                subject="كرايه خودرو", content="شرايط اجاره‌نامه",
+            )
+        )
+        # The searched word only in the content, which is weighted below the subject
+        post = Post(subject="اخبار", content="تخفیف کرایه تابستان", admin_id=sample_data["admin"])
+        post_id = post.id
+        session.add(post)
+        await session.commit()
+
+    response = await async_client.get("/posts/", params={"q": "کرایه", "admin_id": str(sample_data["admin"])})
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()] == [str(sample_data["post"]), str(post_id)]
+
+    response = await async_client.get("/posts/", params={"q": "اجاره نامه", "admin_id": str(sample_data["admin"])})
+    assert [item["id"] for item in response.json()] == [str(sample_data["post"])]
+
+    response = await async_client.get("/posts/", params={"q": "کرایه -تابستان", "admin_id": str(sample_data["admin"])})
+    assert [item["id"] for item in response.json()] == [str(sample_data["post"])]
+
+
+@pytest.mark.asyncio
+async def test_comments_are_searched_in_normalized_form(async_client, sample_data):
+    async with AsyncSession(async_engine) as session:
+        await session.execute(
+            update(Comment).where(Comment.id == sample_data["comment"]).values(content="ماشين تميز و كامل بود")
+        )
+        await session.commit()
+
+    params = {"customer_id": str(sample_data["customer"])}
+    response = await async_client.get("/comments/", params={**params, "q": "ماشین کامل"})
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()] == [str(sample_data["comment"])]
+
+    response = await async_client.get("/comments/", params={**params, "q": "ماشین کثیف"})
+    assert response.json() == []
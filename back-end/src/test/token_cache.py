@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from utilities.authentication import create_access_token, decode_access_token_cached, token_cache
+
+
+def test_token_cache_reuses_verified_payload():
+
+    token = create_access_token(data={"id": "cache-test", "role": "Customer"}, expires_delta=timedelta(minutes=5))
+    hits, misses = token_cache.hits, token_cache.misses
+
+    first = decode_access_token_cached(token)
+    second = decode_access_token_cached(token)
+
+    assert first == second
+    assert token_cache.misses == misses + 1
+    assert token_cache.hits == hits + 1
+
+
+def test_token_cache_rejects_expired_token():
+
+    token = create_access_token(data={"id": "cache-test", "role": "Customer"}, expires_delta=timedelta(seconds=-1))
+
+    with pytest.raises(HTTPException) as error:
+        decode_access_token_cached(token)
+
+    assert error.value.status_code == 401
@@ -0,0 +1,256 @@
+import asyncio
+import logging
+from datetime import date, timedelta
+from functools import lru_cache
+from os import getenv
+
+from jdatetime import date as jalali_date
+from sqlalchemy import Connection, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from utilities.counters import PURCHASE_TIME_ZONE
+from utilities.enumerables import AnalyticsInterval
+
+# Tables holding the sales of each day per branch and brand, and the days whose sales must be summed again
+SALES_ROLLUP_TABLE = "sales_rollup"
+STALE_SALES_DAY_TABLE = "stale_sales_day"
+
+ANALYTICS_MAX_BUCKETS = int(getenv("CRMS_ANALYTICS_MAX_BUCKETS", 1000))  # Buckets one analytics request may span
+
+# Seconds between the refreshes of the rollup by each worker, 0 to disable
+SALES_REFRESH_INTERVAL = int(getenv("CRMS_ANALYTICS_REFRESH_INTERVAL", 60))
+
+# Stale days summed per transaction, so writers of those days are held up briefly
+SALES_REFRESH_BATCH_DAYS = 31
+
+# Payments counted as revenue
+REVENUE_PAYMENT_STATUS = "COMPLETED"
+
+logger = logging.getLogger(__name__)
+
+
+def _payment_day(payment: str) -> str:
+    # The day of the Jalali calendar a payment was made on, as its Gregorian date
+    return f"({payment}.payment_at AT TIME ZONE '{PURCHASE_TIME_ZONE}')::date"
+
+
+def _rental_days(rentals: str) -> str:
+    # Payments are counted for the vehicle of their invoice's first rental, so rentals also move payments
+    return (
+        f"SELECT changed.rental_start_on FROM {rentals} AS changed UNION ALL "
+        f"SELECT {_payment_day('payment')} FROM payment JOIN {rentals} AS changed "
+        f"ON payment.invoice_id = changed.invoice_id"
+    )
+
+
+def _mark_days(days: str) -> str:
+    # The lock on the day row, taken even when the day is already marked, makes
+    # `refresh_sales_rollup` wait for the writing transaction; rows are locked in date order
+    return f"""
+        INSERT INTO {STALE_SALES_DAY_TABLE} (day, marked_at)
+        SELECT DISTINCT day, now() FROM ({days}) AS days (day) WHERE day IS NOT NULL ORDER BY day
+        ON CONFLICT (day) DO UPDATE SET marked_at = EXCLUDED.marked_at;"""
+
+
+def _mark_days_function(name: str, new_days: str, old_days: str) -> str:
+    return f"""
+CREATE OR REPLACE FUNCTION {name}() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN{_mark_days(f"SELECT day FROM {SALES_ROLLUP_TABLE}")}
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN{_mark_days(new_days)}
+    END IF;
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN{_mark_days(old_days)}
+    END IF;
+    RETURN NULL;
+END
+$$
+"""
+
+
+# Vehicles whose branch or brand an update changed
+_MOVED_VEHICLE_RENTALS = (
+    "(SELECT rental.* FROM rental JOIN new_rows ON rental.vehicle_id = new_rows.id "
+    "JOIN old_rows ON old_rows.id = new_rows.id "
+    "WHERE (new_rows.location, new_rows.brand) IS DISTINCT FROM (old_rows.location, old_rows.brand))"
+)
+
+# Functions marking the days whose sales a statement changed, per table
+MARK_SALES_DAYS_SQL = {
+    "payment": _mark_days_function(
+        "mark_payment_sales_days",
+        f"SELECT {_payment_day('new_rows')} FROM new_rows",
+        f"SELECT {_payment_day('old_rows')} FROM old_rows",
+    ),
+    "rental": _mark_days_function("mark_rental_sales_days", _rental_days("new_rows"), _rental_days("old_rows")),
+    "vehicle": _mark_days_function(
+        "mark_vehicle_sales_days", _rental_days(_MOVED_VEHICLE_RENTALS), _rental_days(_MOVED_VEHICLE_RENTALS),
+    ),
+}
+
+# Events marking days, per table; vehicles only change sales by moving, and their deletes delete their rentals
+SALES_EVENTS = {
+    "payment": ("DELETE", "INSERT", "TRUNCATE", "UPDATE"),
+    "rental": ("DELETE", "INSERT", "TRUNCATE", "UPDATE"),
+    "vehicle": ("UPDATE",),
+}
+
+# Transition tables of each event
+TRANSITION_TABLES = {
+    "DELETE": "REFERENCING OLD TABLE AS old_rows",
+    "INSERT": "REFERENCING NEW TABLE AS new_rows",
+    "TRUNCATE": "",
+    "UPDATE": "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows",
+}
+
+# Sums the sales of the given days: completed payments by the day they were made on, and
+# rentals by the day they start, per branch and brand of their vehicle
+SALES_SQL = f"""
+SELECT day, location, brand, sum(revenue) AS revenue, sum(payment_count) AS payment_count,
+    sum(rental_count) AS rental_count
+FROM (
+    SELECT stale.day, vehicle.location, vehicle.brand,
+        coalesce(payment.amount, 0) AS revenue, 1 AS payment_count, 0 AS rental_count
+    FROM unnest(CAST(:days AS date[])) AS stale (day)
+    JOIN payment
+        ON payment.payment_at >= stale.day::timestamp AT TIME ZONE '{PURCHASE_TIME_ZONE}'
+        AND payment.payment_at < (stale.day + 1)::timestamp AT TIME ZONE '{PURCHASE_TIME_ZONE}'
+    LEFT JOIN LATERAL (
+        SELECT rental.vehicle_id FROM rental WHERE rental.invoice_id = payment.invoice_id
+        ORDER BY rental.created_at, rental.id LIMIT 1
+    ) AS first_rental ON true
+    LEFT JOIN vehicle ON vehicle.id = first_rental.vehicle_id
+    WHERE payment.payment_status = '{REVENUE_PAYMENT_STATUS}'
+    UNION ALL
+    SELECT rental.rental_start_on, vehicle.location, vehicle.brand, 0, 0, 1
+    FROM rental JOIN vehicle ON vehicle.id = rental.vehicle_id
+    WHERE rental.rental_start_on = ANY(CAST(:days AS date[]))
+) AS sales
+GROUP BY day, location, brand
+"""
+
+# Replaces the rollup rows of the stale days taken by a refresh
+SUM_SALES_SQL = f"""
+INSERT INTO {SALES_ROLLUP_TABLE} (day, location, brand, revenue, payment_count, rental_count)
+{SALES_SQL}"""
+
+
+def create_sales_triggers(connection: Connection) -> None:
+    """
+    Creates the triggers marking the days whose sales change stale, replacing existing ones.
+
+    Args:
+        connection (Connection): A connection to a database where the tables exist.
+    """
+    for table, events in SALES_EVENTS.items():
+        connection.exec_driver_sql(MARK_SALES_DAYS_SQL[table])
+        for event in events:
+            connection.exec_driver_sql(
+                f"CREATE OR REPLACE TRIGGER {table}_sales_{event.lower()} AFTER {event} ON {table} "
+                f"{TRANSITION_TABLES[event]} FOR EACH STATEMENT EXECUTE FUNCTION mark_{table}_sales_days()"
+            )
+
+
+def drop_sales_triggers(connection: Connection) -> None:
+    """
+    Drops the triggers and functions created by `create_sales_triggers`.
+    """
+    for table, events in SALES_EVENTS.items():
+        for event in events:
+            connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {table}_sales_{event.lower()} ON {table}")
+        connection.exec_driver_sql(f"DROP FUNCTION IF EXISTS mark_{table}_sales_days()")
+
+
+def refresh_sales_rollup(connection: Connection, limit: int | None = None) -> int:
+    """
+    Sums the sales of stale days again, so the rollup covers every write committed to them before.
+
+    Days still being marked by an open transaction, or taken by a concurrent refresh, are
+    skipped and left stale; writes to the days taken wait until the transaction of the connection ends.
+
+    Args:
+        connection (Connection): A connection to the primary database, in the transaction to refresh in.
+        limit (int | None): The most days to take, oldest first; all of them when None.
+
+    Returns:
+        int: The number of days refreshed.
+    """
+    # Taking a day after its markers committed makes the sums below see their writes
+    days = connection.execute(text(f"""
+        DELETE FROM {STALE_SALES_DAY_TABLE} WHERE day IN (
+            SELECT day FROM {STALE_SALES_DAY_TABLE} ORDER BY day LIMIT :limit FOR UPDATE SKIP LOCKED
+        )
+        RETURNING day
+    """), {"limit": limit}).scalars().all()
+    if days:
+        connection.execute(text(f"DELETE FROM {SALES_ROLLUP_TABLE} WHERE day = ANY(CAST(:days AS date[]))"),
+                           {"days": days})
+        connection.execute(text(SUM_SALES_SQL), {"days": days})
+    return len(days)
+
+
+async def refresh_sales_rollup_periodically(engine: AsyncEngine, interval: float = SALES_REFRESH_INTERVAL) -> None:
+    """
+    Runs `refresh_sales_rollup` every `interval` seconds until cancelled, in transactions of
+    `SALES_REFRESH_BATCH_DAYS` days, logging failures.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            while True:
+                async with engine.begin() as connection:
+                    days = await connection.run_sync(refresh_sales_rollup, SALES_REFRESH_BATCH_DAYS)
+                if days < SALES_REFRESH_BATCH_DAYS:
+                    break
+        except Exception:
+            logger.exception("Sales rollup refresh failed")
+
+
+def mark_all_sales_days(connection: Connection) -> None:
+    """
+    Marks every day with payments or rentals stale, to sum the rollup from scratch.
+    """
+    connection.execute(text(_mark_days(
+        f"SELECT {_payment_day('payment')} FROM payment UNION SELECT rental_start_on FROM rental"
+    )))
+
+
+def bucket_bounds(start: date, end: date, interval: AnalyticsInterval) -> list[date]:
+    """
+    Lists the first days of the buckets an analytics request groups the days from `start` to `end` in.
+
+    Weeks start on Saturday and months on the first day of the Jalali month; the first bucket
+    starts at `start` even if it falls within a week or month.
+
+    Args:
+        start (date): The first day of the range.
+        end (date): The last day of the range.
+        interval (AnalyticsInterval): The length of the buckets.
+
+    Returns:
+        list[date]: The ascending first days; `ANALYTICS_MAX_BUCKETS` + 1 of them if the range spans more buckets.
+    """
+    bounds = [start]
+    while True:
+        if interval == AnalyticsInterval.DAY:
+            bound = bounds[-1] + timedelta(days=1)
+        elif interval == AnalyticsInterval.WEEK:
+            # Python numbers Saturday 5
+            bound = bounds[-1] + timedelta(days=(4 - bounds[-1].weekday()) % 7 + 1)
+        else:
+            month = jalali_date.fromgregorian(date=bounds[-1])
+            year, month = (month.year + 1, 1) if month.month == 12 else (month.year, month.month + 1)
+            bound = jalali_date(year, month, 1).togregorian()
+        if bound > end or len(bounds) > ANALYTICS_MAX_BUCKETS:
+            return bounds
+        bounds.append(bound)
+
+
+@lru_cache(maxsize=4096)
+def jalali(day: date) -> str:
+    """
+    Formats a Gregorian date as the Jalali date the API reads and writes.
+
+    Charts format the same days over and over, and jdatetime is slow to convert them.
+    """
+    return jalali_date.fromgregorian(date=day).strftime("%Y/%m/%d")
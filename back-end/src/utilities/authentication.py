@@ -1,3 +1,4 @@
+import hashlib
 import os
 from datetime import timedelta, timezone, datetime
 from typing import Any
@@ -5,13 +6,15 @@ from typing import Any
 import jwt
 from fastapi import HTTPException
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from passlib.context import CryptContext
+from sqlalchemy import cast, literal, literal_column, null, union_all
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select
 
 from models.relational_models import Admin, Customer
 from schemas.authentication import LoginRequest
-from utilities.enumerables import AdminRole, CustomerRole
+from utilities.enumerables import CustomerRole
+from utilities.password_hashing import verify_password_async
+from utilities.ttl_cache import TTLCache
 
 ACCESS_TOKEN_EXPIRE_MINUTES = 15  # Access token lifetime (15 minutes)
 REFRESH_TOKEN_EXPIRE_MINUTES = 10080  # Refresh token lifetime (7 days)
@@ -20,10 +23,13 @@ SECRET_KEY = os.getenv("CRMS_SECURITY_KEY")
 
 ALGORITHM = "HS512"
 
-# Password hashing context using PBKDF2-HMAC-SHA512
-pwd_context = CryptContext(schemes=["pbkdf2_sha512"], deprecated="auto")
+TOKEN_CACHE_SIZE = int(os.getenv("CRMS_TOKEN_CACHE_SIZE", 4096))  # Verified tokens kept in memory
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login/", )
+# Decoded payloads of verified tokens, keyed by token digest and kept until the token expires
+token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE)
+
+# Missing credentials are reported by get_current_user, so the scheme does not raise on its own
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login/", auto_error=False)
 
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
@@ -63,68 +69,50 @@ def decode_access_token(token: str) -> dict[str, Any]:
         )
 
 
-def get_password_hash(password: str) -> str:
+def decode_access_token_cached(token: str) -> dict[str, Any]:
     """
-    Hashes the provided password using the bcrypt algorithm.
+    Decodes an access token, reusing the payload of a previously verified identical token.
 
     Args:
-        password (str): The plain password to be hashed.
+        token (str): The encoded JWT sent by the client.
 
     Returns:
-        str: The hashed version of the provided password.
-
-    This function hashes the provided password using the `hash` method from
-    passlib's CryptContext. It's commonly used for securely storing passwords.
-    """
-    return pwd_context.hash(password)
-
+        dict[str, Any]: The decoded token payload.
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+    Tokens are cached under their SHA-256 digest until their `exp` claim, so a token
+    reused during its lifetime is verified only once. Expired or invalid tokens are
+    never cached and raise the same errors as `decode_access_token`.
     """
-    Verifies whether the provided plain password matches the hashed password.
+    key = hashlib.sha256(token.encode()).digest()
 
-    Args:
-        plain_password (str): The password in plain text to be verified.
-        hashed_password (str): The hashed version of the password to compare against.
-
-    Returns:
-        bool: True if the plain password matches the hashed password, otherwise False.
+    payload = token_cache.get(key)
+    if payload is None:
+        payload = decode_access_token(token)
+        if "exp" in payload:
+            token_cache.set(key, payload, expires_at=payload["exp"])
 
-    This function uses the `verify` method from passlib's CryptContext to compare
-    the plain password with the stored hashed password. It handles exceptions gracefully
-    and ensures the function always returns a boolean result.
-    """
-    try:
-        return pwd_context.verify(plain_password, hashed_password)
-    except:
-        # Log the exception or handle the error in a more meaningful way
-        return False
+    return payload
 
 
-async def authenticate_user(credentials: LoginRequest, session: AsyncSession):
+async def authenticate_user(credentials: LoginRequest, session: AsyncSession) -> dict[str, Any]:
     username, password = credentials.username, credentials.password
 
-    user_models = [
-        (Admin, {"username": username, "role": AdminRole.SUPER_ADMIN.value}),
-        (Admin, {"username": username, "role": AdminRole.GENERAL_ADMIN.value}),
-        (Customer, {"username": username})
-    ]
-
-    for model, filters in user_models:
-        query = select(model)
-
-        for field, value in filters.items():
-            query = query.where(getattr(model, field) == value)
-        result = await session.execute(query)
-        user_instance = result.scalars().one_or_none()
-
-        if user_instance and verify_password(password, user_instance.password):
-
-            role = filters.get("role", CustomerRole.CUSTOMER.value)
-            return {"user": user_instance, "role": role}
+    # Admins and customers are looked up together through their unique username
+    # indexes, so a login costs one round trip whichever table the user is in.
+    # Customers carry a NULL role; admin rows are tried first, as they were before.
+    login_query = union_all(
+        select(Admin.id, Admin.password, Admin.role, literal(0).label("priority"))
+        .where(Admin.username == username),
+        select(Customer.id, Customer.password, cast(null(), Admin.__table__.c.role.type), literal(1))
+        .where(Customer.username == username),
+    ).order_by(literal_column("priority"))
+    result = await session.execute(login_query)
+
+    for user_id, hashed_password, role, _ in result.all():
+        if await verify_password_async(password, hashed_password):
+            return {"id": user_id, "role": role.value if role else CustomerRole.CUSTOMER.value}
 
     raise HTTPException(
         status_code=401,
         detail="نام کاربری یا گذرواژه پیدا نشد"
     )
-
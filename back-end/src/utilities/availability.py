@@ -0,0 +1,29 @@
+from datetime import date
+
+from sqlalchemy import ColumnElement, func, literal
+
+from utilities.enumerables import CarStatus
+
+# Days a rental holds its vehicle, both ends included, as a generated column of the rental table.
+# Rentals whose typed dates are missing or reversed hold no days rather than failing the insert.
+RENTAL_PERIOD_SQL = (
+    "CASE WHEN rental_start_on <= rental_end_on THEN daterange(rental_start_on, rental_end_on, '[]') END"
+)
+
+# Statuses of vehicles that can be rented for future dates; RENTED only says the vehicle was rented
+# last, and whether it is free for a window is decided by the dates of its rentals
+RENTABLE_STATUSES = (CarStatus.NEW, CarStatus.AVAILABLE, CarStatus.RENTED)
+
+
+def rental_window(start: date, end: date) -> ColumnElement:
+    """
+    Builds the range of days from `start` to `end`, both included, to compare with rental periods.
+
+    Args:
+        start (date): The first day of the window.
+        end (date): The last day of the window.
+
+    Returns:
+        ColumnElement: A `daterange` expression.
+    """
+    return func.daterange(start, end, literal("[]"))
@@ -0,0 +1,240 @@
+import asyncio
+import contextlib
+import csv
+import zipfile
+from graphlib import CycleError, TopologicalSorter
+from typing import IO, Any, AsyncIterator, Mapping
+
+import orjson
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from utilities.analytics import SALES_ROLLUP_TABLE, STALE_SALES_DAY_TABLE
+from utilities.counters import DAILY_PURCHASE_COUNT_TABLE, ROW_COUNT_TABLE
+from utilities.streaming import ZipStream
+from utilities.table_versions import TABLE_VERSION_TABLE
+
+# Format of the table entries of the archives written by `backup_chunks`, recorded in their metadata.
+# CSV is the text form of every column type, so values keep their exact type, and its header lets
+# archives be restored by column name into a schema that gained or lost columns since.
+BACKUP_FORMAT = "csv"
+
+# Table holding the Alembic revision of the schema
+ALEMBIC_VERSION_TABLE = "alembic_version"
+
+# Tables which backups leave out and restores skip. The revision is the one of the schema restored
+# into, whatever the revision the backup was taken at. The other tables are kept by triggers: the
+# table versions are not restored, so that restoring bumps them past every version served before,
+# and neither are the counters and the sales rollup, which the triggers keep while the rows are restored.
+UNRESTORED_TABLES = (
+    ALEMBIC_VERSION_TABLE, TABLE_VERSION_TABLE, ROW_COUNT_TABLE, DAILY_PURCHASE_COUNT_TABLE, SALES_ROLLUP_TABLE,
+    STALE_SALES_DAY_TABLE,
+)
+
+# Chunks of a table copied ahead of the archive being sent
+BACKUP_QUEUE_SIZE = 8
+
+
+async def backup_tables(connection: AsyncConnection) -> dict[str, list[str]]:
+    """
+    Lists the tables a backup holds, parents before the tables referencing them, with their columns.
+
+    Generated columns, such as the full-text search vectors, are left out and computed again on restore.
+    """
+    rows = await connection.execute(text("""
+        SELECT columns.table_name, array_agg(columns.column_name::text ORDER BY columns.ordinal_position)
+        FROM information_schema.columns
+        JOIN information_schema.tables USING (table_schema, table_name)
+        WHERE columns.table_schema = 'public'
+          AND tables.table_type = 'BASE TABLE'
+          AND columns.is_generated = 'NEVER'
+          AND columns.table_name::text <> ALL(CAST(:unrestored AS text[]))
+        GROUP BY columns.table_name
+    """), {"unrestored": list(UNRESTORED_TABLES)})
+    columns = dict(rows.all())
+    return {table: columns[table] for table in await dependency_order(connection, columns)}
+
+
+async def dependency_order(connection: AsyncConnection, tables: Mapping[str, Any]) -> list[str]:
+    """
+    Orders tables so that every table comes after the tables its foreign keys reference.
+
+    Tables in a cycle of references, which only deferred constraints can restore, are ordered by name.
+    """
+    references = await connection.execute(text("""
+        SELECT conrelid::regclass::text, confrelid::regclass::text
+        FROM pg_constraint
+        WHERE contype = 'f' AND connamespace = 'public'::regnamespace AND conrelid <> confrelid
+    """))
+    parents = {table: set() for table in sorted(tables)}
+    for child, parent in references:
+        if child in parents and parent in parents:
+            parents[child].add(parent)
+    try:
+        return list(TopologicalSorter(parents).static_order())
+    except CycleError:
+        return list(parents)
+
+
+class CopyAbandoned(Exception):
+    """
+    Raised into a copy out of a table whose chunks are no longer read, to abort it.
+    """
+
+
+async def copy_table_out(driver_connection: Any, table: str, columns: list[str]) -> AsyncIterator[bytes]:
+    """
+    Copies the rows of a table out as CSV with a header, yielding the chunks the server sends.
+
+    The copy is paused while `BACKUP_QUEUE_SIZE` chunks wait to be consumed, so a slow client
+    holds back the database instead of filling the memory of the worker.
+
+    Args:
+        driver_connection (Any): The asyncpg connection, in the transaction to read in.
+        table (str): The table.
+        columns (list[str]): Its columns to copy, in order.
+
+    Yields:
+        bytes: The next chunk of CSV.
+    """
+    chunks: asyncio.Queue[bytes | None] = asyncio.Queue(maxsize=BACKUP_QUEUE_SIZE)
+    abandoned = asyncio.Event()
+
+    async def output(chunk: bytes) -> None:
+        if abandoned.is_set():
+            # asyncpg aborts a copy whose output fails, and leaves its connection usable
+            raise CopyAbandoned
+        await chunks.put(chunk)
+
+    async def copy() -> None:
+        try:
+            await driver_connection.copy_from_table(
+                table, columns=columns, output=output, format="csv", header=True,
+            )
+        finally:
+            await chunks.put(None)
+
+    task = asyncio.create_task(copy())
+    try:
+        while (chunk := await chunks.get()) is not None:
+            yield chunk
+        # Raises the error that ended the copy, if any
+        await task
+    finally:
+        # A consumer that stops early leaves the copy running, which must end before the connection
+        # is released. Emptying the queue frees the copy waiting to add a chunk, and aborts it on its next.
+        if not task.done():
+            abandoned.set()
+            while not chunks.empty():
+                chunks.get_nowait()
+            with contextlib.suppress(CopyAbandoned):
+                await task
+
+
+async def backup_chunks(engine: AsyncEngine, metadata: dict[str, Any]) -> AsyncIterator[bytes]:
+    """
+    Writes the backup archive of every table, yielding its compressed bytes as they are produced.
+
+    Each table is copied out with `COPY ... TO STDOUT` into a CSV entry of the archive, in one
+    read-only transaction so the archive is a consistent snapshot; memory use depends on the
+    size of the chunks in flight and not on the size of the database.
+
+    Args:
+        engine (AsyncEngine): The engine of the primary database.
+        metadata (dict[str, Any]): The signed metadata, written as the last entry with the format.
+
+    Yields:
+        bytes: The next bytes of the zip archive.
+    """
+    async with engine.connect() as connection:
+        await connection.execution_options(isolation_level="REPEATABLE READ", postgresql_readonly=True)
+        async with connection.begin():
+            # Listing the tables begins the transaction the copies below run in
+            tables = await backup_tables(connection)
+            driver_connection = (await connection.get_raw_connection()).driver_connection
+
+            sink = ZipStream()
+            with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+                for table, columns in tables.items():
+                    # Closed with the archive, so a client that went away also ends the copy
+                    copy = contextlib.aclosing(copy_table_out(driver_connection, table, columns))
+                    with zf.open(f"{table}.csv", mode="w", force_zip64=True) as entry:
+                        async with copy as chunks:
+                            async for chunk in chunks:
+                                entry.write(chunk)
+                                yield sink.take()
+                    yield sink.take()
+                zf.writestr("metadata.json", orjson.dumps({**metadata, "format": BACKUP_FORMAT}))
+            # Closing the archive writes its central directory
+            yield sink.take()
+
+
+def _quote(identifier: str) -> str:
+    # Column names read from an archive are quoted as identifiers
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+async def copy_table_in(driver_connection: Any, table: str, table_columns: list[str], entry: IO[bytes]) -> int:
+    """
+    Copies the rows of a CSV entry with a header into a table.
+
+    Columns the table gained since the backup get their default. Columns it has lost are
+    dropped: the rows are then copied into a temporary table with the columns of the backup,
+    and inserted from there with the columns the table still has.
+
+    Args:
+        driver_connection (Any): The asyncpg connection, in the transaction to restore in.
+        table (str): The table.
+        table_columns (list[str]): Its columns, without the generated ones.
+        entry (IO[bytes]): The entry of the table in the archive.
+
+    Returns:
+        int: The number of rows copied.
+    """
+    # The header names the columns of the backup, which may differ from the table's
+    columns = next(csv.reader([entry.readline().decode()]))
+    kept = [column for column in columns if column in table_columns]
+    if kept == columns:
+        # The entry is read and decompressed in a worker thread of asyncpg
+        status = await driver_connection.copy_to_table(table, source=entry, columns=columns, format="csv")
+        return int(status.split()[-1])
+
+    staging, kept_list = f"restore_{table}", ", ".join(kept)
+    await driver_connection.execute(f"CREATE TEMPORARY TABLE {staging} AS SELECT {kept_list} FROM {table} WITH NO DATA")
+    for column in columns:
+        if column not in table_columns:
+            await driver_connection.execute(f"ALTER TABLE {staging} ADD COLUMN {_quote(column)} text")
+    await driver_connection.copy_to_table(staging, source=entry, columns=columns, format="csv")
+    status = await driver_connection.execute(f"INSERT INTO {table} ({kept_list}) SELECT {kept_list} FROM {staging}")
+    await driver_connection.execute(f"DROP TABLE {staging}")
+    return int(status.split()[-1])
+
+
+async def restore_archive(engine: AsyncEngine, zf: zipfile.ZipFile) -> dict[str, int]:
+    """
+    Replaces the rows of the tables of an archive written by `backup_chunks`, in one transaction.
+
+    The tables are emptied together, then each one is copied in with `COPY ... FROM STDIN`,
+    parents before the tables referencing them, with the deferrable constraints checked at commit.
+    Entries of tables that do not exist, or are left out of backups, are skipped.
+
+    Args:
+        engine (AsyncEngine): The engine of the primary database.
+        zf (zipfile.ZipFile): The archive, whose signature has been checked.
+
+    Returns:
+        dict[str, int]: The number of rows restored per table.
+    """
+    entries = {name.removesuffix(".csv"): name for name in zf.namelist() if name.endswith(".csv")}
+    restored = {}
+    async with engine.begin() as connection:
+        await connection.execute(text("SET CONSTRAINTS ALL DEFERRED"))
+        tables = {table: columns for table, columns in (await backup_tables(connection)).items() if table in entries}
+        if tables:
+            await connection.execute(text(f"TRUNCATE TABLE {', '.join(tables)} CASCADE"))
+
+        driver_connection = (await connection.get_raw_connection()).driver_connection
+        for table, columns in tables.items():
+            with zf.open(entries[table]) as entry:
+                restored[table] = await copy_table_in(driver_connection, table, columns, entry)
+    return restored
@@ -0,0 +1,288 @@
+import asyncio
+import hashlib
+import logging
+import time
+from os import getenv
+from typing import Any, Callable
+from urllib.parse import unquote, urlsplit
+
+import orjson
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+
+from utilities.ttl_cache import TTLCache
+
+# Where responses are cached: unset for memory of each worker, or a redis:// URL shared by the workers
+CACHE_URL = getenv("CRMS_CACHE_URL")
+
+CACHE_SIZE = int(getenv("CRMS_CACHE_SIZE", 10_000))  # Responses kept per worker by the memory cache, 0 to disable
+CACHE_TTL = int(getenv("CRMS_CACHE_TTL", 300))  # Seconds a cached response is kept
+
+# Prefix of the keys written to a shared cache
+CACHE_KEY_PREFIX = "crms:response:"
+
+# Headers of a response that are not replayed with it
+UNCACHED_HEADERS = {"content-length", "set-cookie"}
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryCache:
+    """
+    Caches values in the memory of the worker, in a bounded LRU with a time-to-live.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.ttl = ttl
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def get(self, key: str) -> bytes | None:
+        return self._entries.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        self._entries.set(key, value, expires_at=time.time() + (ttl or self.ttl))
+
+    async def stats(self) -> dict[str, Any]:
+        return {"backend": "memory", **self._entries.stats()}
+
+    async def close(self) -> None:
+        self._entries.clear()
+
+
+class RedisError(Exception):
+    """
+    An error reply of a Redis server.
+    """
+
+
+class RedisCache:
+    """
+    Caches values in a server speaking the Redis protocol (RESP), shared by all workers.
+
+    Only the few commands the cache needs are implemented, over a pool of at most
+    `max_connections` connections opened on demand; commands beyond them wait for one. The cache is an optimization: when the server cannot
+    be reached, reads miss and writes are dropped, and the error is logged.
+    """
+
+    def __init__(self, url: str, ttl: float, max_connections: int = 10) -> None:
+        parts = urlsplit(url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 6379
+        self.password = unquote(parts.password) if parts.password else None
+        self.db = int(parts.path.lstrip("/") or 0)
+        self.ttl = ttl
+        self.max_connections = max_connections
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._idle: list[tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._connections = asyncio.Semaphore(max_connections)
+
+    async def _connect(self) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        connection = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            await self._send(connection, "AUTH", self.password)
+        if self.db:
+            await self._send(connection, "SELECT", self.db)
+        return connection
+
+    @staticmethod
+    async def _send(connection: tuple[asyncio.StreamReader, asyncio.StreamWriter], *args: Any) -> Any:
+        reader, writer = connection
+        writer.write(encode_command(*args))
+        await writer.drain()
+        return await read_reply(reader)
+
+    async def execute(self, *args: Any) -> Any:
+        """
+        Sends one command and returns its reply.
+
+        Raises:
+            RedisError: If the server replies with an error.
+            OSError: If the server cannot be reached.
+        """
+        async with self._connections:
+            connection = self._idle.pop() if self._idle else await self._connect()
+            try:
+                reply = await self._send(connection, *args)
+            except RedisError:
+                # Error replies are read whole, so the connection can be reused
+                self._idle.append(connection)
+                raise
+            except BaseException:
+                # The connection may be left mid-reply
+                connection[1].close()
+                raise
+            self._idle.append(connection)
+            return reply
+
+    async def get(self, key: str) -> bytes | None:
+        try:
+            value = await self.execute("GET", CACHE_KEY_PREFIX + key)
+        except (OSError, asyncio.IncompleteReadError, RedisError) as error:
+            self.errors += 1
+            logger.warning("Response cache read failed: %s", error)
+            return None
+
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        try:
+            await self.execute("SET", CACHE_KEY_PREFIX + key, value, "PX", int((ttl or self.ttl) * 1000))
+        except (OSError, asyncio.IncompleteReadError, RedisError) as error:
+            self.errors += 1
+            logger.warning("Response cache write failed: %s", error)
+
+    async def stats(self) -> dict[str, Any]:
+        stats = {"backend": "redis", "hits": self.hits, "misses": self.misses, "errors": self.errors}
+        try:
+            info = (await self.execute("INFO", "stats")).decode()
+        except (OSError, asyncio.IncompleteReadError, RedisError):
+            return stats
+
+        # Evictions are the server's, and cover every key it holds
+        for line in info.splitlines():
+            if line.startswith("evicted_keys:"):
+                stats["evictions"] = int(line.split(":", 1)[1])
+        return stats
+
+    async def close(self) -> None:
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+
+def encode_command(*args: Any) -> bytes:
+    """
+    Encodes a command as a RESP array of bulk strings.
+    """
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        value = arg if isinstance(arg, bytes) else str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(value), value))
+    return b"".join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader) -> Any:
+    """
+    Reads one RESP reply: a string, an integer, a bulk string, an array of replies or nil.
+
+    Raises:
+        RedisError: If the reply is an error.
+    """
+    line = (await reader.readuntil(b"\r\n"))[:-2]
+    kind, value = line[:1], line[1:]
+    if kind == b"+":
+        return value.decode()
+    if kind == b"-":
+        raise RedisError(value.decode())
+    if kind == b":":
+        return int(value)
+    if kind == b"$":
+        if int(value) < 0:
+            return None
+        return (await reader.readexactly(int(value) + 2))[:-2]
+    if kind == b"*":
+        if int(value) < 0:
+            return None
+        return [await read_reply(reader) for _ in range(int(value))]
+    raise RedisError(f"unexpected reply {line!r}")
+
+
+def create_cache(url: str | None) -> MemoryCache | RedisCache:
+    """
+    Creates the cache backend configured by `CRMS_CACHE_URL`.
+
+    Args:
+        url (str | None): A redis:// URL, or None for the memory cache.
+
+    Returns:
+        MemoryCache | RedisCache: The backend.
+    """
+    if url and urlsplit(url).scheme == "redis":
+        return RedisCache(url, ttl=CACHE_TTL)
+    return MemoryCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL)
+
+
+# Responses of the read endpoints, keyed by request and by the versions of the tables they serialize
+response_cache = create_cache(CACHE_URL)
+
+
+def response_cache_key(request: Request, versions: tuple[int, ...]) -> str:
+    """
+    Identifies a response by its request, its authenticated user and the table versions it was read at.
+
+    Args:
+        request (Request): The request, after its user has been authenticated.
+        versions (tuple[int, ...]): The versions of the tables the response serializes.
+
+    Returns:
+        str: A fixed-length key.
+    """
+    parts = (
+        request.method,
+        request.url.path,
+        sorted(request.query_params.multi_items()),
+        getattr(request.state, "principal", None),
+        versions,
+    )
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+
+def encode_response(response: Response) -> bytes:
+    headers = [
+        (name.decode("latin-1"), value.decode("latin-1"))
+        for name, value in response.headers.raw
+        if name.decode("latin-1") not in UNCACHED_HEADERS
+    ]
+    return orjson.dumps(headers) + b"\n" + response.body
+
+
+def decode_response(value: bytes) -> Response:
+    headers, body = value.split(b"\n", 1)
+    response = Response(content=body)
+    for name, header in orjson.loads(headers):
+        response.headers.append(name, header)
+    return response
+
+
+class CachedResponse(Exception):
+    """
+    Raised by a cache dependency to answer the request with a cached response.
+    """
+
+    def __init__(self, response: Response) -> None:
+        self.response = response
+
+
+class CachedRoute(APIRoute):
+    """
+    A route answering with cached responses, and caching the responses it computes.
+
+    Lookups are made by a dependency of the route, which raises `CachedResponse` on a hit
+    and otherwise leaves `(cache, versions, ttl)` in `request.state.response_cache`; the
+    route stores complete 200 responses under the key of the user the request was then
+    authenticated as, so a cached response is only served to users its handler accepted.
+    """
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def cached_handler(request: Request) -> Response:
+            try:
+                response = await handler(request)
+            except CachedResponse as hit:
+                return hit.response
+
+            pending = getattr(request.state, "response_cache", None)
+            # Streamed responses have no body to keep
+            if pending is not None and response.status_code == 200 and hasattr(response, "body"):
+                cache, versions, ttl = pending
+                await cache.set(response_cache_key(request, versions), encode_response(response), ttl)
+            return response
+
+        return cached_handler
@@ -0,0 +1,258 @@
+import asyncio
+import logging
+from os import getenv
+
+from sqlalchemy import Connection, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+# Tables holding the row count of each counted table, and the purchases of each day
+ROW_COUNT_TABLE = "table_row_count"
+DAILY_PURCHASE_COUNT_TABLE = "daily_purchase_count"
+
+# Tables whose rows `/stats/` counts
+COUNTED_TABLES = ("admin", "comment", "customer", "invoice", "payment", "post", "vehicle")
+
+# Time zone whose calendar days, the days of the Jalali calendar, purchases are counted by
+PURCHASE_TIME_ZONE = "Asia/Tehran"
+
+# Seconds between the corrections of counter drift, 0 to disable
+COUNTER_RECONCILE_INTERVAL = int(getenv("CRMS_COUNTER_RECONCILE_INTERVAL", 3600))
+
+# Key of the advisory lock held by the one worker correcting counter drift
+COUNTER_RECONCILE_LOCK = 0x63726D735F636E74
+
+logger = logging.getLogger(__name__)
+
+# Adds the rows inserted or deleted by a statement to the count of their table, in the writing
+# transaction, so counts become visible together with the rows. TRUNCATE, which has no
+# transition table, resets the count.
+COUNT_ROWS_SQL = f"""
+CREATE OR REPLACE FUNCTION count_rows() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO {ROW_COUNT_TABLE} (table_name, row_count)
+        SELECT TG_TABLE_NAME, count(*) FROM new_rows HAVING count(*) > 0
+        ON CONFLICT (table_name) DO UPDATE SET row_count = {ROW_COUNT_TABLE}.row_count + EXCLUDED.row_count;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE {ROW_COUNT_TABLE} SET row_count = row_count - (SELECT count(*) FROM old_rows)
+        WHERE table_name = TG_TABLE_NAME AND EXISTS (SELECT FROM old_rows);
+    ELSE
+        UPDATE {ROW_COUNT_TABLE} SET row_count = 0 WHERE table_name = TG_TABLE_NAME;
+    END IF;
+    RETURN NULL;
+END
+$$
+"""
+
+# Day of a payment row, in the calendar of `PURCHASE_TIME_ZONE`
+PURCHASE_DAY = f"(payment_at AT TIME ZONE '{PURCHASE_TIME_ZONE}')::date"
+
+
+def _add_purchases(changes: str) -> str:
+    # Day rows are locked in date order, so concurrent payments cannot deadlock on them
+    return f"""
+        INSERT INTO {DAILY_PURCHASE_COUNT_TABLE} (day, purchase_count)
+        SELECT day, sum(change) FROM ({changes}) AS changes GROUP BY day HAVING sum(change) <> 0 ORDER BY day
+        ON CONFLICT (day) DO UPDATE
+        SET purchase_count = {DAILY_PURCHASE_COUNT_TABLE}.purchase_count + EXCLUDED.purchase_count;"""
+
+
+_NEW_PURCHASES = f"SELECT {PURCHASE_DAY} AS day, 1 AS change FROM new_rows WHERE payment_at IS NOT NULL"
+_OLD_PURCHASES = f"SELECT {PURCHASE_DAY} AS day, -1 AS change FROM old_rows WHERE payment_at IS NOT NULL"
+
+# Moves the payments a statement writes between the counts of the days they were made on;
+# updates that keep the payment time change no count
+COUNT_PURCHASES_SQL = f"""
+CREATE OR REPLACE FUNCTION count_purchases() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN{_add_purchases(_NEW_PURCHASES)}
+    ELSIF TG_OP = 'DELETE' THEN{_add_purchases(_OLD_PURCHASES)}
+    ELSIF TG_OP = 'UPDATE' THEN{_add_purchases(f"{_NEW_PURCHASES} UNION ALL {_OLD_PURCHASES}")}
+    ELSE
+        DELETE FROM {DAILY_PURCHASE_COUNT_TABLE};
+    END IF;
+    RETURN NULL;
+END
+$$
+"""
+
+
+def create_counter_triggers(connection: Connection) -> None:
+    """
+    Creates the triggers keeping the counts of `COUNTED_TABLES` and of the daily purchases,
+    replacing existing ones.
+
+    Triggers on one table fire in the order of their names, so a payment locks the count of
+    its table before the counts of its days.
+
+    Args:
+        connection (Connection): A connection to a database where the tables exist.
+    """
+    connection.exec_driver_sql(COUNT_ROWS_SQL)
+    connection.exec_driver_sql(COUNT_PURCHASES_SQL)
+    for table in COUNTED_TABLES:
+        for name, event, transition_tables in (
+            ("count_delete", "DELETE", "REFERENCING OLD TABLE AS old_rows"),
+            ("count_insert", "INSERT", "REFERENCING NEW TABLE AS new_rows"),
+            ("count_truncate", "TRUNCATE", ""),
+        ):
+            connection.exec_driver_sql(
+                f"CREATE OR REPLACE TRIGGER {table}_{name} AFTER {event} ON {table} {transition_tables} "
+                f"FOR EACH STATEMENT EXECUTE FUNCTION count_rows()"
+            )
+    for name, event, transition_tables in (
+        ("purchases_delete", "DELETE", "REFERENCING OLD TABLE AS old_rows"),
+        ("purchases_insert", "INSERT", "REFERENCING NEW TABLE AS new_rows"),
+        ("purchases_truncate", "TRUNCATE", ""),
+        ("purchases_update", "UPDATE", "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+    ):
+        connection.exec_driver_sql(
+            f"CREATE OR REPLACE TRIGGER payment_{name} AFTER {event} ON payment {transition_tables} "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION count_purchases()"
+        )
+
+
+def drop_counter_triggers(connection: Connection) -> None:
+    """
+    Drops the triggers and functions created by `create_counter_triggers`.
+    """
+    for table in COUNTED_TABLES:
+        for name in ("count_delete", "count_insert", "count_truncate"):
+            connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {table}_{name} ON {table}")
+    for name in ("purchases_delete", "purchases_insert", "purchases_truncate", "purchases_update"):
+        connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS payment_{name} ON payment")
+    connection.exec_driver_sql("DROP FUNCTION IF EXISTS count_rows()")
+    connection.exec_driver_sql("DROP FUNCTION IF EXISTS count_purchases()")
+
+
+def reconcile_row_count(connection: Connection, table: str) -> int:
+    """
+    Corrects the count of a table to its number of rows.
+
+    The rows and the count are read in the snapshot of one statement, without locking the count,
+    and their difference is added to the count as it is when the statement writes it. Writes
+    committed meanwhile have added their own rows to it, so the difference still holds, and
+    writers only wait for the correction, not for the rows to be counted.
+
+    Args:
+        connection (Connection): A connection in the transaction to correct the count in.
+        table (str): One of `COUNTED_TABLES`.
+
+    Returns:
+        int: The drift corrected, the counted rows minus the count.
+    """
+    return connection.execute(text(f"""
+        WITH drift AS (
+            SELECT (SELECT count(*) FROM {table})
+                - coalesce((SELECT row_count FROM {ROW_COUNT_TABLE} WHERE table_name = :table), 0) AS rows
+        ), corrected AS (
+            INSERT INTO {ROW_COUNT_TABLE} (table_name, row_count) SELECT :table, rows FROM drift
+            ON CONFLICT (table_name) DO UPDATE SET row_count = {ROW_COUNT_TABLE}.row_count + EXCLUDED.row_count
+        )
+        SELECT rows FROM drift
+    """), {"table": table}).scalar_one()
+
+
+def reconcile_purchase_counts(connection: Connection) -> int:
+    """
+    Corrects the purchase counts of every day to the payments made on it.
+
+    Like `reconcile_row_count`, the payments are counted without locking the counts, and only
+    the days whose count drifted are corrected, by adding the difference.
+
+    Args:
+        connection (Connection): A connection in the transaction to correct the counts in.
+
+    Returns:
+        int: The number of days whose count was corrected.
+    """
+    # Days are locked in date order, as the triggers lock them
+    return connection.execute(text(f"""
+        WITH actual AS (
+            SELECT {PURCHASE_DAY} AS day, count(*) AS purchase_count
+            FROM payment WHERE payment_at IS NOT NULL GROUP BY 1
+        ), drift AS (
+            SELECT day, coalesce(actual.purchase_count, 0) - coalesce(counted.purchase_count, 0) AS change
+            FROM actual FULL JOIN {DAILY_PURCHASE_COUNT_TABLE} AS counted USING (day)
+            WHERE coalesce(actual.purchase_count, 0) <> coalesce(counted.purchase_count, 0)
+        ), corrected AS (
+            INSERT INTO {DAILY_PURCHASE_COUNT_TABLE} (day, purchase_count) SELECT day, change FROM drift ORDER BY day
+            ON CONFLICT (day) DO UPDATE
+            SET purchase_count = {DAILY_PURCHASE_COUNT_TABLE}.purchase_count + EXCLUDED.purchase_count
+        )
+        SELECT count(*) FROM drift
+    """)).scalar_one()
+
+
+async def reconcile_counters(connection: AsyncConnection) -> dict[str, int]:
+    """
+    Corrects every counter, one table per transaction.
+
+    Two corrections of the same drift running at once would both add it, so they must only run on
+    one connection at a time, see `reconcile_counters_periodically`.
+
+    Args:
+        connection (AsyncConnection): A connection to the primary database, outside of a transaction.
+
+    Returns:
+        dict[str, int]: The drift corrected per counted table, and the number of corrected days as "purchases".
+    """
+    drift = {}
+    for table in COUNTED_TABLES:
+        async with connection.begin():
+            drift[table] = await connection.run_sync(reconcile_row_count, table)
+    async with connection.begin():
+        drift["purchases"] = await connection.run_sync(reconcile_purchase_counts)
+
+    if any(drift.values()):
+        logger.warning("Corrected counter drift: %s", {name: value for name, value in drift.items() if value})
+    return drift
+
+
+async def _lead_reconciliation(engine: AsyncEngine) -> AsyncConnection | None:
+    # The advisory lock is held by the session, until it is released or the connection ends
+    connection = await engine.connect()
+    try:
+        if await connection.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": COUNTER_RECONCILE_LOCK}):
+            await connection.commit()
+            return connection
+    except Exception:
+        await connection.invalidate()
+        raise
+    await connection.close()
+    return None
+
+
+async def _stop_leading_reconciliation(connection: AsyncConnection) -> None:
+    try:
+        await connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": COUNTER_RECONCILE_LOCK})
+        await connection.close()
+    except Exception:
+        # Discarding the connection ends its session, and releases the lock with it
+        await connection.invalidate()
+
+
+async def reconcile_counters_periodically(engine: AsyncEngine, interval: float = COUNTER_RECONCILE_INTERVAL) -> None:
+    """
+    Runs `reconcile_counters` every `interval` seconds until cancelled, logging failures.
+
+    Only one worker reconciles: the one holding the `COUNTER_RECONCILE_LOCK` advisory lock,
+    which it keeps on a connection of its own and reconciles on. The others try to take the
+    lock every `interval` seconds, so one of them takes over when the worker stops or fails.
+    """
+    leader = None
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                leader = leader or await _lead_reconciliation(engine)
+                if leader is not None:
+                    await reconcile_counters(leader)
+            except Exception:
+                logger.exception("Counter reconciliation failed")
+                if leader is not None:
+                    await _stop_leading_reconciliation(leader)
+                    leader = None
+    finally:
+        if leader is not None:
+            await _stop_leading_reconciliation(leader)
@@ -163,3 +163,19 @@ class CommentStatus(str, Enum):
     APPROVED = "approved"
     REJECTED = "rejected"
     SPAM = "spam"
+
+
+class StreamFormat(str, Enum):
+    NDJSON = "ndjson"
+    JSON = "json"
+
+
+class AnalyticsInterval(str, Enum):
+    DAY = "day"
+    WEEK = "week"
+    MONTH = "month"
+
+
+class AnalyticsDimension(str, Enum):
+    LOCATION = "location"
+    BRAND = "brand"
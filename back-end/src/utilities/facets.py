@@ -0,0 +1,96 @@
+from os import getenv
+from typing import Any, Hashable, Mapping, Protocol, Sequence, TypeVar
+
+from sqlalchemy import ColumnElement, Select, func
+from sqlalchemy.dialects.postgresql import array
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from utilities.ttl_cache import TTLCache
+
+FACET_CACHE_SIZE = int(getenv("CRMS_FACET_CACHE_SIZE", 1024))  # Filter combinations whose facets are kept
+FACET_CACHE_TTL = int(getenv("CRMS_FACET_CACHE_TTL", 60))  # Seconds facet counts are served from memory
+
+# Facet counts keyed by the endpoint, its filters and the versions of the tables it counts, so a
+# write is counted by the next request; the TTL drops the counts of versions no longer read
+facet_cache = TTLCache(maxsize=FACET_CACHE_SIZE, ttl=FACET_CACHE_TTL)
+
+
+class _Comparable(Protocol):
+    def __lt__(self, other: Any, /) -> bool: ...
+
+
+# A bound of a bucket: a number, a date, or any other value the database orders
+Bound = TypeVar("Bound", bound=_Comparable)
+
+
+def bucket(column: ColumnElement, bounds: Sequence[Bound]) -> ColumnElement:
+    """
+    Numbers the bucket of `bounds` a column's value falls in, to count it as a facet.
+
+    Args:
+        column (ColumnElement): The bucketed column.
+        bounds (Sequence[Bound]): The ascending lower bounds of the buckets, of the column's type.
+
+    Returns:
+        ColumnElement: The 0-based index of the bucket, -1 below the first bound.
+    """
+    return func.width_bucket(column, array(bounds)) - 1
+
+
+def bucket_ranges(bounds: Sequence[Bound], step: Any = 1) -> list[tuple[Bound, Bound | None]]:
+    """
+    Lists the inclusive ranges of the buckets numbered by `bucket`, the last one unbounded.
+
+    Args:
+        bounds (Sequence[Bound]): The ascending lower bounds of the buckets.
+        step (Any): The distance between consecutive values, such as 1 for integers or a day
+            for dates; each range ends one step before the next bound.
+
+    Returns:
+        list[tuple[Bound, Bound | None]]: The first and last value of each bucket.
+    """
+    return [(low, high - step) for low, high in zip(bounds, bounds[1:])] + [(bounds[-1], None)]
+
+
+async def count_facets(
+        session: AsyncSession,
+        query: Select,
+        facets: Mapping[str, ColumnElement],
+        *,
+        cache_key: Hashable | None = None,
+) -> dict[str, dict[Any, int]]:
+    """
+    Counts the rows of a filtered query per value of each facet, in one grouped query.
+
+    The facets are the grouping sets of the query, so the filtered rows are read once
+    however many facets there are. Facet values that no row has are left out.
+
+    Args:
+        session (AsyncSession): The session to run the query in.
+        query (Select): A query selecting the filtered model; its columns are replaced.
+        facets (Mapping[str, ColumnElement]): The facet names and the expressions they count.
+        cache_key (Hashable | None): Identifies the endpoint, filters and table versions, to reuse
+            the counts for later requests with the same filters; not cached when None.
+
+    Returns:
+        dict[str, dict[Any, int]]: The number of rows per value, for each facet.
+    """
+    if cache_key is not None and (counts := facet_cache.get(cache_key)) is not None:
+        return counts
+
+    expressions = list(facets.values())
+    # GROUPING() sets the bit of every expression a row is not grouped by, the first one leftmost
+    grouping_query = query.with_only_columns(
+        *expressions, func.grouping(*expressions), func.count()
+    ).group_by(func.grouping_sets(*expressions))
+
+    names = list(facets)
+    counts = {name: {} for name in names}
+    all_bits = (1 << len(names)) - 1
+    for *values, grouping, count in await session.execute(grouping_query):
+        position = len(names) - (all_bits ^ grouping).bit_length()
+        counts[names[position]][values[position]] = count
+
+    if cache_key is not None:
+        facet_cache.set(cache_key, counts)
+    return counts
@@ -1,8 +1,11 @@
+import datetime as gregorian
+from typing import Annotated
 from zoneinfo import ZoneInfo
 
 from dateutil.relativedelta import relativedelta
 from jdatetime import datetime
 from fastapi import HTTPException
+from pydantic import BeforeValidator
 
 
 def validate_password_value(value: str) -> str | HTTPException:
@@ -148,3 +151,18 @@ def validate_payment_datetime(value: str) -> str | HTTPException:
         )
 
     return str(value)
+
+
+def jalali_to_date(value: str) -> gregorian.date:
+    # Typed equivalent of a Jalali date string ("1403/05/01"), for the columns shadowing them
+    return datetime.strptime(value, "%Y/%m/%d").togregorian().date()
+
+
+def jalali_to_datetime(value: str) -> gregorian.datetime:
+    # Typed equivalent of a Jalali date and time string ("1403/05/01 20:05:04"), in Tehran time
+    return datetime.strptime(value, "%Y/%m/%d %H:%M:%S").togregorian().replace(tzinfo=ZoneInfo("Asia/Tehran"))
+
+
+# Query parameter types taking the Jalali format of the API and giving values of the typed columns
+JalaliDate = Annotated[gregorian.date, BeforeValidator(jalali_to_date)]
+JalaliDateTime = Annotated[gregorian.datetime, BeforeValidator(jalali_to_datetime)]
@@ -0,0 +1,94 @@
+from typing import Any
+
+from psycopg2.extras import execute_values
+
+from utilities.fields_validator import jalali_to_date, jalali_to_datetime
+
+# Typed columns shadowing the Jalali strings the API reads and writes, per table: (string column,
+# typed column, converter). Queries filter, sort and bucket on the typed columns, which PostgreSQL
+# can index, compare and do arithmetic on; the strings stay the format of the API.
+JALALI_COLUMNS = {
+    "rental": (
+        ("rental_start_date", "rental_start_on", jalali_to_date),
+        ("rental_end_date", "rental_end_on", jalali_to_date),
+    ),
+    "payment": (
+        ("payment_datetime", "payment_at", jalali_to_datetime),
+    ),
+    "vehicleinsurance": (
+        ("start_date", "start_on", jalali_to_date),
+        ("expiration_date", "expiration_on", jalali_to_date),
+    ),
+}
+
+# Rows read and converted per statement by `backfill_jalali_columns`
+BACKFILL_BATCH_SIZE = 1000
+
+
+def sync_jalali_columns(mapper: Any, connection: Any, target: Any) -> None:
+    """
+    Sets the typed columns of an instance from its Jalali strings; a `before_insert` and
+    `before_update` listener of the models in `JALALI_COLUMNS`.
+    """
+    for string_column, typed_column, convert in JALALI_COLUMNS[mapper.local_table.name]:
+        value = getattr(target, string_column)
+        setattr(target, typed_column, convert(value) if value is not None else None)
+
+
+def _convert(convert: Any, value: str | None) -> Any:
+    try:
+        return convert(value) if value is not None else None
+    except ValueError:
+        # Rows written before the strings were validated keep an empty typed column
+        return None
+
+
+def backfill_jalali_columns(cursor: Any) -> int:
+    """
+    Fills the typed columns left empty by writes that bypass the models, such as migrations
+    and restores of backups taken before the columns existed. The rows are read and updated
+    `BACKFILL_BATCH_SIZE` at a time.
+
+    Args:
+        cursor (Any): A psycopg2 cursor, in the transaction to fill the columns in.
+
+    Returns:
+        int: The number of rows filled.
+    """
+    filled = 0
+    for table, columns in JALALI_COLUMNS.items():
+        strings = ", ".join(string_column for string_column, _, _ in columns)
+        empty = " OR ".join(f"{typed_column} IS NULL" for _, typed_column, _ in columns)
+        assignments = ", ".join(f"{typed_column} = batch.{typed_column}" for _, typed_column, _ in columns)
+        batch_columns = ", ".join(typed_column for _, typed_column, _ in columns)
+        # The casts of the first row type the whole VALUES list
+        template = "(%s::uuid, " + ", ".join(
+            f"%s::{'timestamptz' if convert is jalali_to_datetime else 'date'}" for _, _, convert in columns
+        ) + ")"
+
+        # Rows are read a batch at a time, in the order of their ids, so the rows whose strings
+        # do not convert are passed once and the table is never held in memory
+        last_id = "00000000-0000-0000-0000-000000000000"
+        while True:
+            cursor.execute(
+                f"SELECT id, {strings} FROM {table} WHERE ({empty}) AND id > %s ORDER BY id LIMIT %s",
+                (last_id, BACKFILL_BATCH_SIZE),
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            batch = [
+                (str(row[0]), *(_convert(convert, value) for (_, _, convert), value in zip(columns, row[1:])))
+                for row in rows
+            ]
+            execute_values(
+                cursor,
+                f"UPDATE {table} SET {assignments} FROM (VALUES %s) AS batch (id, {batch_columns}) "
+                f"WHERE {table}.id = batch.id",
+                batch,
+                template=template,
+                page_size=BACKFILL_BATCH_SIZE,
+            )
+            filled += len(rows)
+            last_id = str(rows[-1][0])
+    return filled
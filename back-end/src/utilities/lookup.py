@@ -0,0 +1,94 @@
+from os import getenv
+from typing import Annotated, Any
+
+from pydantic import StringConstraints
+from sqlalchemy import Select, case, func, literal, literal_column, or_, select, text as sql_text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Expressions a lookup compares the text with, for the customer and admin tables. Each has a trigram
+# index over the same expression, so the text here must stay identical to the migrations'.
+LOOKUP_EXPRESSIONS = {
+    "name": "first_name || ' ' || last_name",
+    "username": "username",
+    "phone": "phone::text",
+    "national_id": "national_id",
+}
+
+# Most matching rows scored for one lookup; a few digits of a phone number can match a large
+# part of the table, and scoring every match would cost a read of all of them
+LOOKUP_CANDIDATES = int(getenv("CRMS_LOOKUP_CANDIDATES", 1_000))
+
+# The text of a lookup, whose length is checked once the surrounding spaces are removed
+LookupText = Annotated[str, StringConstraints(strip_whitespace=True, min_length=3, max_length=100)]
+
+# Whether pg_trgm is installed, read once per process by `has_trigram_extension`
+_trigram_extension: bool | None = None
+
+
+async def has_trigram_extension(session: AsyncSession) -> bool:
+    """
+    Tells whether the pg_trgm extension is installed in the database of the session.
+
+    The migrations only create it, and the trigram indexes, where the server provides it,
+    and tables created from the models never have it.
+    """
+    global _trigram_extension
+    if _trigram_extension is None:
+        _trigram_extension = await session.scalar(
+            sql_text("SELECT EXISTS (SELECT FROM pg_extension WHERE extname = 'pg_trgm')")
+        )
+    return _trigram_extension
+
+
+def fuzzy_lookup(model: Any, text: str, *, limit: int, trigram: bool = True) -> Select:
+    """
+    Selects the rows most similar to a text in any of the lookup expressions, with their similarity.
+
+    A row matches when the text is close to some part of one of its expressions, e.g. a
+    misspelled name or a few digits of a phone number (`pg_trgm`'s word similarity, with
+    its `word_similarity_threshold`). The first `LOOKUP_CANDIDATES` matches found by the
+    trigram indexes are scored, and the best `limit` of them returned.
+
+    Without pg_trgm, a row matches when one of its expressions contains the text, ignoring
+    case, and its similarity is the share of that expression the text covers.
+
+    Args:
+        model (Any): The table model, `Customer` or `Admin`.
+        text (str): The text given by the user.
+        limit (int): Maximum number of rows returned.
+        trigram (bool): Whether pg_trgm is installed, see `has_trigram_extension`.
+
+    Returns:
+        Select: A query of `(instance, similarity)` rows, the most similar first.
+    """
+    expressions = [literal_column(f"({expression})") for expression in LOOKUP_EXPRESSIONS.values()]
+    if not trigram:
+        return _substring_lookup(model, text, expressions, limit=limit)
+
+    # `column %> text` is `text <% column`, written with the column first so the index applies
+    matches = or_(*(expression.op("%>")(text) for expression in expressions))
+    candidates = select(model.id).where(matches).limit(LOOKUP_CANDIDATES)
+
+    similarity = func.greatest(
+        *(func.word_similarity(text, expression) for expression in expressions)
+    ).label("similarity")
+    return (
+        select(model, similarity)
+        .where(model.id.in_(candidates))
+        .order_by(similarity.desc(), model.id)
+        .limit(limit)
+    )
+
+
+def _substring_lookup(model: Any, text: str, expressions: list, *, limit: int) -> Select:
+    matches = [expression.icontains(text, autoescape=True) for expression in expressions]
+    similarity = func.greatest(*(
+        case((match, literal(float(len(text))) / func.length(expression)), else_=0.0)
+        for match, expression in zip(matches, expressions)
+    )).label("similarity")
+    return (
+        select(model, similarity)
+        .where(or_(*matches))
+        .order_by(similarity.desc(), model.id)
+        .limit(limit)
+    )
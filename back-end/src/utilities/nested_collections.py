@@ -0,0 +1,87 @@
+from collections import defaultdict
+from os import getenv
+from typing import Any, Sequence
+
+from sqlalchemy import func, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from sqlalchemy.orm.attributes import InstrumentedAttribute, set_committed_value
+
+# Number of most recent children embedded in a relational response for each capped collection
+NESTED_COLLECTION_LIMIT = int(getenv("CRMS_NESTED_COLLECTION_LIMIT", 10))
+
+
+async def load_latest_children(
+        session: AsyncSession,
+        parents: Sequence[Any],
+        *relationships: InstrumentedAttribute,
+        limit: int | None = None,
+) -> None:
+    """
+    Loads only the latest children of each parent into one-to-many relationships.
+
+    For each relationship a single window query ranks the children of all given parents
+    by `created_at` (newest first), returns the top `limit` rows per parent and the total
+    number of children alongside them, so the remaining rows never leave the database.
+    The total is kept on the parent's instance state and read with `collection_total`.
+
+    Args:
+        session (AsyncSession): The session the parents were loaded with.
+        parents (Sequence[Any]): The parent instances, all of the relationships' class.
+        *relationships (InstrumentedAttribute): The collections to load, e.g. `Vehicle.rentals`.
+        limit (int | None): Children kept per parent; `NESTED_COLLECTION_LIMIT` if not given.
+    """
+    parents = [parent for parent in parents if parent is not None]
+    if not parents:
+        return
+
+    limit = NESTED_COLLECTION_LIMIT if limit is None else limit
+    parent_ids = {parent.id for parent in parents}
+
+    for relationship in relationships:
+        child = relationship.property.mapper.class_
+        [(_, foreign_key)] = relationship.property.local_remote_pairs
+
+        ranked = (
+            select(
+                child,
+                func.row_number().over(
+                    partition_by=foreign_key,
+                    order_by=(child.created_at.desc(), child.id.desc()),
+                ).label("position"),
+                func.count().over(partition_by=foreign_key).label("total"),
+            )
+            .where(foreign_key.in_(parent_ids))
+            .subquery()
+        )
+        ranked_child = aliased(child, ranked)
+        query = (
+            select(ranked_child, ranked.c.total)
+            .where(ranked.c.position <= limit)
+            .order_by(ranked.c[foreign_key.key], ranked.c.position)
+        )
+
+        children, totals = defaultdict(list), {}
+        for instance, total in (await session.execute(query)).all():
+            parent_id = getattr(instance, foreign_key.key)
+            children[parent_id].append(instance)
+            totals[parent_id] = total
+
+        key = relationship.key
+        for parent in parents:
+            set_committed_value(parent, key, children.get(parent.id, []))
+            inspect(parent).info[f"{key}_total"] = totals.get(parent.id, 0)
+
+
+def collection_total(instance: Any, key: str) -> int | None:
+    """
+    Returns the total number of children recorded by `load_latest_children`.
+
+    Args:
+        instance (Any): The parent instance.
+        key (str): The name of the relationship, e.g. "rentals".
+
+    Returns:
+        int | None: The total, or None if the collection was not loaded with a cap.
+    """
+    return inspect(instance).info.get(f"{key}_total")
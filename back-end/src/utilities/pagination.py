@@ -0,0 +1,123 @@
+import base64
+import binascii
+from datetime import date, datetime
+from typing import Any, Sequence
+
+import orjson
+from fastapi import HTTPException, Response
+from sqlalchemy import Select, tuple_
+from sqlalchemy.orm import InstrumentedAttribute
+
+# Response header carrying the cursor of the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(*values: Any) -> str:
+    """
+    Encodes the sort key of the last row of a page into an opaque cursor.
+
+    Args:
+        *values (Any): The sort column value followed by the row id.
+
+    Returns:
+        str: A URL-safe cursor to pass back as the `cursor` query parameter.
+    """
+    # asyncpg returns its own UUID type, which orjson only serializes through `default`
+    return base64.urlsafe_b64encode(orjson.dumps(values, default=str)).decode().rstrip("=")
+
+
+def _coerce(column: InstrumentedAttribute, value: Any) -> Any:
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        # Types such as SQLModel's AutoString do not declare one; their values are strings
+        return value
+    if value is None or isinstance(value, python_type):
+        return value
+    if python_type in (date, datetime):
+        return python_type.fromisoformat(value)
+    return python_type(value)
+
+
+def decode_cursor(cursor: str, *columns: InstrumentedAttribute) -> tuple[Any, ...]:
+    """
+    Decodes a cursor created by `encode_cursor` into values of the given columns.
+
+    Args:
+        cursor (str): The cursor received from the client.
+        *columns (InstrumentedAttribute): The columns the cursor values belong to, in order.
+
+    Returns:
+        tuple[Any, ...]: The values, converted to the columns' Python types.
+
+    Raises:
+        HTTPException: If the cursor is malformed or does not match the columns.
+    """
+    try:
+        values = orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError
+        return tuple(_coerce(column, value) for column, value in zip(columns, values))
+    except (binascii.Error, orjson.JSONDecodeError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="مکان نما نامعتبر است")
+
+
+def paginate(
+        query: Select,
+        model: Any,
+        *,
+        cursor: str | None,
+        offset: int,
+        limit: int,
+        sort_column: InstrumentedAttribute | None = None,
+) -> Select:
+    """
+    Orders a query by a sort column and the primary key, then selects one page of it.
+
+    With a cursor, the page starts right after the row the cursor points to, using a
+    row-value comparison that a composite `(sort column, id)` index answers directly,
+    so the cost of a page does not grow with its depth. Without one, `offset` is used.
+
+    Rows whose sort column is NULL are left out: a row-value comparison is never true for
+    them, so they could not be reached by cursor, and matching them as well would keep the
+    index from answering the comparison.
+
+    Args:
+        query (Select): The query to paginate.
+        model (Any): The table model selected by the query.
+        cursor (str | None): The cursor of the previous page, if any.
+        offset (int): Rows to skip when no cursor is given.
+        limit (int): Maximum number of rows in the page.
+        sort_column (InstrumentedAttribute | None): The column to sort by; `created_at` if not given.
+
+    Returns:
+        Select: The paginated query.
+    """
+    sort_column = model.created_at if sort_column is None else sort_column
+    query = query.order_by(sort_column, model.id).limit(limit)
+    if sort_column.expression.nullable:
+        query = query.where(sort_column.is_not(None))
+
+    if cursor is None:
+        return query.offset(offset)
+
+    sort_value, row_id = decode_cursor(cursor, sort_column, model.id)
+    if sort_value is None:
+        # Only rows with a sort value are listed, so no page ends with one without it
+        raise HTTPException(status_code=400, detail="مکان نما نامعتبر است")
+    return query.where(tuple_(sort_column, model.id) > (sort_value, row_id))
+
+
+def set_next_cursor(response: Response, items: Sequence[Any], limit: int, sort_key: str = "created_at") -> None:
+    """
+    Sets the cursor of the next page on the response, when the page is full.
+
+    Args:
+        response (Response): The response of the list endpoint.
+        items (Sequence[Any]): The rows of the current page.
+        limit (int): The page size that was requested.
+        sort_key (str): The attribute the page was sorted by.
+    """
+    if items and len(items) >= limit:
+        last = items[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(getattr(last, sort_key), last.id)
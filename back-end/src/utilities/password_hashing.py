@@ -0,0 +1,110 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from passlib.context import CryptContext
+
+# Number of worker processes used for hashing and verifying passwords
+PASSWORD_HASH_WORKERS = int(os.getenv("CRMS_PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+
+# Password hashing context using PBKDF2-HMAC-SHA512
+pwd_context = CryptContext(schemes=["pbkdf2_sha512"], deprecated="auto")
+
+_executor: ProcessPoolExecutor | None = None
+
+
+def get_password_hash(password: str) -> str:
+    """
+    Hashes the provided password using the PBKDF2-HMAC-SHA512 algorithm.
+
+    Args:
+        password (str): The plain password to be hashed.
+
+    Returns:
+        str: The hashed version of the provided password.
+
+    This function hashes the provided password using the `hash` method from
+    passlib's CryptContext. It's commonly used for securely storing passwords.
+    """
+    return pwd_context.hash(password)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """
+    Verifies whether the provided plain password matches the hashed password.
+
+    Args:
+        plain_password (str): The password in plain text to be verified.
+        hashed_password (str): The hashed version of the password to compare against.
+
+    Returns:
+        bool: True if the plain password matches the hashed password, otherwise False.
+
+    This function uses the `verify` method from passlib's CryptContext to compare
+    the plain password with the stored hashed password. It handles exceptions gracefully
+    and ensures the function always returns a boolean result.
+    """
+    try:
+        return pwd_context.verify(plain_password, hashed_password)
+    except:
+        # Log the exception or handle the error in a more meaningful way
+        return False
+
+
+def get_password_executor() -> ProcessPoolExecutor:
+    """
+    Returns the process pool used for password hashing, creating it on first use.
+
+    Worker processes are started with the "spawn" method so they never inherit
+    the event loop, database connections or other state of the API worker.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=PASSWORD_HASH_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def shutdown_password_executor() -> None:
+    """
+    Shuts down the password hashing process pool if it has been started.
+    """
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+
+
+async def get_password_hash_async(password: str) -> str:
+    """
+    Hashes the provided password in the password process pool.
+
+    Args:
+        password (str): The plain password to be hashed.
+
+    Returns:
+        str: The hashed version of the provided password.
+
+    The CPU-bound PBKDF2 work runs outside the event loop, so other requests
+    handled by the same worker are not blocked while the hash is computed.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_password_executor(), get_password_hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """
+    Verifies a password against its hash in the password process pool.
+
+    Args:
+        plain_password (str): The password in plain text to be verified.
+        hashed_password (str): The hashed version of the password to compare against.
+
+    Returns:
+        bool: True if the plain password matches the hashed password, otherwise False.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_password_executor(), verify_password, plain_password, hashed_password)
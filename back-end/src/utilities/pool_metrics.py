@@ -0,0 +1,92 @@
+import time
+from typing import Any
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# Upper bounds (in milliseconds) of the connection checkout time histogram buckets
+CHECKOUT_TIME_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class PoolMetrics:
+    """
+    Counters and a checkout time histogram for one connection pool.
+
+    A checkout "waits" when every pooled and overflow connection was already in use,
+    so the request had to queue until another request returned its connection.
+    """
+
+    def __init__(self) -> None:
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.wait_time_total = 0.0
+        self.checkout_time_buckets = [0] * (len(CHECKOUT_TIME_BUCKETS_MS) + 1)
+
+    def record_checkout(self, seconds: float, waited: bool, timed_out: bool) -> None:
+        self.checkouts += 1
+        if waited:
+            self.waits += 1
+            self.wait_time_total += seconds
+        if timed_out:
+            self.timeouts += 1
+
+        milliseconds = seconds * 1000
+        for index, upper_bound in enumerate(CHECKOUT_TIME_BUCKETS_MS):
+            if milliseconds <= upper_bound:
+                self.checkout_time_buckets[index] += 1
+                break
+        else:
+            self.checkout_time_buckets[-1] += 1
+
+    def snapshot(self, pool: "InstrumentedAsyncQueuePool") -> dict[str, Any]:
+        # Buckets are reported cumulatively, the way Prometheus histograms are
+        cumulative, histogram = 0, {}
+        for upper_bound, count in zip((*CHECKOUT_TIME_BUCKETS_MS, "+Inf"), self.checkout_time_buckets):
+            cumulative += count
+            histogram[str(upper_bound)] = cumulative
+
+        return {
+            "pool_size": pool.size(),
+            "max_overflow": pool.max_overflow,
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "checkouts": self.checkouts,
+            "waits": self.waits,
+            "timeouts": self.timeouts,
+            "wait_time_total_ms": round(self.wait_time_total * 1000, 3),
+            "checkout_time_ms_histogram": histogram,
+        }
+
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """
+    The default asyncio queue pool, recording how long each connection checkout takes.
+    """
+
+    def __init__(self, *args: Any, **kw: Any) -> None:
+        super().__init__(*args, **kw)
+        self.metrics = PoolMetrics()
+
+    @property
+    def max_overflow(self) -> int:
+        return self._max_overflow
+
+    def connect(self):
+        exhausted = self.checkedin() == 0 and -1 < self._max_overflow <= self._overflow
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.metrics.record_checkout(time.perf_counter() - start, waited=True, timed_out=True)
+            raise
+
+        self.metrics.record_checkout(time.perf_counter() - start, waited=exhausted, timed_out=False)
+        return connection
+
+    def recreate(self) -> "InstrumentedAsyncQueuePool":
+        # Keep the counters when the engine is disposed and the pool rebuilt
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
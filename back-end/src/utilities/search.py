@@ -0,0 +1,232 @@
+import inspect
+from dataclasses import dataclass
+from typing import Any, Literal, Mapping, Sequence
+
+from fastapi import HTTPException, Query, Response
+from sqlalchemy import ColumnElement, Select, and_, not_, or_
+from sqlalchemy.orm import InstrumentedAttribute
+
+from utilities.enumerables import LogicalOperator
+from utilities.pagination import paginate, set_next_cursor
+
+
+@dataclass(frozen=True, slots=True)
+class Exact:
+    """
+    Matches a column against one value, or any of several when the parameter is repeated.
+
+    The parameter is named after the column, or `name` when the column shadows another
+    one, e.g. a typed column whose values the API reads and writes as Jalali strings.
+    """
+    column: InstrumentedAttribute
+    type: Any
+    name: str | None = None
+
+    @property
+    def key(self) -> str:
+        return self.name or self.column.key
+
+    def parameters(self) -> list[inspect.Parameter]:
+        return [_parameter(self.key, list[self.type] | None, Query(default=None))]
+
+    def condition(self, values: dict[str, Any]) -> ColumnElement | None:
+        matches = values[self.key]
+        if not matches:
+            return None
+        return self.column == matches[0] if len(matches) == 1 else self.column.in_(matches)
+
+
+@dataclass(frozen=True, slots=True)
+class Range:
+    """
+    Matches a column between `<name>_min` and `<name>_max`, both inclusive and optional.
+
+    With `minimum_alias`, `<name>` is also accepted as the minimum, which is how the
+    search endpoints filtered amounts before they supported ranges. `<name>` is the
+    column's name unless given, as for `Exact`.
+    """
+    column: InstrumentedAttribute
+    type: Any
+    minimum_alias: bool = False
+    name: str | None = None
+
+    @property
+    def key(self) -> str:
+        return self.name or self.column.key
+
+    def parameters(self) -> list[inspect.Parameter]:
+        names = [f"{self.key}_min", f"{self.key}_max"]
+        if self.minimum_alias:
+            names.insert(0, self.key)
+        return [_parameter(name, self.type | None, None) for name in names]
+
+    def condition(self, values: dict[str, Any]) -> ColumnElement | None:
+        minimum = values[f"{self.key}_min"]
+        if minimum is None and self.minimum_alias:
+            minimum = values[self.key]
+        maximum = values[f"{self.key}_max"]
+
+        bounds = []
+        if minimum is not None:
+            bounds.append(self.column >= minimum)
+        if maximum is not None:
+            bounds.append(self.column <= maximum)
+        return and_(*bounds) if bounds else None
+
+
+@dataclass(frozen=True, slots=True)
+class Contains:
+    """
+    Matches a text column containing the value, ignoring case.
+    """
+    column: InstrumentedAttribute
+
+    @property
+    def key(self) -> str:
+        return self.column.key
+
+    def parameters(self) -> list[inspect.Parameter]:
+        return [_parameter(self.key, str | None, None)]
+
+    def condition(self, values: dict[str, Any]) -> ColumnElement | None:
+        value = values[self.key]
+        return self.column.ilike(f"%{value}%") if value else None
+
+
+def _parameter(name: str, annotation: Any, default: Any) -> inspect.Parameter:
+    return inspect.Parameter(name, inspect.Parameter.KEYWORD_ONLY, annotation=annotation, default=default)
+
+
+@dataclass(frozen=True, slots=True)
+class Search:
+    """
+    The parsed parameters of one search request.
+
+    `filters` holds the given filter values by parameter name, in a canonical order, so
+    that requests filtering the same rows share it whatever their page and sort order.
+    """
+    model: Any
+    conditions: Sequence[ColumnElement]
+    filters: tuple[tuple[str, Any], ...]
+    operator: LogicalOperator
+    sort_column: InstrumentedAttribute
+    cursor: str | None
+    offset: int
+    limit: int
+
+    @property
+    def key(self) -> tuple:
+        """
+        Identifies the searched rows, to cache what is computed from all of them.
+        """
+        return self.model.__tablename__, self.operator, self.filters
+
+    def where(self, query: Select) -> Select:
+        """
+        Filters a query by the search conditions.
+
+        Args:
+            query (Select): The query selecting the searched model.
+
+        Returns:
+            Select: The filtered query.
+        """
+        if self.operator == LogicalOperator.AND:
+            return query.where(and_(*self.conditions))
+        if self.operator == LogicalOperator.OR:
+            return query.where(or_(*self.conditions))
+        # NOT matches the rows that meet none of the conditions
+        return query.where(not_(or_(*self.conditions)))
+
+    def apply(self, query: Select) -> Select:
+        """
+        Filters a query by the search conditions and selects the requested page of it.
+
+        Args:
+            query (Select): The query selecting the searched model.
+
+        Returns:
+            Select: The filtered and paginated query.
+        """
+        return paginate(
+            self.where(query), self.model, cursor=self.cursor, offset=self.offset, limit=self.limit,
+            sort_column=self.sort_column,
+        )
+
+    def set_next_cursor(self, response: Response, items: Sequence[Any]) -> None:
+        set_next_cursor(response, items, self.limit, sort_key=self.sort_column.key)
+
+
+class SearchSpec:
+    """
+    Declares the searchable fields and sort keys of a model, and parses search requests for it.
+
+    An instance is a FastAPI dependency: it exposes one query parameter per field (or
+    `<name>_min`/`<name>_max` for ranges) along with `operator`, `sort`, `cursor`, `offset`
+    and `limit`, and resolves to a `Search`. Every field and sort key must be backed by an
+    index; a sort key's index is on `(column, id)` so its pages can be read with a cursor.
+    Sort keys are named after their columns, or given as a mapping of names to columns.
+
+    Example:
+        VEHICLE_SEARCH = SearchSpec(
+            Vehicle,
+            Exact(Vehicle.status, CarStatus),
+            Range(Vehicle.year, int),
+            sort_keys=(Vehicle.year,),
+        )
+
+        async def search_vehicles(*, search: Search = Depends(VEHICLE_SEARCH)): ...
+    """
+
+    def __init__(
+            self,
+            model: Any,
+            *fields: Exact | Range | Contains,
+            sort_keys: Sequence[InstrumentedAttribute] | Mapping[str, InstrumentedAttribute] = (),
+    ):
+        self.model = model
+        self.fields = fields
+        if not isinstance(sort_keys, Mapping):
+            sort_keys = {column.key: column for column in sort_keys}
+        self.sort_keys = {"created_at": model.created_at, **sort_keys}
+
+        self.__signature__ = inspect.Signature([
+            *(parameter for field in fields for parameter in field.parameters()),
+            _parameter("operator", LogicalOperator, inspect.Parameter.empty),
+            _parameter("sort", Literal[tuple(self.sort_keys)], "created_at"),
+            _parameter("cursor", str | None, None),
+            _parameter("offset", int, Query(default=0, ge=0)),
+            _parameter("limit", int, Query(default=100, le=100)),
+        ])
+
+    async def __call__(
+            self,
+            *,
+            operator: LogicalOperator,
+            sort: str,
+            cursor: str | None,
+            offset: int,
+            limit: int,
+            **values: Any,
+    ) -> Search:
+        conditions = [
+            condition for field in self.fields if (condition := field.condition(values)) is not None
+        ]
+        if not conditions:
+            raise HTTPException(status_code=400, detail="هیچ مقداری برای جست و جو وجود ندارد")
+
+        filters = tuple(
+            (name, tuple(sorted(value, key=str)) if isinstance(value, list) else value)
+            for name, value in sorted(values.items())
+            if value is not None and value != []
+        )
+        return Search(
+            model=self.model,
+            conditions=conditions,
+            filters=filters,
+            operator=operator,
+            sort_column=self.sort_keys[sort],
+            cursor=cursor,
+            offset=offset,
+            limit=limit,
+        )
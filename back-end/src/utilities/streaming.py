@@ -0,0 +1,130 @@
+import io
+from os import getenv
+from typing import Any, AsyncIterator, Sequence
+
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import InstrumentedAttribute
+
+from utilities.enumerables import StreamFormat
+from utilities.nested_collections import load_latest_children
+
+# Rows fetched from the server-side cursor, and serialized, per round trip
+STREAM_BATCH_SIZE = int(getenv("CRMS_STREAM_BATCH_SIZE", 500))
+
+MEDIA_TYPES = {
+    StreamFormat.NDJSON: "application/x-ndjson",
+    StreamFormat.JSON: "application/json",
+}
+
+
+async def stream_rows(
+        engine: AsyncEngine,
+        query: Select,
+        schema: type[BaseModel],
+        stream_format: StreamFormat,
+        capped_collections: Sequence[InstrumentedAttribute] = (),
+) -> AsyncIterator[bytes]:
+    """
+    Serializes the rows of a query batch by batch, as they arrive from a server-side cursor.
+
+    Each batch is validated through the response schema and written out before the next
+    one is fetched, then removed from the session, so memory use depends on the batch
+    size and not on the number of rows.
+
+    Args:
+        engine (AsyncEngine): The engine to read from.
+        query (Select): The ordered query selecting the rows.
+        schema (type[BaseModel]): The response model of a single row.
+        stream_format (StreamFormat): Newline-delimited JSON objects, or one JSON array.
+        capped_collections (Sequence[InstrumentedAttribute]): Collections loaded with `load_latest_children`.
+
+    Yields:
+        bytes: The serialized rows, one batch at a time.
+    """
+    ndjson = stream_format == StreamFormat.NDJSON
+    if not ndjson:
+        yield b"["
+
+    first = True
+    async with AsyncSession(engine) as session:
+        result = await session.stream_scalars(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+        async for rows in result.partitions():
+            await load_latest_children(session, rows, *capped_collections)
+            serialized = [schema.model_validate(row).model_dump_json().encode() for row in rows]
+            if ndjson:
+                yield b"\n".join(serialized) + b"\n"
+            else:
+                yield (b"" if first else b",") + b",".join(serialized)
+            first = False
+            # The identity map must outlive the open result, so rows are detached one by one
+            for row in rows:
+                session.expunge(row)
+
+    if not ndjson:
+        yield b"]"
+
+
+def stream_list(
+        session: AsyncSession,
+        query: Select,
+        model: Any,
+        *,
+        schema: type[BaseModel],
+        stream_format: StreamFormat,
+        capped_collections: Sequence[InstrumentedAttribute] = (),
+) -> StreamingResponse:
+    """
+    Streams every row of a list query instead of returning one page of it.
+
+    The rows are sorted like the paginated list, by `created_at` and the primary key. They
+    are read in a session of their own on the engine of the request's session, because
+    the request's session is closed before the response body is sent.
+
+    Args:
+        session (AsyncSession): The session of the request.
+        query (Select): The filtered list query, without pagination.
+        model (Any): The table model selected by the query.
+        schema (type[BaseModel]): The response model of a single row.
+        stream_format (StreamFormat): The requested format.
+        capped_collections (Sequence[InstrumentedAttribute]): Collections loaded with `load_latest_children`.
+
+    Returns:
+        StreamingResponse: The response streaming the rows.
+    """
+    query = query.order_by(model.created_at, model.id)
+    return StreamingResponse(
+        stream_rows(session.bind, query, schema, stream_format, capped_collections),
+        media_type=MEDIA_TYPES[stream_format],
+    )
+
+
+class ZipStream(io.RawIOBase):
+    """
+    A write-only, unseekable file collecting what a `zipfile.ZipFile` writes to it, so the
+    archive can be sent on as it is produced instead of being built whole in memory.
+
+    `zipfile` writes the sizes of each entry after its data when the file cannot seek, so
+    entries opened with `ZipFile.open(name, "w")` can be of any length.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        """
+        Returns the bytes written since the last call, and forgets them.
+        """
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
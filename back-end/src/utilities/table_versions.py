@@ -0,0 +1,97 @@
+import hashlib
+from typing import Sequence
+
+from sqlalchemy import Connection, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Table holding one write counter per versioned table
+TABLE_VERSION_TABLE = "table_version"
+
+# Tables serialized by the endpoints answering conditional GETs or cached responses; their writes bump their counters
+VERSIONED_TABLES = (
+    "admin", "comment", "customer", "invoice", "payment", "post", "rental", "vehicle", "vehicleinsurance",
+)
+
+# Bumps the counter of the written table once per statement, in the writing transaction, so a
+# new version becomes visible together with the rows it covers. Concurrent writes to one table
+# wait for each other's commit on its counter row.
+BUMP_TABLE_VERSION_SQL = f"""
+CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO {TABLE_VERSION_TABLE} (table_name, version) VALUES (TG_TABLE_NAME, 1)
+    ON CONFLICT (table_name) DO UPDATE SET version = {TABLE_VERSION_TABLE}.version + 1;
+    RETURN NULL;
+END
+$$
+"""
+
+
+def create_version_triggers(connection: Connection) -> None:
+    """
+    Creates the triggers keeping the counters of `VERSIONED_TABLES`, replacing existing ones.
+
+    Args:
+        connection (Connection): A connection to a database where the tables exist.
+    """
+    connection.exec_driver_sql(BUMP_TABLE_VERSION_SQL)
+    for table in VERSIONED_TABLES:
+        connection.exec_driver_sql(
+            f"CREATE OR REPLACE TRIGGER {table}_version "
+            f"AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table} "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()"
+        )
+
+
+def drop_version_triggers(connection: Connection) -> None:
+    """
+    Drops the triggers and function created by `create_version_triggers`.
+    """
+    for table in VERSIONED_TABLES:
+        connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {table}_version ON {table}")
+    connection.exec_driver_sql("DROP FUNCTION IF EXISTS bump_table_version()")
+
+
+async def table_versions(session: AsyncSession, tables: Sequence[str]) -> tuple[int, ...]:
+    """
+    Reads the write counters of the given tables, in one query.
+
+    Args:
+        session (AsyncSession): The session the tables are then read in.
+        tables (Sequence[str]): Names of versioned tables.
+
+    Returns:
+        tuple[int, ...]: The counter of each table, in order; 0 for tables never written.
+    """
+    rows = await session.execute(
+        text(f"SELECT table_name, version FROM {TABLE_VERSION_TABLE} WHERE table_name = ANY(:tables)"),
+        {"tables": list(tables)},
+    )
+    versions = dict(rows.all())
+    return tuple(versions.get(table, 0) for table in tables)
+
+
+def weak_etag(*parts: object) -> str:
+    """
+    Builds a weak entity tag identifying a response by the parts it is computed from.
+    """
+    digest = hashlib.sha256("\x1f".join(map(str, parts)).encode()).hexdigest()[:32]
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Checks whether an If-None-Match header names the entity tag, by weak comparison.
+
+    Args:
+        if_none_match (str | None): The header value: `*`, or a comma separated list of tags.
+        etag (str): The current tag of the requested resource.
+
+    Returns:
+        bool: True if the client's copy is current.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
@@ -0,0 +1,83 @@
+from os import getenv
+
+from sqlalchemy import Column, Select, func, literal_column, select
+
+# Characters folded before text is indexed or searched: the Arabic forms of yeh and kaf become
+# their Persian forms, and the zero-width non-joiner inside compound words becomes a space
+PERSIAN_CHARACTER_MAP = {"ي": "ی", "ى": "ی", "ك": "ک", "\u200c": " "}
+
+# Persian has no stemming dictionary in PostgreSQL, so words are indexed as they are written
+TEXT_SEARCH_CONFIG = "simple"
+
+# Most matching rows ranked for one search; a common word matches a large part of the table,
+# and ranking every match would cost a full read of it
+TEXT_SEARCH_CANDIDATES = int(getenv("CRMS_TEXT_SEARCH_CANDIDATES", 10_000))
+
+_PERSIAN_TRANSLATION = str.maketrans(PERSIAN_CHARACTER_MAP)
+
+
+def normalize_persian(text: str) -> str:
+    """
+    Folds the Arabic and zero-width variants of Persian text into one form.
+
+    Args:
+        text (str): The text to normalize.
+
+    Returns:
+        str: The normalized text.
+    """
+    return text.translate(_PERSIAN_TRANSLATION)
+
+
+def search_vector_sql(*weighted_columns: tuple[str, str]) -> str:
+    """
+    Builds the expression of a generated `tsvector` column over normalized text columns.
+
+    The columns are normalized in SQL with the same character map as `normalize_persian`,
+    so indexed text and search queries are folded the same way.
+
+    Args:
+        *weighted_columns (tuple[str, str]): Column names with their weight, from "A" (highest) to "D".
+
+    Returns:
+        str: The SQL expression, for a `Computed` column.
+    """
+    source, target = "".join(PERSIAN_CHARACTER_MAP), "".join(PERSIAN_CHARACTER_MAP.values())
+    return " || ".join(
+        f"setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', translate(coalesce({column}, ''), '{source}', '{target}')), "
+        f"'{weight}')"
+        for column, weight in weighted_columns
+    )
+
+
+def full_text_search(query: Select, search_vector: Column, text: str, *, offset: int, limit: int) -> Select:
+    """
+    Filters a query to the rows matching a search text, most relevant first, and selects a page of them.
+
+    The text accepts web search syntax: quoted phrases, `or`, and `-` to exclude a word.
+    Relevance is not stored, so the pages are selected with `offset`, and only the first
+    `TEXT_SEARCH_CANDIDATES` matches found by the index are ranked.
+
+    Args:
+        query (Select): The query to filter.
+        search_vector (Column): The generated `tsvector` column of the queried table.
+        text (str): The search text given by the user.
+        offset (int): Rows to skip.
+        limit (int): Maximum number of rows in the page.
+
+    Returns:
+        Select: The filtered and ranked query.
+    """
+    config = literal_column(f"'{TEXT_SEARCH_CONFIG}'::regconfig")
+    text_query = func.websearch_to_tsquery(config, normalize_persian(text))
+    matches = search_vector.bool_op("@@")(text_query)
+    model_id = search_vector.table.c.id
+    candidates = select(model_id).where(matches).limit(TEXT_SEARCH_CANDIDATES)
+    if query.whereclause is not None:
+        candidates = candidates.where(query.whereclause)
+    return (
+        query.where(model_id.in_(candidates))
+        .order_by(func.ts_rank(search_vector, text_query).desc(), model_id)
+        .offset(offset)
+        .limit(limit)
+    )
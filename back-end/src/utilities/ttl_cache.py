@@ -0,0 +1,74 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Hashable
+
+
+class TTLCache:
+    """
+    A bounded, thread-safe LRU cache whose entries expire after a time-to-live.
+
+    Each entry may carry its own expiry time; entries without one use the cache's
+    default `ttl`. When the cache is full, the least recently used entry is evicted.
+    Hit, miss and eviction counters are kept for monitoring.
+    """
+
+    def __init__(self, maxsize: int, ttl: float | None = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[Hashable, tuple[Any, float | None]] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, expires_at: float | None = None) -> None:
+        if self.maxsize <= 0:
+            return
+
+        if expires_at is None and self.ttl is not None:
+            expires_at = time.time() + self.ttl
+
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
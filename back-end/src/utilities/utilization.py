@@ -0,0 +1,188 @@
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Sequence
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from utilities.enumerables import Brand, BranchLocations
+
+# The days of a window each vehicle is rented on: the periods of its rentals overlapping the
+# window, found through their GiST index, clipped to it and merged into one multirange, so
+# overlapping and back-to-back rentals count their days once
+_RENTED_DAYS = """
+    SELECT rental.vehicle_id, range_agg(rental.rental_period * window_days.days) AS days
+    FROM rental, (SELECT daterange(CAST(:start AS date), CAST(:end AS date), '[]') AS days) AS window_days
+    WHERE rental.rental_period && window_days.days AND {vehicles}
+    GROUP BY rental.vehicle_id
+"""
+
+# Vehicles matching the filters of a fleet request
+_FILTERED_VEHICLES = """
+    SELECT id, location FROM vehicle
+    WHERE (CAST(:location AS branchlocations) IS NULL OR location = CAST(:location AS branchlocations))
+    AND (CAST(:brand AS brand) IS NULL OR brand = CAST(:brand AS brand))
+"""
+
+# Rented days, peak occupancy and peak windows of each branch and of the whole fleet, a row per
+# branch and one with `fleet` set. Occupancy is swept over the merged rented ranges rather than
+# the days: a vehicle is added on the first day of each range and removed on the day after it,
+# and the running sum of these changes is the number of vehicles rented until the next change.
+FLEET_UTILIZATION_SQL = f"""
+WITH vehicles AS ({_FILTERED_VEHICLES}
+), rented AS (
+    SELECT vehicles.location, rented.days
+    FROM ({_RENTED_DAYS.format(vehicles="rental.vehicle_id IN (SELECT id FROM vehicles)")}) AS rented
+    JOIN vehicles ON vehicles.id = rented.vehicle_id
+), ranges AS (
+    SELECT location, lower(range) AS first_day, upper(range) AS after_last_day
+    FROM rented, unnest(rented.days) AS range
+), fleet AS (
+    SELECT GROUPING(location) = 1 AS fleet, location, count(*) AS vehicle_count
+    FROM vehicles GROUP BY GROUPING SETS ((location), ())
+), usage AS (
+    SELECT GROUPING(location) = 1 AS fleet, location, sum(after_last_day - first_day) AS rented_days
+    FROM ranges GROUP BY GROUPING SETS ((location), ())
+), changes AS (
+    SELECT GROUPING(location) = 1 AS fleet, location, day, sum(change) AS change
+    FROM ranges, LATERAL (VALUES (first_day, 1), (after_last_day, -1)) AS events (day, change)
+    GROUP BY GROUPING SETS ((location, day), (day))
+), occupancy AS (
+    SELECT fleet, location, day, lead(day) OVER sweep AS next_day, sum(change) OVER sweep AS rented_vehicles
+    FROM changes
+    WINDOW sweep AS (PARTITION BY fleet, location ORDER BY day)
+), peaks AS (
+    SELECT DISTINCT ON (fleet, location) fleet, location, rented_vehicles
+    FROM occupancy ORDER BY fleet, location, rented_vehicles DESC
+)
+SELECT fleet.fleet, fleet.location, fleet.vehicle_count, coalesce(usage.rented_days, 0) AS rented_days,
+    coalesce(peaks.rented_vehicles, 0) AS peak_rented_vehicles,
+    (
+        SELECT range_agg(daterange(occupancy.day, occupancy.next_day)) FROM occupancy
+        WHERE occupancy.fleet = peaks.fleet AND occupancy.location IS NOT DISTINCT FROM peaks.location
+        AND occupancy.rented_vehicles = peaks.rented_vehicles AND peaks.rented_vehicles > 0
+    ) AS peak_windows
+FROM fleet
+LEFT JOIN usage ON usage.fleet = fleet.fleet AND usage.location IS NOT DISTINCT FROM fleet.location
+LEFT JOIN peaks ON peaks.fleet = fleet.fleet AND peaks.location IS NOT DISTINCT FROM fleet.location
+ORDER BY fleet.fleet DESC, fleet.location
+"""
+
+# Rented days and idle gaps of the given vehicles, in the order of the ids
+VEHICLE_UTILIZATION_SQL = f"""
+SELECT vehicle.id, coalesce((SELECT sum(upper(range) - lower(range)) FROM unnest(rented.days) AS range), 0),
+    datemultirange(daterange(CAST(:start AS date), CAST(:end AS date), '[]'))
+        - coalesce(rented.days, '{{}}'::datemultirange)
+FROM unnest(CAST(:ids AS uuid[])) WITH ORDINALITY AS vehicle (id, position)
+LEFT JOIN ({_RENTED_DAYS.format(vehicles="rental.vehicle_id = ANY(CAST(:ids AS uuid[]))")}) AS rented
+    ON rented.vehicle_id = vehicle.id
+ORDER BY vehicle.position
+"""
+
+
+@dataclass(frozen=True, slots=True)
+class FleetUtilization:
+    """
+    How the vehicles of a branch, or of the whole fleet, were rented in a window of `days` days.
+
+    `peak_windows` are the ranges of days, both ends included, on which `peak_rented_vehicles`
+    of them were rented at once.
+    """
+    vehicle_count: int
+    rented_days: int
+    days: int
+    peak_rented_vehicles: int
+    peak_windows: list[tuple[date, date]]
+
+    @property
+    def utilization(self) -> float:
+        # Rentals hold whole days, so the share of days is also the share of hours
+        return self.rented_days / (self.vehicle_count * self.days) if self.vehicle_count else 0.0
+
+
+@dataclass(frozen=True, slots=True)
+class VehicleUtilization:
+    """
+    How one vehicle was rented in a window of `days` days; `idle_gaps` are the ranges of days,
+    both ends included, it was not rented on.
+    """
+    rented_days: int
+    days: int
+    idle_gaps: list[tuple[date, date]]
+
+    @property
+    def utilization(self) -> float:
+        return self.rented_days / self.days
+
+
+def _day_ranges(multirange: Sequence | None) -> list[tuple[date, date]]:
+    # asyncpg reads a multirange as a list of ranges excluding their upper bound
+    return [(days.lower, days.upper - timedelta(days=1)) for days in multirange or ()]
+
+
+async def fleet_utilization(
+        session: AsyncSession,
+        start: date,
+        end: date,
+        *,
+        location: BranchLocations | None = None,
+        brand: Brand | None = None,
+) -> tuple[FleetUtilization, dict[BranchLocations, FleetUtilization]]:
+    """
+    Computes the utilization and peak demand of the fleet and of each branch in a window of days, in one query.
+
+    Only the merged rented ranges of each vehicle reach the sweep, never a row per rental or per day,
+    so the cost grows with the rentals overlapping the window rather than with its length.
+
+    Args:
+        session (AsyncSession): The session to run the query in.
+        start (date): The first day of the window.
+        end (date): The last day of the window.
+        location (BranchLocations | None): The only branch whose vehicles are counted, if any.
+        brand (Brand | None): The only brand whose vehicles are counted, if any.
+
+    Returns:
+        tuple[FleetUtilization, dict[BranchLocations, FleetUtilization]]: The utilization of the
+            filtered fleet, and of each branch with vehicles among it.
+    """
+    rows = await session.execute(text(FLEET_UTILIZATION_SQL), {
+        "start": start, "end": end,
+        "location": location.name if location else None, "brand": brand.name if brand else None,
+    })
+    days = (end - start).days + 1
+    fleet, branches = FleetUtilization(0, 0, days, 0, []), {}
+    for is_fleet, branch, vehicle_count, rented_days, peak_rented_vehicles, peak_windows in rows:
+        utilization = FleetUtilization(
+            vehicle_count, rented_days, days, peak_rented_vehicles, _day_ranges(peak_windows),
+        )
+        if is_fleet:
+            fleet = utilization
+        else:
+            branches[BranchLocations[branch]] = utilization
+    return fleet, branches
+
+
+async def vehicle_utilization(
+        session: AsyncSession,
+        start: date,
+        end: date,
+        vehicle_ids: Sequence[UUID],
+) -> list[VehicleUtilization]:
+    """
+    Computes the utilization and idle gaps of each of the given vehicles in a window of days, in one query.
+
+    Args:
+        session (AsyncSession): The session to run the query in.
+        start (date): The first day of the window.
+        end (date): The last day of the window.
+        vehicle_ids (Sequence[UUID]): The vehicles, typically one page of them.
+
+    Returns:
+        list[VehicleUtilization]: The utilization of each vehicle, in the order of the ids.
+    """
+    if not vehicle_ids:
+        return []
+    rows = await session.execute(text(VEHICLE_UTILIZATION_SQL), {"start": start, "end": end, "ids": list(vehicle_ids)})
+    days = (end - start).days + 1
+    return [VehicleUtilization(rented_days, days, _day_ranges(idle_gaps)) for _, rented_days, idle_gaps in rows]